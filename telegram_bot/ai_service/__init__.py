@@ -7,10 +7,26 @@ from .database import (
     init_db,
     get_db_connection,
     log_dialogue,
+    log_dialogues_bulk,
     log_book_recommendations,
     get_user_dialogues,
     get_user_recommendations,
-    get_dialogue_by_id
+    get_dialogue_by_id,
+    get_user_dialogues_page,
+    get_user_recommendations_page,
+    iter_user_dialogues,
+    iter_user_recommendations,
+    get_latest_user_dialogue,
+    pooled_connection,
+    close_pool
+)
+
+from .storage import (
+    init_storage,
+    save_user,
+    get_user,
+    save_feedback,
+    get_feedback_with_dialogues
 )
 
 from .ai_main import (
@@ -32,10 +48,25 @@ __all__ = [
     'init_db',
     'get_db_connection',
     'log_dialogue',
+    'log_dialogues_bulk',
     'log_book_recommendations',
     'get_user_dialogues',
     'get_user_recommendations',
     'get_dialogue_by_id',
+    'get_user_dialogues_page',
+    'get_user_recommendations_page',
+    'iter_user_dialogues',
+    'iter_user_recommendations',
+    'get_latest_user_dialogue',
+    'pooled_connection',
+    'close_pool',
+    
+    # Storage functions
+    'init_storage',
+    'save_user',
+    'get_user',
+    'save_feedback',
+    'get_feedback_with_dialogues',
     
     # Main AI functions
     'initialize_dialogue',
@@ -0,0 +1,237 @@
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+import logging
+
+try:
+    from prometheus_client import Counter, Histogram
+except ImportError:  # prometheus_client is only needed to export the metrics
+    Counter = Histogram = None
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Admission control for LLM calls: at most ADMISSION_MAX_IN_FLIGHT run at
+# once, the rest wait in a priority queue of ADMISSION_MAX_QUEUE places.
+# Under overload a request is shed - the caller answers "busy" at once -
+# when the queue is full of requests of the same or higher priority, or
+# when it has waited ADMISSION_MAX_WAIT_SECONDS. Admitted requests therefore
+# never wait longer than that, whatever the load. The blocking LLM calls of
+# admitted requests run on the controller's own threads, one per slot, so
+# they do not queue behind each other or behind the default executor that
+# database and session work shares through asyncio.to_thread().
+
+# Максимальное число одновременных запросов к AI
+ADMISSION_MAX_IN_FLIGHT = 32
+
+# Максимальное число запросов, ожидающих своей очереди
+ADMISSION_MAX_QUEUE = 100
+
+# Запрос, ожидающий дольше этого времени (в секундах), получает ответ "занят"
+ADMISSION_MAX_WAIT_SECONDS = 10
+
+# Приоритеты запросов: меньше - важнее
+PRIORITY_DIALOGUE = 0
+PRIORITY_NEW_SESSION = 1
+PRIORITY_RECOMMENDATIONS = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_DIALOGUE: 'dialogue',
+    PRIORITY_NEW_SESSION: 'new_session',
+    PRIORITY_RECOMMENDATIONS: 'recommendations',
+}
+
+# Сколько последних времен ожидания хранится для перцентилей в stats()
+WAIT_SAMPLES = 1000
+
+if Histogram is not None:
+    ADMISSION_WAIT_SECONDS = Histogram(
+        'bot_admission_wait_seconds', "Time requests wait for an LLM slot",
+        ['controller', 'priority'], buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+    ADMISSION_DECISIONS = Counter(
+        'bot_admission_decisions_total', "Admission decisions by outcome",
+        ['controller', 'priority', 'outcome'])
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class AdmissionController:
+    """
+    Limits concurrent requests and sheds load with a bounded priority queue.
+
+    Usage:
+        async with controller.slot(PRIORITY_DIALOGUE) as admitted:
+            if not admitted:
+                ...  # answer "busy"
+            response = await controller.run(call_llm, messages)
+
+    A full queue makes room for a more important request by shedding the
+    least important, most recent waiter.
+    """
+
+    def __init__(self, name: str, max_in_flight: Optional[int] = None, max_queue: Optional[int] = None,
+                 max_wait_seconds: Optional[float] = None):
+        self.name = name
+        self._max_in_flight = max_in_flight
+        self._max_queue = max_queue
+        self._max_wait_seconds = max_wait_seconds
+        self._in_flight = 0
+        # Heap of (priority, arrival number, future); the future gets True on admission, False when shed
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._arrivals = itertools.count()
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self.outcomes: Dict[str, int] = {'admitted': 0, 'rejected': 0, 'shed': 0, 'timed_out': 0}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def max_in_flight(self) -> int:
+        return ADMISSION_MAX_IN_FLIGHT if self._max_in_flight is None else self._max_in_flight
+
+    @property
+    def max_queue(self) -> int:
+        return ADMISSION_MAX_QUEUE if self._max_queue is None else self._max_queue
+
+    @property
+    def max_wait_seconds(self) -> float:
+        return ADMISSION_MAX_WAIT_SECONDS if self._max_wait_seconds is None else self._max_wait_seconds
+
+    def _record(self, priority: int, outcome: str, waited: float) -> None:
+        self.outcomes[outcome] += 1
+        if outcome == 'admitted':
+            self._waits.append(waited)
+        if Histogram is not None:
+            labels = (self.name, PRIORITY_NAMES.get(priority, str(priority)))
+            ADMISSION_DECISIONS.labels(*labels, outcome).inc()
+            if outcome == 'admitted':
+                ADMISSION_WAIT_SECONDS.labels(*labels).observe(waited)
+
+    def _remove(self, entry: Tuple[int, int, asyncio.Future]) -> None:
+        self._waiters.remove(entry)
+        heapq.heapify(self._waiters)
+
+    async def acquire(self, priority: int = PRIORITY_DIALOGUE) -> bool:
+        """
+        Wait for a slot
+
+        Args:
+            priority (int): Request priority, lower is more important
+
+        Returns:
+            bool: True if admitted (call release() when done), False if the request was shed
+        """
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            self._record(priority, 'admitted', 0.0)
+            return True
+
+        if len(self._waiters) >= self.max_queue:
+            worst = max(self._waiters, default=None)
+            if worst is None or worst[0] <= priority:
+                self._record(priority, 'rejected', 0.0)
+                return False
+            # The shed waiter records its own outcome
+            self._remove(worst)
+            worst[2].set_result(False)
+
+        started = time.monotonic()
+        entry = (priority, next(self._arrivals), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiters, entry)
+        future = entry[2]
+        try:
+            await asyncio.wait({future}, timeout=self.max_wait_seconds)
+        except asyncio.CancelledError:
+            if future.done() and future.result():
+                self.release()
+            elif entry in self._waiters:
+                self._remove(entry)
+            raise
+
+        waited = time.monotonic() - started
+        if not future.done():
+            future.cancel()
+            self._remove(entry)
+            self._record(priority, 'timed_out', waited)
+            return False
+        admitted = future.result()
+        self._record(priority, 'admitted' if admitted else 'shed', waited)
+        return admitted
+
+    def release(self) -> None:
+        """Free a slot, handing it to the most important waiter"""
+        if self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            future.set_result(True)
+        else:
+            self._in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_DIALOGUE) -> AsyncIterator[bool]:
+        """
+        Hold a slot for the duration of the block
+
+        Args:
+            priority (int): Request priority, lower is more important
+
+        Yields:
+            bool: True if admitted, False if the caller should answer "busy"
+        """
+        admitted = await self.acquire(priority)
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self.release()
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run a blocking call of an admitted request in a thread, like asyncio.to_thread()
+
+        The controller has one thread per slot, so an admitted call starts at once.
+
+        Args:
+            func (Callable[..., Any]): Blocking function, e.g. the LLM request
+            *args: Arguments of func
+
+        Returns:
+            Any: Result of func
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix=self.name)
+        call = functools.partial(contextvars.copy_context().run, func, *args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Collect admission metrics
+
+        Returns:
+            Dict[str, Any]: requests in flight and queued, limits, counts of admitted,
+            rejected (queue full), shed (pushed out of the queue) and timed out requests,
+            and the median, 95th percentile and maximum wait of recent admitted requests
+        """
+        waits = list(self._waits)
+        return dict(
+            self.outcomes,
+            in_flight=self._in_flight,
+            queued=len(self._waiters),
+            max_in_flight=self.max_in_flight,
+            max_queue=self.max_queue,
+            wait_p50=round(_percentile(waits, 0.5), 3),
+            wait_p95=round(_percentile(waits, 0.95), 3),
+            wait_max=round(max(waits, default=0.0), 3),
+        )
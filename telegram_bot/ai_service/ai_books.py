@@ -11,7 +11,8 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-def get_book_recommendations(dialogue_id: int, user_id: str, issue_id: str, dialogue: List[Dict[str, str]]) -> Dict[str, List[Dict[str, str]]]:
+def get_book_recommendations(dialogue_id: int, user_id: str, issue_id: str, dialogue: List[Dict[str, str]],
+                             log_result: bool = True) -> Dict[str, List[Dict[str, str]]]:
     """
     Get personalized book and resource recommendations based on the user's issue and dialogue.
     
@@ -20,6 +21,8 @@ def get_book_recommendations(dialogue_id: int, user_id: str, issue_id: str, dial
         user_id (str): Unique identifier for the user
         issue_id (str): ID of the psychological issue (1 - depression, 2 - burnout, 3 - relationship problems)
         dialogue (List[Dict[str, str]]): List of message dictionaries with 'role' and 'content' keys
+        log_result (bool): Log the recommendations to the database; prefetched recommendations
+            are logged only when they are shown
         
     Returns:
         Dict[str, List[Dict[str, str]]]: Dictionary containing recommended books and resources
@@ -89,8 +92,9 @@ def get_book_recommendations(dialogue_id: int, user_id: str, issue_id: str, dial
         logging.info("Successfully parsed recommendations JSON")
         
         # Log the recommendations to the database
-        recommendation_id = log_book_recommendations(user_id, issue_id, recommendations, dialogue_id)
-        logging.info(f"Book recommendations logged with ID: {recommendation_id}")
+        if log_result:
+            recommendation_id = log_book_recommendations(user_id, issue_id, recommendations, dialogue_id)
+            logging.info(f"Book recommendations logged with ID: {recommendation_id}")
         
         return recommendations
     except json.JSONDecodeError:
@@ -0,0 +1,373 @@
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Tuple
+import argparse
+import json
+import os
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Rollups are updated by the write path in the same transaction as the insert,
+# so the counters always match the stored rows. Days are UTC dates like
+# date(CURRENT_TIMESTAMP). Archiving does not decrement them: the rollups
+# describe everything the bot has ever handled, and a rebuild reads the
+# archive files too.
+#
+# The bot logs a snapshot of the whole history on every turn. A snapshot
+# that continues the user's previous one (its last messages reappear in the
+# new snapshot) adds only its new messages; a snapshot without user messages
+# (initialize_dialogue) or one unrelated to the previous snapshot counts as
+# a new dialogue. The last messages of every user's latest snapshot are kept
+# in dialogue_tails, so a write never reads or decodes an older snapshot.
+
+# Сколько последних сообщений предыдущей записи должно повториться, чтобы запись считалась продолжением
+CONTINUATION_OVERLAP = 3
+
+
+def count_messages(dialogue: List[Dict[str, str]]) -> int:
+    """Count user and assistant messages of a dialogue, system prompts are ignored"""
+    return sum(1 for message in dialogue if message.get('role') != 'system')
+
+
+def count_new_messages(previous: List[Dict[str, str]], dialogue: List[Dict[str, str]]) -> Optional[int]:
+    """
+    Count the messages a dialogue snapshot adds to the previous snapshot of the same conversation
+
+    The bot sends only the recent part of a long history to the AI, so the
+    snapshots are matched by the previous snapshot's last messages rather
+    than by length.
+
+    Args:
+        previous (List[Dict[str, str]]): The user's previous snapshot (its last messages are enough)
+        dialogue (List[Dict[str, str]]): The new snapshot
+
+    Returns:
+        Optional[int]: Number of new messages, or None if the snapshot starts a new dialogue
+    """
+    current = [message for message in dialogue if message.get('role') != 'system']
+    if not any(message.get('role') == 'user' for message in current):
+        return None
+    tail = [message for message in previous if message.get('role') != 'system'][-CONTINUATION_OVERLAP:]
+    if not tail:
+        return None
+    for end in range(len(current), len(tail) - 1, -1):
+        if current[end - len(tail):end] == tail:
+            return len(current) - end
+    return None
+
+
+def dialogue_tail(dialogue: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Return the last messages of a snapshot, by which the next snapshot is matched"""
+    return [message for message in dialogue if message.get('role') != 'system'][-CONTINUATION_OVERLAP:]
+
+
+def record_dialogue(conn: sqlite3.Connection, issue_id: str, dialogue: List[Dict[str, str]],
+                    day: Optional[str] = None, previous: Optional[List[Dict[str, str]]] = None) -> None:
+    """
+    Add a dialogue snapshot to the daily per-issue rollup
+
+    Args:
+        conn (sqlite3.Connection): Connection with the open write transaction
+        issue_id (str): ID of the psychological issue
+        dialogue (List[Dict[str, str]]): The dialogue history
+        day (Optional[str]): 'YYYY-MM-DD' day, today (UTC) by default
+        previous (Optional[List[Dict[str, str]]]): The user's previous snapshot for the same issue;
+            if the new one continues it, only the new messages are counted
+    """
+    added = count_new_messages(previous, dialogue) if previous is not None else None
+    dialogues, messages = (1, count_messages(dialogue)) if added is None else (0, added)
+    conn.execute('''
+        INSERT INTO daily_issue_stats (day, issue_id, dialogues, messages)
+        VALUES (COALESCE(?, date('now')), ?, ?, ?)
+        ON CONFLICT (day, issue_id) DO UPDATE SET
+            dialogues = dialogues + excluded.dialogues,
+            messages = messages + excluded.messages
+    ''', (day, issue_id, dialogues, messages))
+
+
+def record_user_dialogue(conn: sqlite3.Connection, user_id: str, issue_id: str, dialogue: List[Dict[str, str]],
+                         day: Optional[str] = None) -> None:
+    """
+    Add a user's new dialogue snapshot to the rollups, comparing it with the user's latest one
+
+    Args:
+        conn (sqlite3.Connection): Connection with the open write transaction
+        user_id (str): Unique identifier for the user
+        issue_id (str): ID of the psychological issue
+        dialogue (List[Dict[str, str]]): The dialogue history
+        day (Optional[str]): 'YYYY-MM-DD' day, today (UTC) by default
+    """
+    row = conn.execute("SELECT issue_id, tail_json FROM dialogue_tails WHERE user_id = ?", (user_id,)).fetchone()
+    previous = json.loads(row[1]) if row is not None and row[0] == issue_id else None
+    record_dialogue(conn, issue_id, dialogue, day, previous)
+    conn.execute('''
+        INSERT INTO dialogue_tails (user_id, issue_id, tail_json) VALUES (?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET issue_id = excluded.issue_id, tail_json = excluded.tail_json
+    ''', (user_id, issue_id, json.dumps(dialogue_tail(dialogue), ensure_ascii=False)))
+
+
+def fill_dialogue_tails(conn: sqlite3.Connection, db_path: str) -> None:
+    """
+    Remember the last messages of every user's latest stored snapshot
+
+    Args:
+        conn (sqlite3.Connection): Connection with the open write transaction
+        db_path (str): Path to the database file, used to decode compressed rows
+    """
+    from .compression import decode_json
+
+    rows = conn.execute('''
+        SELECT d.user_id, d.issue_id, d.dialogue_json FROM dialogues d
+        JOIN (SELECT MAX(id) AS id FROM dialogues GROUP BY user_id) latest ON latest.id = d.id
+    ''').fetchall()
+    conn.executemany("INSERT OR REPLACE INTO dialogue_tails (user_id, issue_id, tail_json) VALUES (?, ?, ?)",
+                     ((user_id, issue_id, json.dumps(dialogue_tail(decode_json(value, db_path)), ensure_ascii=False))
+                      for user_id, issue_id, value in rows))
+
+
+def record_recommendations(conn: sqlite3.Connection, issue_id: str, day: Optional[str] = None) -> None:
+    """
+    Add a book recommendation record to the daily per-issue rollup
+
+    Args:
+        conn (sqlite3.Connection): Connection with the open write transaction
+        issue_id (str): ID of the psychological issue
+        day (Optional[str]): 'YYYY-MM-DD' day, today (UTC) by default
+    """
+    conn.execute('''
+        INSERT INTO daily_issue_stats (day, issue_id, recommendations)
+        VALUES (COALESCE(?, date('now')), ?, 1)
+        ON CONFLICT (day, issue_id) DO UPDATE SET recommendations = recommendations + 1
+    ''', (day, issue_id))
+
+
+def record_feedback(conn: sqlite3.Connection, day: Optional[str] = None) -> None:
+    """
+    Add a feedback message to the daily feedback rollup
+
+    Args:
+        conn (sqlite3.Connection): Connection with the open write transaction
+        day (Optional[str]): 'YYYY-MM-DD' day, today (UTC) by default
+    """
+    conn.execute('''
+        INSERT INTO daily_feedback_stats (day, feedback)
+        VALUES (COALESCE(?, date('now')), 1)
+        ON CONFLICT (day) DO UPDATE SET feedback = feedback + 1
+    ''', (day,))
+
+
+def _stored_dialogues(conn: sqlite3.Connection, db_path: str, batch_size: int, skip_missing: bool = False
+                      ) -> Iterator[Tuple[str, str, str, List[Dict[str, str]]]]:
+    """Yield (user_id, issue_id, day, dialogue) of archived and then hot dialogues in ID order"""
+    from .archive import get_archive_path
+    from .compression import decode_json
+
+    sources = []
+    for (month,) in conn.execute("SELECT DISTINCT archive_month FROM archived_dialogues ORDER BY archive_month"):
+        archive_path = get_archive_path(month, db_path)
+        if not os.path.exists(archive_path):
+            if not skip_missing:
+                raise FileNotFoundError(f"Archive {archive_path} is missing, its dialogues cannot be counted")
+            logging.warning(f"Archive {archive_path} is missing, its dialogues are not counted")
+            continue
+        sources.append(archive_path)
+    sources.append(None)
+
+    for archive_path in sources:
+        source = sqlite3.connect(archive_path) if archive_path else conn
+        try:
+            last_id = 0
+            while True:
+                rows = source.execute('''
+                    SELECT id, user_id, issue_id, date(timestamp), dialogue_json FROM dialogues
+                    WHERE id > ? ORDER BY id LIMIT ?
+                ''', (last_id, batch_size)).fetchall()
+                if not rows:
+                    break
+                for row_id, user_id, issue_id, day, value in rows:
+                    yield user_id, issue_id, day, decode_json(value, archive_path or db_path)
+                last_id = rows[-1][0]
+        finally:
+            if archive_path:
+                source.close()
+
+
+def fill_rollups(conn: sqlite3.Connection, db_path: str, batch_size: int = 500, skip_missing: bool = False) -> None:
+    """
+    Count stored rows, including archived ones, into empty rollup tables
+
+    Args:
+        conn (sqlite3.Connection): Connection with the open write transaction
+        db_path (str): Path to the database file, used to decode compressed rows and find archives
+        batch_size (int): Number of dialogues decoded per query
+        skip_missing (bool): Log and skip dialogues of missing archive files instead of raising
+            FileNotFoundError; their recommendations are still counted from the metadata
+    """
+    # Only the last messages of each user's previous snapshot are needed to detect continuations
+    previous: Dict[str, Tuple[str, List[Dict[str, str]]]] = {}
+    for user_id, issue_id, day, dialogue in _stored_dialogues(conn, db_path, batch_size, skip_missing):
+        last = previous.get(user_id)
+        record_dialogue(conn, issue_id, dialogue, day, last[1] if last and last[0] == issue_id else None)
+        previous[user_id] = (issue_id, dialogue_tail(dialogue))
+    for table in ('book_recommendations', 'archived_book_recommendations'):
+        conn.execute(f'''
+            INSERT INTO daily_issue_stats (day, issue_id, recommendations)
+            SELECT date(timestamp), issue_id, COUNT(*) FROM {table} WHERE true
+            GROUP BY date(timestamp), issue_id
+            ON CONFLICT (day, issue_id) DO UPDATE SET recommendations = recommendations + excluded.recommendations
+        ''')
+    conn.execute('''
+        INSERT INTO daily_feedback_stats (day, feedback)
+        SELECT date(feedback_date), COUNT(*) FROM feedback GROUP BY date(feedback_date)
+    ''')
+
+
+def rebuild_rollups(conn: sqlite3.Connection, db_path: str, batch_size: int = 500) -> None:
+    """
+    Recompute all rollups from the stored rows
+
+    Needed only to repair counters, e.g. for compressed rows written before
+    the rollups existed. Archived rows are read from their archive files;
+    if one is missing the rollups are left unchanged.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        db_path (str): Path to the database file, used to decode compressed rows and find archives
+        batch_size (int): Number of dialogues decoded per query
+    """
+    conn.execute("BEGIN")
+    try:
+        conn.execute("DELETE FROM daily_issue_stats")
+        conn.execute("DELETE FROM daily_feedback_stats")
+        fill_rollups(conn, db_path, batch_size)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logging.info("Analytics rollups rebuilt")
+
+
+def get_daily_issue_stats(start_day: Optional[str] = None, end_day: Optional[str] = None,
+                          issue_id: Optional[str] = None) -> List[Dict]:
+    """
+    Retrieve per-issue daily counters
+
+    Args:
+        start_day (Optional[str]): First 'YYYY-MM-DD' day, inclusive
+        end_day (Optional[str]): Last 'YYYY-MM-DD' day, inclusive
+        issue_id (Optional[str]): Restrict results to one issue
+
+    Returns:
+        List[Dict]: Rows with day, issue_id, dialogues, messages and recommendations
+        keys ordered by day and issue
+    """
+    from .sharding import query_all
+
+    query = "SELECT day, issue_id, dialogues, messages, recommendations FROM daily_issue_stats WHERE 1 = 1"
+    params: List = []
+    if start_day is not None:
+        query += " AND day >= ?"
+        params.append(start_day)
+    if end_day is not None:
+        query += " AND day <= ?"
+        params.append(end_day)
+    if issue_id is not None:
+        query += " AND issue_id = ?"
+        params.append(issue_id)
+    query += " ORDER BY day, issue_id"
+
+    # Shards keep their own counters for the same days and issues
+    stats: Dict[tuple, Dict] = {}
+    for row in query_all(query, tuple(params)):
+        key = (row['day'], row['issue_id'])
+        if key not in stats:
+            stats[key] = row
+            continue
+        for column in ('dialogues', 'messages', 'recommendations'):
+            stats[key][column] += row[column]
+    return sorted(stats.values(), key=lambda row: (row['day'], row['issue_id']))
+
+
+def get_issue_totals(start_day: Optional[str] = None, end_day: Optional[str] = None) -> List[Dict]:
+    """
+    Retrieve totals per issue over a period
+
+    Args:
+        start_day (Optional[str]): First 'YYYY-MM-DD' day, inclusive
+        end_day (Optional[str]): Last 'YYYY-MM-DD' day, inclusive
+
+    Returns:
+        List[Dict]: Rows with issue_id, dialogues, messages, recommendations and
+        average_messages (average dialogue length) keys
+    """
+    totals: Dict[str, Dict] = {}
+    for row in get_daily_issue_stats(start_day, end_day):
+        total = totals.setdefault(row['issue_id'], {'issue_id': row['issue_id'], 'dialogues': 0,
+                                                    'messages': 0, 'recommendations': 0})
+        total['dialogues'] += row['dialogues']
+        total['messages'] += row['messages']
+        total['recommendations'] += row['recommendations']
+    for total in totals.values():
+        total['average_messages'] = total['messages'] / total['dialogues'] if total['dialogues'] else 0.0
+    return sorted(totals.values(), key=lambda total: total['issue_id'])
+
+
+def get_daily_feedback_counts(start_day: Optional[str] = None, end_day: Optional[str] = None) -> List[Dict]:
+    """
+    Retrieve the number of feedback messages per day
+
+    Args:
+        start_day (Optional[str]): First 'YYYY-MM-DD' day, inclusive
+        end_day (Optional[str]): Last 'YYYY-MM-DD' day, inclusive
+
+    Returns:
+        List[Dict]: Rows with day and feedback keys ordered by day
+    """
+    from .database import pooled_connection
+
+    query = "SELECT day, feedback FROM daily_feedback_stats WHERE 1 = 1"
+    params: List = []
+    if start_day is not None:
+        query += " AND day >= ?"
+        params.append(start_day)
+    if end_day is not None:
+        query += " AND day <= ?"
+        params.append(end_day)
+    query += " ORDER BY day"
+
+    with pooled_connection() as conn:
+        rows = conn.execute(query, params).fetchall()
+    return [dict(row) for row in rows]
+
+
+def main() -> None:
+    """Command line entry point for printing and rebuilding the rollups"""
+    from . import database
+    from .sharding import get_database_paths
+
+    parser = argparse.ArgumentParser(description="Dialogue analytics from the rollup tables")
+    parser.add_argument('--from', dest='start_day', help="first day, YYYY-MM-DD")
+    parser.add_argument('--to', dest='end_day', help="last day, YYYY-MM-DD")
+    parser.add_argument('--rebuild', action='store_true', help="recompute the rollups from all rows")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        # Every shard keeps the rollups of its own rows
+        for db_path in get_database_paths():
+            database.ensure_db(db_path)
+            conn = sqlite3.connect(db_path)
+            rebuild_rollups(conn, db_path)
+            conn.close()
+    for total in get_issue_totals(args.start_day, args.end_day):
+        print(f"{total['issue_id']}\t{total['dialogues']}\t{total['messages']}\t"
+              f"{total['average_messages']:.1f}\t{total['recommendations']}")
+    for row in get_daily_feedback_counts(args.start_day, args.end_day):
+        print(f"feedback\t{row['day']}\t{row['feedback']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+import os
+import argparse
+import logging
+from . import database
+from .migrations import migrate
+from .cache import clear_caches
+from .sharding import get_database_paths, get_record_database_path, get_user_database_path
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Диалоги старше этого количества дней переносятся в архив
+RETENTION_DAYS = 90
+
+# Каталог с помесячными архивами; по умолчанию archive/ рядом с основной базой.
+# Архивы шардов 1..N-1 лежат в его подкаталогах с именами файлов шардов
+ARCHIVE_DIR: Optional[str] = None
+
+# Archived table -> (metadata table in the hot database, JSON column, metadata columns)
+ARCHIVED_TABLES = {
+    'dialogues': ('archived_dialogues', 'dialogue_json', database.DIALOGUE_METADATA_COLUMNS),
+    'book_recommendations': ('archived_book_recommendations', 'recommendations_json',
+                             database.RECOMMENDATION_METADATA_COLUMNS),
+}
+
+
+def get_archive_dir(db_path: Optional[str] = None) -> str:
+    """Return the directory with monthly archive files of a database, the main one by default"""
+    archive_dir = ARCHIVE_DIR or os.path.join(os.path.dirname(database.DATABASE_PATH), 'archive')
+    if db_path is None or os.path.abspath(db_path) == os.path.abspath(database.DATABASE_PATH):
+        return archive_dir
+    # Months of different shards would collide in one directory
+    return os.path.join(archive_dir, os.path.splitext(os.path.basename(db_path))[0])
+
+
+def get_archive_path(month: str, db_path: Optional[str] = None) -> str:
+    """
+    Return the path of the archive file for a month
+
+    Args:
+        month (str): Month in YYYY_MM format
+        db_path (Optional[str]): Database the rows were archived from, the main one by default
+
+    Returns:
+        str: Path to the archive database file
+    """
+    return os.path.join(get_archive_dir(db_path), f"dialogues_{month}.db")
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """Open a hot database file outside the pool; archiving attaches files and vacuums"""
+    database.ensure_db(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _open_archive(month: str, db_path: Optional[str] = None) -> sqlite3.Connection:
+    """Open an archive file, creating it with the current schema if needed"""
+    os.makedirs(get_archive_dir(db_path), exist_ok=True)
+    conn = sqlite3.connect(get_archive_path(month, db_path))
+    conn.row_factory = sqlite3.Row
+    migrate(conn)
+    return conn
+
+
+def _archive_batch(conn: sqlite3.Connection, db_path: str, table: str, month: str, ids: List[int]) -> None:
+    """Move rows of one month from the hot database into its archive file"""
+    metadata_table, _, metadata_columns = ARCHIVED_TABLES[table]
+    columns = ', '.join(row['name'] for row in conn.execute(f"PRAGMA main.table_info({table})"))
+    metadata = ', '.join(metadata_columns)
+    placeholders = ', '.join('?' * len(ids))
+
+    # The archive schema is created separately, ATTACH lets the move run in one transaction
+    _open_archive(month, db_path).close()
+    conn.execute("ATTACH DATABASE ? AS archive", (get_archive_path(month, db_path),))
+    try:
+        conn.execute("BEGIN")
+        # Compressed rows reference dictionaries, so the archive gets a copy of them
+        conn.execute("INSERT OR IGNORE INTO archive.compression_dictionaries SELECT * FROM main.compression_dictionaries")
+        conn.execute(f"INSERT OR REPLACE INTO archive.{table} ({columns}) "
+                     f"SELECT {columns} FROM main.{table} WHERE id IN ({placeholders})", ids)
+        if table == 'dialogues':
+            # The full-text index entries move together with the dialogues
+            conn.execute(f"INSERT OR REPLACE INTO archive.dialogue_fts (rowid, content) "
+                         f"SELECT rowid, content FROM main.dialogue_fts WHERE rowid IN ({placeholders})", ids)
+            conn.execute(f"DELETE FROM main.dialogue_fts WHERE rowid IN ({placeholders})", ids)
+        conn.execute(f"INSERT OR REPLACE INTO main.{metadata_table} ({metadata}, archive_month) "
+                     f"SELECT {metadata}, ? FROM main.{table} WHERE id IN ({placeholders})", [month] + ids)
+        conn.execute(f"DELETE FROM main.{table} WHERE id IN ({placeholders})", ids)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("DETACH DATABASE archive")
+
+
+def _archive_table(conn: sqlite3.Connection, db_path: str, table: str, cutoff: str, batch_size: int) -> int:
+    """Move all rows of a table older than cutoff into monthly archives"""
+    archived = 0
+    while True:
+        rows = conn.execute(f'''
+            SELECT id, strftime('%Y_%m', timestamp) AS month FROM {table}
+            WHERE timestamp < ?
+            ORDER BY id LIMIT ?
+        ''', (cutoff, batch_size)).fetchall()
+        if not rows:
+            return archived
+
+        by_month: Dict[str, List[int]] = {}
+        for row in rows:
+            by_month.setdefault(row['month'], []).append(row['id'])
+        for month, ids in by_month.items():
+            _archive_batch(conn, db_path, table, month, ids)
+            logging.info(f"Archived {len(ids)} rows of {table} into {get_archive_path(month, db_path)}")
+        archived += len(rows)
+
+
+def reclaim_space(conn: sqlite3.Connection) -> None:
+    """
+    Return free pages of the hot database to the file system
+
+    Databases created before incremental auto-vacuum was enabled are
+    converted with a one-time full VACUUM.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        logging.info("Enabling incremental auto-vacuum (one-time full VACUUM)")
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    conn.execute("PRAGMA incremental_vacuum").fetchall()
+    conn.commit()
+
+
+def archive_old_dialogues(retention_days: Optional[int] = None, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Move dialogues and recommendations older than the retention period to archives
+
+    Rows go to per-month archive files, the hot database keeps only their
+    metadata in archived_dialogues / archived_book_recommendations. With
+    sharding every shard is archived into its own files.
+
+    Args:
+        retention_days (Optional[int]): Age in days after which rows are archived,
+            RETENTION_DAYS by default
+        batch_size (int): Number of rows moved per transaction
+
+    Returns:
+        Dict[str, int]: Number of archived rows per table
+    """
+    if retention_days is None:
+        retention_days = RETENTION_DAYS
+    # CURRENT_TIMESTAMP in SQLite is UTC
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+    logging.info(f"Archiving records older than {cutoff}")
+
+    result = {table: 0 for table in ARCHIVED_TABLES}
+    for db_path in get_database_paths():
+        conn = _connect(db_path)
+        archived = {table: _archive_table(conn, db_path, table, cutoff, batch_size) for table in ARCHIVED_TABLES}
+        if any(archived.values()):
+            # Cached records may point at rows that now live in archive files
+            clear_caches()
+            reclaim_space(conn)
+        conn.close()
+        for table, count in archived.items():
+            result[table] += count
+    logging.info(f"Archiving completed: {result}")
+    return result
+
+
+def get_archived_record(table: str, record_id: int) -> Optional[Dict]:
+    """
+    Retrieve an archived record by its ID
+
+    Args:
+        table (str): 'dialogues' or 'book_recommendations'
+        record_id (int): ID of the record
+
+    Returns:
+        Optional[Dict]: Record or None if it was never archived
+    """
+    metadata_table, json_field, _ = ARCHIVED_TABLES[table]
+    db_path = get_record_database_path(record_id)
+    with database.pooled_connection(db_path) as conn:
+        row = conn.execute(f"SELECT archive_month FROM {metadata_table} WHERE id = ?", (record_id,)).fetchone()
+    if row is None:
+        return None
+
+    archive_path = get_archive_path(row['archive_month'], db_path)
+    archive_conn = _open_archive(row['archive_month'], db_path)
+    record = archive_conn.execute(f"SELECT * FROM {table} WHERE id = ?", (record_id,)).fetchone()
+    archive_conn.close()
+    if record is None:
+        logging.warning(f"Archived record {table}/{record_id} is missing in {archive_path}")
+        return None
+    return database.LazyRecord(record, (json_field,), database.get_json_decoder(table, archive_path, record_id))
+
+
+def get_archived_user_page(table: str, user_id: str, limit: int, cursor: Optional[database.Cursor],
+                           include_json: bool) -> Tuple[List[Dict], Optional[database.Cursor]]:
+    """
+    Retrieve one keyset page of archived records of a user, newest first
+
+    Metadata comes from the hot database; archive files are opened only
+    when the JSON column is requested.
+
+    Args:
+        table (str): 'dialogues' or 'book_recommendations'
+        user_id (str): Unique identifier for the user
+        limit (int): Maximum number of records in the page
+        cursor (Optional[database.Cursor]): Cursor of the previous page
+        include_json (bool): If False, only metadata columns are returned
+
+    Returns:
+        Tuple[List[Dict], Optional[database.Cursor]]: Page of records and the next cursor
+    """
+    metadata_table, json_field, metadata_columns = ARCHIVED_TABLES[table]
+    query = f"SELECT {', '.join(metadata_columns)}, archive_month FROM {metadata_table} WHERE user_id = ?"
+    params: List = [user_id]
+    if cursor is not None:
+        query += ' AND (timestamp, id) < (?, ?)'
+        params.extend(cursor)
+    query += ' ORDER BY timestamp DESC, id DESC LIMIT ?'
+    params.append(limit)
+
+    db_path = get_user_database_path(user_id)
+    with database.pooled_connection(db_path) as conn:
+        rows = conn.execute(query, params).fetchall()
+
+    bodies: Dict[int, sqlite3.Row] = {}
+    if include_json:
+        by_month: Dict[str, List[int]] = {}
+        for row in rows:
+            by_month.setdefault(row['archive_month'], []).append(row['id'])
+        for month, ids in by_month.items():
+            archive_conn = _open_archive(month, db_path)
+            placeholders = ', '.join('?' * len(ids))
+            for body in archive_conn.execute(f"SELECT * FROM {table} WHERE id IN ({placeholders})", ids):
+                bodies[body['id']] = body
+            archive_conn.close()
+
+    records = []
+    for row in rows:
+        if include_json and row['id'] in bodies:
+            decode = database.get_json_decoder(table, get_archive_path(row['archive_month'], db_path), row['id'])
+            records.append(database.LazyRecord(bodies[row['id']], (json_field,), decode))
+        else:
+            records.append(database.LazyRecord(row, ()))
+            del records[-1]['archive_month']
+
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = (rows[-1]['timestamp'], rows[-1]['id'])
+    return records, next_cursor
+
+
+def main() -> None:
+    """Command line entry point for the retention job"""
+    parser = argparse.ArgumentParser(description="Archive old dialogues into monthly SQLite files")
+    parser.add_argument('--days', type=int, default=RETENTION_DAYS, help="retention period in days")
+    parser.add_argument('--batch-size', type=int, default=1000, help="rows moved per transaction")
+    args = parser.parse_args()
+    archive_old_dialogues(args.days, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Pluggable storage backends.
+
+The backend is chosen by a URL: empty or 'sqlite:///path' selects SQLite,
+'mongodb://...' selects MongoDB through motor.
+
+The backends are a library interface for tools and services that keep
+dialogues elsewhere. The bot itself always writes through database.py and
+storage.py, because search, analytics, sessions and archiving read the
+SQLite files directly.
+"""
+
+from .base import StorageBackend
+from .sqlite import SQLiteBackend
+
+
+def create_backend(url: str = '') -> StorageBackend:
+    """
+    Create a storage backend from a connection URL
+
+    Args:
+        url (str): Storage URL, empty for the default SQLite database
+
+    Returns:
+        StorageBackend: Backend instance, call init() before use
+    """
+    if url.startswith(('mongodb://', 'mongodb+srv://')):
+        from .mongo import MongoBackend
+        return MongoBackend(url)
+    if url.startswith('sqlite:///'):
+        return SQLiteBackend(url[len('sqlite:///'):])
+    if url:
+        raise ValueError(f"Unsupported storage URL: {url}")
+    return SQLiteBackend()
+
+
+__all__ = ['StorageBackend', 'SQLiteBackend', 'create_backend']
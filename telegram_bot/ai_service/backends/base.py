@@ -0,0 +1,58 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+
+class StorageBackend(ABC):
+    """
+    Asynchronous storage interface for dialogues, recommendations, users and feedback.
+
+    Records returned by the readers have the same shape as the rows of the
+    SQLite database: id, user_id, issue_id, timestamp ('YYYY-MM-DD HH:MM:SS',
+    UTC) and the decoded dialogue_json / recommendations_json.
+    """
+
+    @abstractmethod
+    async def init(self) -> None:
+        """Create the schema / indexes; safe to call repeatedly"""
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Release connections held by the backend"""
+
+    @abstractmethod
+    async def log_dialogue(self, user_id: str, issue_id: str, dialogue: List[Dict[str, str]]) -> int:
+        """Store a dialogue and return its ID"""
+
+    @abstractmethod
+    async def log_dialogues_bulk(self, records: List[Tuple[str, str, List[Dict[str, str]]]]) -> List[int]:
+        """Store many (user_id, issue_id, dialogue) tuples in one batch and return their IDs"""
+
+    @abstractmethod
+    async def log_book_recommendations(self, user_id: str, issue_id: str, recommendations: Dict,
+                                       dialogue_id: int) -> int:
+        """Store book recommendations and return their ID"""
+
+    @abstractmethod
+    async def get_dialogue_by_id(self, dialogue_id: int) -> Optional[Dict]:
+        """Return a dialogue or None if not found"""
+
+    @abstractmethod
+    async def get_user_dialogues(self, user_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """Return dialogues of a user, newest first"""
+
+    @abstractmethod
+    async def get_user_recommendations(self, user_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """Return book recommendations of a user, newest first"""
+
+    @abstractmethod
+    async def save_user(self, user_id: int, username: Optional[str]) -> None:
+        """Create or update a user"""
+
+    @abstractmethod
+    async def save_feedback(self, user_id: int, feedback_text: str) -> int:
+        """Store user feedback and return its ID"""
+
+    async def get_latest_user_dialogue(self, user_id: str) -> Optional[Dict]:
+        """Return the most recent dialogue of a user or None"""
+        dialogues = await self.get_user_dialogues(user_id, limit=1)
+        return dialogues[0] if dialogues else None
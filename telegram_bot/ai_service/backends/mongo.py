@@ -0,0 +1,151 @@
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+import logging
+from .base import StorageBackend
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo import ASCENDING, DESCENDING, ReturnDocument
+except ImportError:  # motor is only needed when the MongoDB backend is selected
+    AsyncIOMotorClient = None
+    ASCENDING = DESCENDING = ReturnDocument = None
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# База данных по умолчанию, если в URL она не указана
+DEFAULT_DATABASE_NAME = 'psychological_help'
+
+# Формат времени совпадает с CURRENT_TIMESTAMP в SQLite
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _utc_now() -> datetime:
+    """Current UTC time truncated to seconds, like CURRENT_TIMESTAMP in SQLite"""
+    return datetime.now(timezone.utc).replace(microsecond=0, tzinfo=None)
+
+
+def _to_record(document: Dict, json_field: str) -> Dict:
+    """Convert a MongoDB document into the record shape returned by the SQLite backend"""
+    record = {
+        'id': document['_id'],
+        'user_id': document['user_id'],
+        'issue_id': document['issue_id'],
+        'timestamp': document['timestamp'].strftime(TIMESTAMP_FORMAT),
+    }
+    if 'dialogue_id' in document:
+        record['dialogue_id'] = document['dialogue_id']
+    record[json_field] = document[json_field]
+    return record
+
+
+class MongoBackend(StorageBackend):
+    """
+    Storage backend on MongoDB through the asynchronous motor driver.
+
+    Documents keep integer IDs allocated from a counters collection so that
+    dialogue and recommendation IDs stay compatible with the SQLite backend.
+    """
+
+    def __init__(self, url: str = 'mongodb://localhost:27017', database_name: Optional[str] = None,
+                 client=None):
+        """
+        Args:
+            url (str): MongoDB connection URL
+            database_name (Optional[str]): Database name, taken from the URL or the default when omitted
+            client: Ready motor client, mainly for tests with an in-process stand-in
+        """
+        if client is None:
+            if AsyncIOMotorClient is None:
+                raise ImportError("The MongoDB backend requires the motor package")
+            client = AsyncIOMotorClient(url)
+        self.client = client
+        if database_name is None:
+            try:
+                database_name = client.get_default_database().name
+            except Exception:
+                database_name = DEFAULT_DATABASE_NAME
+        self.db = client[database_name]
+
+    async def init(self) -> None:
+        await self.db.dialogues.create_index([('user_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)],
+                                             name='idx_dialogues_user_timestamp')
+        await self.db.book_recommendations.create_index(
+            [('user_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)],
+            name='idx_book_recommendations_user_timestamp')
+        await self.db.book_recommendations.create_index([('dialogue_id', ASCENDING)],
+                                                        name='idx_book_recommendations_dialogue_id')
+        await self.db.feedback.create_index([('user_id', ASCENDING), ('feedback_date', DESCENDING)],
+                                            name='idx_feedback_user_date')
+        logging.info(f"MongoDB storage initialized in database {self.db.name}")
+
+    async def close(self) -> None:
+        self.client.close()
+
+    async def _next_ids(self, collection: str, count: int = 1) -> List[int]:
+        """Reserve a contiguous range of integer IDs for a collection"""
+        counter = await self.db.counters.find_one_and_update(
+            {'_id': collection}, {'$inc': {'value': count}},
+            upsert=True, return_document=ReturnDocument.AFTER)
+        last_id = counter['value']
+        return list(range(last_id - count + 1, last_id + 1))
+
+    async def log_dialogue(self, user_id: str, issue_id: str, dialogue: List[Dict[str, str]]) -> int:
+        return (await self.log_dialogues_bulk([(user_id, issue_id, dialogue)]))[0]
+
+    async def log_dialogues_bulk(self, records: List[Tuple[str, str, List[Dict[str, str]]]]) -> List[int]:
+        if not records:
+            return []
+        ids = await self._next_ids('dialogues', len(records))
+        timestamp = _utc_now()
+        documents = [
+            {'_id': dialogue_id, 'user_id': user_id, 'issue_id': issue_id,
+             'timestamp': timestamp, 'dialogue_json': dialogue}
+            for dialogue_id, (user_id, issue_id, dialogue) in zip(ids, records)
+        ]
+        await self.db.dialogues.insert_many(documents, ordered=False)
+        logging.info(f"{len(ids)} dialogues logged with IDs {ids[0]}-{ids[-1]}")
+        return ids
+
+    async def log_book_recommendations(self, user_id: str, issue_id: str, recommendations: Dict,
+                                       dialogue_id: int) -> int:
+        recommendation_id = (await self._next_ids('book_recommendations'))[0]
+        await self.db.book_recommendations.insert_one({
+            '_id': recommendation_id, 'user_id': user_id, 'issue_id': issue_id,
+            'timestamp': _utc_now(), 'recommendations_json': recommendations, 'dialogue_id': dialogue_id
+        })
+        logging.info(f"Book recommendations logged with ID: {recommendation_id}")
+        return recommendation_id
+
+    async def get_dialogue_by_id(self, dialogue_id: int) -> Optional[Dict]:
+        document = await self.db.dialogues.find_one({'_id': dialogue_id})
+        return _to_record(document, 'dialogue_json') if document else None
+
+    async def _find_user_records(self, collection: str, json_field: str, user_id: str,
+                                 limit: Optional[int]) -> List[Dict]:
+        cursor = self.db[collection].find({'user_id': user_id}).sort([('timestamp', DESCENDING),
+                                                                      ('_id', DESCENDING)])
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return [_to_record(document, json_field) async for document in cursor]
+
+    async def get_user_dialogues(self, user_id: str, limit: Optional[int] = None) -> List[Dict]:
+        return await self._find_user_records('dialogues', 'dialogue_json', user_id, limit)
+
+    async def get_user_recommendations(self, user_id: str, limit: Optional[int] = None) -> List[Dict]:
+        return await self._find_user_records('book_recommendations', 'recommendations_json', user_id, limit)
+
+    async def save_user(self, user_id: int, username: Optional[str]) -> None:
+        await self.db.users.replace_one({'_id': user_id}, {'_id': user_id, 'username': username, 'dialogs': ''},
+                                        upsert=True)
+        logging.info(f"User {username} saved")
+
+    async def save_feedback(self, user_id: int, feedback_text: str) -> int:
+        feedback_id = (await self._next_ids('feedback'))[0]
+        await self.db.feedback.insert_one({'_id': feedback_id, 'user_id': user_id, 'feedback': feedback_text,
+                                           'feedback_date': _utc_now()})
+        logging.info(f"Feedback from user {user_id} saved with ID: {feedback_id}")
+        return feedback_id
@@ -0,0 +1,75 @@
+import asyncio
+import os
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+from .base import StorageBackend
+from .. import database, storage
+
+# Path of the SQLite backend that is open in this process, if any
+_open_path: Optional[str] = None
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Storage backend on top of the SQLite database module.
+
+    Blocking sqlite3 calls run in worker threads and share the database
+    connection pool.
+
+    The database module, its pool and the shards are process-global: init()
+    makes database_path the process's DATABASE_PATH, and only one path can be
+    open at a time. Opening a backend with another path before the first one
+    is closed raises ValueError.
+    """
+
+    def __init__(self, database_path: Optional[str] = None):
+        self.database_path = database_path
+        self._opened_path: Optional[str] = None
+
+    async def init(self) -> None:
+        global _open_path
+        path = os.path.abspath(self.database_path or database.DATABASE_PATH)
+        if _open_path is not None and _open_path != path:
+            raise ValueError(f"SQLite backend for {_open_path} is open; the database path is process-global, "
+                             f"close it before opening {path}")
+        if self.database_path is not None:
+            database.DATABASE_PATH = self.database_path
+        _open_path = self._opened_path = path
+        await asyncio.to_thread(storage.init_storage)
+
+    async def close(self) -> None:
+        global _open_path
+        if self._opened_path is not None and _open_path == self._opened_path:
+            _open_path = None
+        self._opened_path = None
+        await asyncio.to_thread(database.close_pool)
+
+    async def log_dialogue(self, user_id: str, issue_id: str, dialogue: List[Dict[str, str]]) -> int:
+        return await asyncio.to_thread(database.log_dialogue, user_id, issue_id, dialogue)
+
+    async def log_dialogues_bulk(self, records: List[Tuple[str, str, List[Dict[str, str]]]]) -> List[int]:
+        return await asyncio.to_thread(database.log_dialogues_bulk, records)
+
+    async def log_book_recommendations(self, user_id: str, issue_id: str, recommendations: Dict,
+                                       dialogue_id: int) -> int:
+        return await asyncio.to_thread(database.log_book_recommendations, user_id, issue_id,
+                                       recommendations, dialogue_id)
+
+    async def get_dialogue_by_id(self, dialogue_id: int) -> Optional[Dict]:
+        return await asyncio.to_thread(database.get_dialogue_by_id, dialogue_id)
+
+    async def get_user_dialogues(self, user_id: str, limit: Optional[int] = None) -> List[Dict]:
+        if limit is None:
+            return await asyncio.to_thread(database.get_user_dialogues, user_id)
+        return await asyncio.to_thread(lambda: list(islice(database.iter_user_dialogues(user_id, limit), limit)))
+
+    async def get_user_recommendations(self, user_id: str, limit: Optional[int] = None) -> List[Dict]:
+        if limit is None:
+            return await asyncio.to_thread(database.get_user_recommendations, user_id)
+        return await asyncio.to_thread(lambda: list(islice(database.iter_user_recommendations(user_id, limit), limit)))
+
+    async def save_user(self, user_id: int, username: Optional[str]) -> None:
+        await asyncio.to_thread(storage.save_user, user_id, username)
+
+    async def save_feedback(self, user_id: int, feedback_text: str) -> int:
+        return await asyncio.to_thread(storage.save_feedback, user_id, feedback_text)
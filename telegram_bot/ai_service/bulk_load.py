@@ -0,0 +1,189 @@
+import sqlite3
+import gzip
+import json
+from collections import Counter
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import time
+import argparse
+import logging
+from . import database
+from .compression import encode_json
+from .search import extract_search_text
+from .analytics import count_messages, count_new_messages, dialogue_tail
+from .migrations import restore_deferred_indexes
+from .sharding import get_user_database_path
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Число диалогов в одной транзакции загрузки
+BATCH_SIZE = 5000
+
+
+def iter_jsonl(path: str) -> Iterator[Dict]:
+    """
+    Read records from a JSONL file written by export.py
+
+    Args:
+        path (str): Path to a .jsonl or .jsonl.gz file
+
+    Yields:
+        Dict: One decoded record per line
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _drop_indexes(conn: sqlite3.Connection, table: str) -> bool:
+    """Drop secondary indexes of a table, recording them in deferred_indexes in the same transaction"""
+    rows = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                        (table,)).fetchall()
+    with conn:
+        # If the load is killed, ensure_db() rebuilds them from the journal
+        conn.executemany("INSERT OR REPLACE INTO deferred_indexes (name, sql) VALUES (?, ?)", rows)
+        for name, _ in rows:
+            conn.execute(f"DROP INDEX {name}")
+    return bool(rows)
+
+
+def _load_tails(conn: sqlite3.Connection, batch: List[Dict]) -> Dict[str, Tuple[str, List[Dict[str, str]]]]:
+    """Read the latest snapshot tails of the users in a batch"""
+    users = json.dumps(sorted({str(record['user_id']) for record in batch}))
+    rows = conn.execute("SELECT user_id, issue_id, tail_json FROM dialogue_tails "
+                        "WHERE user_id IN (SELECT value FROM json_each(?))", (users,)).fetchall()
+    return {user_id: (issue_id, json.loads(tail_json)) for user_id, issue_id, tail_json in rows}
+
+
+def _insert_batch(conn: sqlite3.Connection, db_path: str, batch: List[Dict], index_text: bool) -> None:
+    """Insert one batch of dialogues, their search text and rollup counters in a single transaction"""
+    rows: List[Tuple] = []
+    rollups: Counter = Counter()
+    messages: Counter = Counter()
+    # Snapshots continuing the user's previous one add only their new messages, as in log_dialogue()
+    tails = _load_tails(conn, batch)
+    for record in batch:
+        dialogue = record['dialogue_json']
+        user_id, issue_id = str(record['user_id']), str(record['issue_id'])
+        timestamp = record.get('timestamp')
+        rows.append((user_id, issue_id, timestamp, encode_json(dialogue, db_path, database.COMPRESSION_ENABLED)))
+        key = (timestamp[:10] if timestamp else time.strftime('%Y-%m-%d', time.gmtime()), issue_id)
+        last = tails.get(user_id)
+        added = count_new_messages(last[1], dialogue) if last and last[0] == issue_id else None
+        rollups[key] += 1 if added is None else 0
+        messages[key] += count_messages(dialogue) if added is None else added
+        tails[user_id] = (issue_id, dialogue_tail(dialogue))
+
+    conn.executemany('''
+        INSERT INTO dialogues (user_id, issue_id, timestamp, dialogue_json)
+        VALUES (?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?)
+    ''', rows)
+    # The load holds the write lock, so AUTOINCREMENT handed out a contiguous range of IDs
+    last_id = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'dialogues'").fetchone()[0]
+    first_id = last_id - len(batch) + 1
+
+    if index_text:
+        conn.executemany("INSERT INTO dialogue_fts (rowid, content) VALUES (?, ?)",
+                         ((first_id + offset, extract_search_text(record['dialogue_json']))
+                          for offset, record in enumerate(batch)))
+    conn.executemany('''
+        INSERT INTO daily_issue_stats (day, issue_id, dialogues, messages)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (day, issue_id) DO UPDATE SET
+            dialogues = dialogues + excluded.dialogues,
+            messages = messages + excluded.messages
+    ''', ((day, issue_id, count, messages[(day, issue_id)]) for (day, issue_id), count in rollups.items()))
+    conn.executemany('''
+        INSERT INTO dialogue_tails (user_id, issue_id, tail_json) VALUES (?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET issue_id = excluded.issue_id, tail_json = excluded.tail_json
+    ''', ((user_id, issue_id, json.dumps(tail, ensure_ascii=False)) for user_id, (issue_id, tail) in tails.items()))
+    conn.commit()
+
+
+def _open_for_load(db_path: str, defer_indexes: bool) -> Tuple[sqlite3.Connection, bool]:
+    """Open a database file for the load and drop its dialogues indexes if requested"""
+    database.ensure_db(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -65536")
+    return conn, _drop_indexes(conn, 'dialogues') if defer_indexes else False
+
+
+def bulk_load_dialogues(records: Iterable[Dict], batch_size: Optional[int] = None,
+                        defer_indexes: bool = True, index_text: bool = True) -> int:
+    """
+    Load many dialogues into the database at high speed
+
+    Rows are written with executemany in large transactions with relaxed
+    fsync; lookup indexes are dropped for the duration of the load and
+    rebuilt once at the end; if the load is interrupted, the next
+    ensure_db() rebuilds them. New IDs are assigned, timestamps are kept.
+    With sharding every dialogue goes to the shard of its user.
+
+    Args:
+        records (Iterable[Dict]): Records with user_id, issue_id, dialogue_json and optional timestamp
+            ('YYYY-MM-DD HH:MM:SS'), e.g. from iter_jsonl()
+        batch_size (Optional[int]): Dialogues per transaction, BATCH_SIZE by default
+        defer_indexes (bool): Drop and rebuild the dialogues indexes around the load
+        index_text (bool): Add the dialogues to the full-text index
+
+    Returns:
+        int: Number of loaded dialogues
+    """
+    batch_size = batch_size or BATCH_SIZE
+    database.init_db()
+
+    started = time.time()
+    loaded = 0
+    # Database file -> (connection, whether indexes were dropped), opened on first use
+    targets: Dict[str, Tuple[sqlite3.Connection, bool]] = {}
+    try:
+        iterator = iter(records)
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                break
+            by_path: Dict[str, List[Dict]] = {}
+            for record in batch:
+                by_path.setdefault(get_user_database_path(str(record['user_id'])), []).append(record)
+            for db_path, records_in_file in by_path.items():
+                if db_path not in targets:
+                    targets[db_path] = _open_for_load(db_path, defer_indexes)
+                _insert_batch(targets[db_path][0], db_path, records_in_file, index_text)
+            loaded += len(batch)
+            logging.info(f"Loaded {loaded} dialogues")
+    finally:
+        for conn, dropped in targets.values():
+            if dropped:
+                logging.info("Rebuilding dialogues indexes")
+                restore_deferred_indexes(conn)
+            conn.execute("PRAGMA synchronous = FULL")
+            conn.close()
+
+    elapsed = time.time() - started
+    logging.info(f"Bulk load of {loaded} dialogues completed in {elapsed:.1f}s "
+                 f"({loaded / elapsed if elapsed else 0:.0f} dialogues/s)")
+    return loaded
+
+
+def main() -> None:
+    """Command line entry point for importing JSONL exports"""
+    parser = argparse.ArgumentParser(description="Bulk import dialogues from JSONL exports")
+    parser.add_argument('paths', nargs='+', help="dialogues .jsonl or .jsonl.gz files")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="dialogues per transaction")
+    parser.add_argument('--keep-indexes', action='store_true', help="do not drop indexes during the load")
+    parser.add_argument('--no-search-index', action='store_true', help="skip the full-text index")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        bulk_load_dialogues(iter_jsonl(path), args.batch_size, not args.keep_indexes, not args.no_search_index)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Максимальное число записей в каждом кэше; 0 отключает кэширование
+CACHE_MAX_ENTRIES = 1024
+# Время жизни записи кэша в секундах
+CACHE_TTL_SECONDS = 300.0
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry expiry and hit/miss counters.
+
+    Size and TTL are read from the module constants on every call unless
+    given explicitly, so they can be tuned at runtime.
+    """
+
+    def __init__(self, name: str, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.name = name
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def max_entries(self) -> int:
+        return CACHE_MAX_ENTRIES if self._max_entries is None else self._max_entries
+
+    @property
+    def ttl_seconds(self) -> float:
+        return CACHE_TTL_SECONDS if self._ttl_seconds is None else self._ttl_seconds
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Look up a key
+
+        Args:
+            key (Hashable): Cache key
+
+        Returns:
+            Tuple[bool, Any]: (True, value) on a hit, (False, None) on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entries over the size limit"""
+        max_entries = self.max_entries
+        if max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Return the cached value or load, store and return it
+
+        None results of the loader are not cached.
+        """
+        found, value = self.get(key)
+        if found:
+            return value
+        value = loader()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop one key"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        """Drop all entries, counters are kept"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Collect cache metrics
+
+        Returns:
+            Dict[str, Any]: size, hits, misses, hit_rate, evictions, expirations and invalidations
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+
+class MemoizedDecode:
+    """
+    Decoder shared by all copies of one cached record.
+
+    The first access to the JSON column decodes it, later copies of the
+    record get the same decoded object without parsing again.
+    """
+
+    def __init__(self, decode: Callable[[Any], Any]):
+        self._decode = decode
+        self._lock = threading.Lock()
+        self._decoded = False
+        self._value = None
+
+    def __call__(self, raw: Any) -> Any:
+        with self._lock:
+            if not self._decoded:
+                self._value = self._decode(raw)
+                self._decoded = True
+            return self._value
+
+
+# Диалоги по (путь к базе, ID) и рекомендации пользователя по (путь к базе, user_id)
+dialogue_cache = TTLCache('dialogues')
+recommendations_cache = TTLCache('book_recommendations')
+
+
+def clear_caches() -> None:
+    """Drop all cached records, e.g. after the database file was replaced"""
+    dialogue_cache.clear()
+    recommendations_cache.clear()
+    logging.info("Record caches cleared")
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Return metrics of all caches keyed by cache name"""
+    return {cache.name: cache.stats() for cache in (dialogue_cache, recommendations_cache)}
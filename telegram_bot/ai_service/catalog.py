@@ -0,0 +1,304 @@
+import sqlite3
+from typing import Any, Dict, List, Optional
+import argparse
+import hashlib
+import json
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Every book and resource of a recommendation is stored once in catalog_items,
+# keyed by a hash of its identity fields, and linked to the recommendation
+# record through recommendation_items. Links are written in the same
+# transaction as the record and are kept when the record is archived, so
+# the counters describe everything the bot has ever recommended.
+
+# Раздел рекомендаций -> вид элемента каталога
+CATALOG_SECTIONS = {'books': 'book', 'resources': 'resource'}
+
+# Поля, по которым элементы считаются одинаковыми
+IDENTITY_FIELDS = {'book': ('title', 'author'), 'resource': ('title', 'link')}
+
+# Поля, которые относятся к конкретной рекомендации и не попадают в каталог
+PER_RECOMMENDATION_FIELDS = ('why_relevant',)
+
+# Ключ заглушки в recommendations_json у записей, хранящихся только в каталоге
+STUB_KEY = '$catalog'
+# Ключ списка полей элемента каталога, отсутствующих в конкретной рекомендации
+UNSET_KEY = '$unset'
+
+
+def _normalize(value: Any) -> str:
+    """Case- and whitespace-insensitive form of an identity field"""
+    return ' '.join(str(value or '').split()).casefold()
+
+
+def item_hash(kind: str, item: Dict[str, Any]) -> str:
+    """
+    Compute the content hash identifying a catalog item
+
+    Args:
+        kind (str): 'book' or 'resource'
+        item (Dict[str, Any]): Book or resource as returned by the LLM
+
+    Returns:
+        str: Hex digest of the normalized identity fields
+    """
+    identity = [kind] + [_normalize(item.get(field)) for field in IDENTITY_FIELDS[kind]]
+    return hashlib.sha256(json.dumps(identity, ensure_ascii=False).encode('utf-8')).hexdigest()[:32]
+
+
+def catalog_stub(recommendations: Any) -> Optional[Dict[str, List[str]]]:
+    """
+    Build the placeholder stored instead of the full recommendations JSON
+
+    Args:
+        recommendations (Any): The recommendations provided
+
+    Returns:
+        Optional[Dict[str, List[str]]]: Stub listing the sections present, or None
+        if the value has parts the catalog cannot reproduce exactly
+    """
+    if not isinstance(recommendations, dict) or not set(recommendations) <= set(CATALOG_SECTIONS):
+        return None
+    for items in recommendations.values():
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return None
+    return {STUB_KEY: list(recommendations)}
+
+
+def is_catalog_stub(value: Any) -> bool:
+    """Check whether a decoded recommendations_json value is a catalog placeholder"""
+    return isinstance(value, dict) and STUB_KEY in value
+
+
+def _get_or_create_item(conn: sqlite3.Connection, kind: str, item: Dict[str, Any]) -> sqlite3.Row:
+    """Return (id, item_json) of the catalog item, inserting it on first sight"""
+    content_hash = item_hash(kind, item)
+    catalog_item = {key: value for key, value in item.items() if key not in PER_RECOMMENDATION_FIELDS}
+    conn.execute('''
+        INSERT INTO catalog_items (kind, content_hash, title, author, item_json)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (content_hash) DO NOTHING
+    ''', (kind, content_hash, item.get('title'), item.get('author'),
+          json.dumps(catalog_item, ensure_ascii=False)))
+    return conn.execute("SELECT id, item_json FROM catalog_items WHERE content_hash = ?",
+                        (content_hash,)).fetchone()
+
+
+def _overrides(catalog_item: Dict[str, Any], item: Dict[str, Any]) -> Optional[str]:
+    """Encode the fields of an item that differ from its catalog entry"""
+    overrides = {key: value for key, value in item.items()
+                 if key not in catalog_item or catalog_item[key] != value}
+    unset = [key for key in catalog_item if key not in item]
+    if unset:
+        overrides[UNSET_KEY] = unset
+    return json.dumps(overrides, ensure_ascii=False) if overrides else None
+
+
+def store_recommendation_items(conn: sqlite3.Connection, recommendation_id: int, issue_id: str,
+                               recommendations: Any) -> int:
+    """
+    Link the books and resources of a recommendation record to the catalog
+
+    Args:
+        conn (sqlite3.Connection): Connection with the open write transaction
+        recommendation_id (int): ID of the book_recommendations record
+        issue_id (str): ID of the psychological issue
+        recommendations (Any): The recommendations provided
+
+    Returns:
+        int: Number of linked items
+    """
+    if not isinstance(recommendations, dict):
+        return 0
+    links = []
+    for section, kind in CATALOG_SECTIONS.items():
+        items = recommendations.get(section)
+        if not isinstance(items, list):
+            continue
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            item_id, item_json = _get_or_create_item(conn, kind, item)
+            links.append((recommendation_id, kind, position, issue_id, item_id,
+                          _overrides(json.loads(item_json), item)))
+    conn.executemany('''
+        INSERT OR REPLACE INTO recommendation_items
+            (recommendation_id, kind, position, issue_id, item_id, overrides_json)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', links)
+    return len(links)
+
+
+def load_recommendations(conn: sqlite3.Connection, recommendation_id: int, sections: List[str]) -> Dict:
+    """
+    Rebuild the recommendations JSON of a record from the catalog
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the hot database
+        recommendation_id (int): ID of the book_recommendations record
+        sections (List[str]): Sections of the original value, in order
+
+    Returns:
+        Dict: Recommendations in the format returned by the LLM
+    """
+    kinds = {kind: section for section, kind in CATALOG_SECTIONS.items()}
+    result: Dict[str, List[Dict]] = {section: [] for section in sections}
+    rows = conn.execute('''
+        SELECT l.kind, l.overrides_json, c.item_json
+        FROM recommendation_items l JOIN catalog_items c ON c.id = l.item_id
+        WHERE l.recommendation_id = ?
+        ORDER BY l.kind, l.position
+    ''', (recommendation_id,)).fetchall()
+    for kind, overrides_json, item_json in rows:
+        item = json.loads(item_json)
+        if overrides_json is not None:
+            overrides = json.loads(overrides_json)
+            for key in overrides.pop(UNSET_KEY, []):
+                item.pop(key, None)
+            item.update(overrides)
+        result.setdefault(kinds[kind], []).append(item)
+    return result
+
+
+def decode_recommendations(value: Any, db_path: str, recommendation_id: int) -> Any:
+    """
+    Decode a recommendations_json value, resolving catalog placeholders
+
+    Args:
+        value (Any): Value read from the database
+        db_path (str): Path to the database file the value was read from
+        recommendation_id (int): ID of the record
+
+    Returns:
+        Any: Decoded recommendations
+    """
+    from .compression import decode_json
+    from .database import pooled_connection
+    from .sharding import get_record_database_path
+
+    decoded = decode_json(value, db_path)
+    if not is_catalog_stub(decoded):
+        return decoded
+    # Links stay in the hot database when the record itself is archived
+    with pooled_connection(get_record_database_path(recommendation_id)) as conn:
+        return load_recommendations(conn, recommendation_id, decoded[STUB_KEY])
+
+
+def backfill_catalog(conn: sqlite3.Connection, db_path: Optional[str], batch_size: int = 500) -> int:
+    """
+    Link recommendation records that have no catalog entries yet
+
+    Runs inside the caller's transaction.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        db_path (Optional[str]): Path to the database file, used to decode compressed
+            rows; if None, compressed rows are skipped
+        batch_size (int): Number of records decoded per query
+
+    Returns:
+        int: Number of records linked
+    """
+    from .compression import decode_json, is_compressed
+
+    linked = 0
+    last_id = 0
+    while True:
+        rows = conn.execute('''
+            SELECT r.id, r.issue_id, r.recommendations_json FROM book_recommendations r
+            WHERE r.id > ? AND NOT EXISTS (
+                SELECT 1 FROM recommendation_items l WHERE l.recommendation_id = r.id
+            )
+            ORDER BY r.id LIMIT ?
+        ''', (last_id, batch_size)).fetchall()
+        if not rows:
+            break
+        for recommendation_id, issue_id, value in rows:
+            if db_path is None and is_compressed(value):
+                continue
+            try:
+                recommendations = decode_json(value, db_path)
+            except ValueError:
+                logging.warning(f"Skipping undecodable recommendations record {recommendation_id}")
+                continue
+            if store_recommendation_items(conn, recommendation_id, issue_id, recommendations):
+                linked += 1
+        last_id = rows[-1][0]
+    logging.info(f"Linked {linked} recommendation records to the catalog")
+    return linked
+
+
+def get_top_items(kind: str = 'book', issue_id: Optional[str] = None, limit: int = 10) -> List[Dict]:
+    """
+    Retrieve the most often recommended catalog items
+
+    Args:
+        kind (str): 'book' or 'resource'
+        issue_id (Optional[str]): Restrict counts to one issue
+        limit (int): Maximum number of items
+
+    Returns:
+        List[Dict]: Rows with content_hash, title, author, recommendations and item
+        (the catalog entry) keys, most recommended first
+    """
+    from .sharding import is_enabled, query_all
+
+    query = "SELECT item_id, COUNT(*) AS recommendations FROM recommendation_items WHERE kind = ?"
+    params: List = [kind]
+    if issue_id is not None:
+        query += " AND issue_id = ?"
+        params.append(issue_id)
+    query += " GROUP BY item_id"
+    # Every shard has its own catalog, items are matched by hash and the top is taken after merging
+    if not is_enabled():
+        query += " ORDER BY recommendations DESC, item_id LIMIT ?"
+        params.append(limit)
+
+    totals: Dict[str, Dict] = {}
+    for row in query_all(f'''
+        SELECT c.content_hash, c.title, c.author, t.recommendations, c.item_json
+        FROM ({query}) t JOIN catalog_items c ON c.id = t.item_id
+        ORDER BY t.recommendations DESC, t.item_id
+    ''', tuple(params)):
+        total = totals.get(row['content_hash'])
+        if total is None:
+            totals[row['content_hash']] = {'content_hash': row['content_hash'], 'title': row['title'],
+                                           'author': row['author'], 'recommendations': row['recommendations'],
+                                           'item': json.loads(row['item_json'])}
+        else:
+            total['recommendations'] += row['recommendations']
+    return sorted(totals.values(), key=lambda total: -total['recommendations'])[:limit]
+
+
+def main() -> None:
+    """Command line entry point for printing the most recommended items"""
+    from . import database
+    from .sharding import get_database_paths
+
+    parser = argparse.ArgumentParser(description="Most recommended books and resources")
+    parser.add_argument('--kind', choices=sorted(IDENTITY_FIELDS), default='book')
+    parser.add_argument('--issue', dest='issue_id', help="restrict to one issue ID")
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--backfill', action='store_true',
+                        help="link recommendation records written before the catalog existed")
+    args = parser.parse_args()
+
+    if args.backfill:
+        for db_path in get_database_paths():
+            database.ensure_db(db_path)
+            conn = sqlite3.connect(db_path)
+            backfill_catalog(conn, db_path)
+            conn.commit()
+            conn.close()
+    for item in get_top_items(args.kind, args.issue_id, args.limit):
+        print(f"{item['recommendations']}\t{item['title']}\t{item['author'] or ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+import sqlite3
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+from collections import Counter
+import json
+import struct
+import time
+import zlib
+import argparse
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Format marker of compressed values: raw deflate stream with an optional preset
+# dictionary. Uncompressed values are stored as TEXT, compressed ones as BLOB with
+# a 5-byte header: marker byte + big-endian dictionary id (0 = no dictionary).
+FORMAT_ZLIB = 1
+HEADER = struct.Struct('>BI')
+
+COMPRESSION_LEVEL = 9
+# zlib uses at most the last 32 KB of a preset dictionary
+DICTIONARY_SIZE = 32 * 1024
+
+# Tables and JSON columns that are stored through the codec
+COMPRESSED_COLUMNS = (
+    ('dialogues', 'dialogue_json'),
+    ('book_recommendations', 'recommendations_json'),
+)
+
+# Dictionaries are immutable once stored, so they are cached per database file
+_dictionaries: Dict[Tuple[str, int], bytes] = {}
+_active_dictionaries: Dict[str, int] = {}
+
+
+def is_compressed(value: Union[str, bytes]) -> bool:
+    """Check whether a stored value carries the compressed format marker"""
+    return isinstance(value, bytes) and len(value) >= HEADER.size and value[0] == FORMAT_ZLIB
+
+
+def compress(text: str, dictionary: Optional[bytes] = None, dictionary_id: int = 0,
+             level: int = COMPRESSION_LEVEL) -> bytes:
+    """
+    Compress a JSON string into the stored binary format
+
+    Args:
+        text (str): JSON string to compress
+        dictionary (Optional[bytes]): Preset dictionary
+        dictionary_id (int): ID of the dictionary written into the header
+        level (int): zlib compression level
+
+    Returns:
+        bytes: Header followed by the raw deflate stream
+    """
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        dictionary_id = 0
+    payload = compressor.compress(text.encode('utf-8')) + compressor.flush()
+    return HEADER.pack(FORMAT_ZLIB, dictionary_id) + payload
+
+
+def decompress(blob: bytes, dictionary: Optional[bytes] = None) -> str:
+    """
+    Decompress a stored binary value back into a JSON string
+
+    Args:
+        blob (bytes): Value produced by compress()
+        dictionary (Optional[bytes]): Preset dictionary referenced in the header
+
+    Returns:
+        str: Original JSON string
+    """
+    if dictionary:
+        decompressor = zlib.decompressobj(-15, zdict=dictionary)
+    else:
+        decompressor = zlib.decompressobj(-15)
+    data = decompressor.decompress(blob[HEADER.size:]) + decompressor.flush()
+    return data.decode('utf-8')
+
+
+def get_dictionary_id(blob: bytes) -> int:
+    """Read the dictionary id from the header of a compressed value"""
+    return HEADER.unpack_from(blob)[1]
+
+
+def _load_dictionary(db_path: str, dictionary_id: int) -> bytes:
+    """Return a dictionary from the cache, reading it from the database on a miss"""
+    key = (db_path, dictionary_id)
+    if key not in _dictionaries:
+        conn = sqlite3.connect(db_path)
+        row = conn.execute("SELECT data FROM compression_dictionaries WHERE id = ?", (dictionary_id,)).fetchone()
+        conn.close()
+        if row is None:
+            raise ValueError(f"Compression dictionary {dictionary_id} not found in {db_path}")
+        _dictionaries[key] = row[0]
+    return _dictionaries[key]
+
+
+def get_active_dictionary(db_path: str) -> Tuple[int, Optional[bytes]]:
+    """
+    Get the dictionary used for new writes (the most recently trained one)
+
+    Args:
+        db_path (str): Path to the database file
+
+    Returns:
+        Tuple[int, Optional[bytes]]: Dictionary id and data, (0, None) if none was trained
+    """
+    if db_path not in _active_dictionaries:
+        conn = sqlite3.connect(db_path)
+        row = conn.execute("SELECT MAX(id) FROM compression_dictionaries").fetchone()
+        conn.close()
+        _active_dictionaries[db_path] = row[0] or 0
+
+    dictionary_id = _active_dictionaries[db_path]
+    if not dictionary_id:
+        return 0, None
+    return dictionary_id, _load_dictionary(db_path, dictionary_id)
+
+
+def encode_json(value: Any, db_path: str, compressed: bool = True) -> Union[str, bytes]:
+    """
+    Serialize a value for storage in a JSON column
+
+    Args:
+        value (Any): Value to serialize
+        db_path (str): Path to the database file, used to pick the active dictionary
+        compressed (bool): If False, plain JSON text is returned
+
+    Returns:
+        Union[str, bytes]: JSON text or compressed blob
+    """
+    text = json.dumps(value, ensure_ascii=False)
+    if not compressed:
+        return text
+    dictionary_id, dictionary = get_active_dictionary(db_path)
+    return compress(text, dictionary, dictionary_id)
+
+
+def decode_json(value: Union[str, bytes], db_path: str) -> Any:
+    """
+    Deserialize a stored JSON column value, compressed or not
+
+    Args:
+        value (Union[str, bytes]): Value read from the database
+        db_path (str): Path to the database file, used to load dictionaries
+
+    Returns:
+        Any: Decoded value
+    """
+    if not is_compressed(value):
+        return json.loads(value)
+    dictionary_id = get_dictionary_id(value)
+    dictionary = _load_dictionary(db_path, dictionary_id) if dictionary_id else None
+    return json.loads(decompress(value, dictionary))
+
+
+def train_dictionary(samples: Iterable[Any], size: int = DICTIONARY_SIZE) -> bytes:
+    """
+    Build a preset dictionary from decoded sample values
+
+    Strings that occur often in the samples (system prompts, initial
+    messages, JSON keys) are collected and ordered so that the most
+    valuable ones end up at the end of the dictionary, where zlib can
+    reference them with the shortest distances.
+
+    Args:
+        samples (Iterable[Any]): Decoded dialogue or recommendation values
+        size (int): Maximum dictionary size in bytes
+
+    Returns:
+        bytes: Dictionary data
+    """
+    fragments: Counter = Counter()
+
+    def collect(value: Any) -> None:
+        if isinstance(value, dict):
+            for key, item in value.items():
+                fragments[json.dumps(key, ensure_ascii=False) + ': '] += 1
+                collect(item)
+        elif isinstance(value, list):
+            for item in value:
+                collect(item)
+        elif isinstance(value, str):
+            fragments[json.dumps(value, ensure_ascii=False)] += 1
+
+    for sample in samples:
+        collect(sample)
+
+    # Fragments seen once do not help compressing other rows
+    useful = [(count * len(fragment), fragment) for fragment, count in fragments.items() if count > 1]
+    useful.sort()
+    dictionary = ''.join(fragment for _, fragment in useful).encode('utf-8')
+    return dictionary[-size:]
+
+
+def store_dictionary(conn: sqlite3.Connection, db_path: str, data: bytes) -> int:
+    """
+    Save a trained dictionary and make it active for new writes
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        db_path (str): Path to the database file
+        data (bytes): Dictionary data
+
+    Returns:
+        int: ID of the stored dictionary
+    """
+    cursor = conn.execute("INSERT INTO compression_dictionaries (data) VALUES (?)", (data,))
+    conn.commit()
+    dictionary_id = cursor.lastrowid
+    _dictionaries[(db_path, dictionary_id)] = data
+    _active_dictionaries[db_path] = dictionary_id
+    logging.info(f"Stored compression dictionary {dictionary_id} ({len(data)} bytes)")
+    return dictionary_id
+
+
+def train_dictionary_from_database(conn: sqlite3.Connection, db_path: str, sample_size: int = 1000) -> int:
+    """
+    Train a dictionary on the most recent rows and store it
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        db_path (str): Path to the database file
+        sample_size (int): Number of recent rows sampled from each table
+
+    Returns:
+        int: ID of the stored dictionary
+    """
+    logging.info(f"Training compression dictionary on up to {sample_size} rows per table")
+    samples = []
+    for table, column in COMPRESSED_COLUMNS:
+        rows = conn.execute(f"SELECT {column} FROM {table} ORDER BY id DESC LIMIT ?", (sample_size,)).fetchall()
+        samples.extend(decode_json(row[0], db_path) for row in rows)
+    return store_dictionary(conn, db_path, train_dictionary(samples))
+
+
+def recompress_table(conn: sqlite3.Connection, db_path: str, table: str, column: str,
+                     batch_size: int = 500, pause: float = 0.0) -> int:
+    """
+    Rewrite rows of a table with the active dictionary
+
+    Plain JSON rows and rows compressed with an older dictionary are
+    converted in small batches, each in its own transaction, so the job
+    can run alongside the bot without holding the write lock for long.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        db_path (str): Path to the database file
+        table (str): Table name
+        column (str): JSON column name
+        batch_size (int): Number of rows read per batch
+        pause (float): Seconds to sleep between batches
+
+    Returns:
+        int: Number of rewritten rows
+    """
+    dictionary_id, dictionary = get_active_dictionary(db_path)
+    last_id = 0
+    rewritten = 0
+
+    while True:
+        rows = conn.execute(f"SELECT id, {column} FROM {table} WHERE id > ? ORDER BY id LIMIT ?",
+                            (last_id, batch_size)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        updates = []
+        for row_id, value in rows:
+            if is_compressed(value) and get_dictionary_id(value) == dictionary_id:
+                continue
+            text = json.dumps(decode_json(value, db_path), ensure_ascii=False)
+            updates.append((compress(text, dictionary, dictionary_id), row_id))
+
+        if updates:
+            conn.executemany(f"UPDATE {table} SET {column} = ? WHERE id = ?", updates)
+            conn.commit()
+            rewritten += len(updates)
+        if pause:
+            time.sleep(pause)
+
+    logging.info(f"Recompressed {rewritten} rows in {table}.{column}")
+    return rewritten
+
+
+def recompress_database(conn: sqlite3.Connection, db_path: str, batch_size: int = 500, pause: float = 0.0) -> int:
+    """
+    Rewrite all compressible columns with the active dictionary
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        db_path (str): Path to the database file
+        batch_size (int): Number of rows read per batch
+        pause (float): Seconds to sleep between batches
+
+    Returns:
+        int: Total number of rewritten rows
+    """
+    return sum(recompress_table(conn, db_path, table, column, batch_size, pause)
+               for table, column in COMPRESSED_COLUMNS)
+
+
+def main() -> None:
+    """Command line entry point for dictionary training and recompression"""
+    from . import database
+    from .sharding import get_database_paths
+
+    parser = argparse.ArgumentParser(description="Compression maintenance for the dialogues database")
+    parser.add_argument('--train', action='store_true', help="train a new dictionary on recent rows")
+    parser.add_argument('--recompress', action='store_true', help="rewrite existing rows with the active dictionary")
+    parser.add_argument('--sample-size', type=int, default=1000, help="rows sampled per table for training")
+    parser.add_argument('--batch-size', type=int, default=500, help="rows rewritten per transaction")
+    parser.add_argument('--pause', type=float, default=0.0, help="seconds to sleep between batches")
+    args = parser.parse_args()
+
+    # Every shard keeps its own dictionaries, trained on its own rows
+    for db_path in get_database_paths():
+        database.ensure_db(db_path)
+        conn = sqlite3.connect(db_path)
+        if args.train:
+            train_dictionary_from_database(conn, db_path, args.sample_size)
+        if args.recompress:
+            recompress_database(conn, db_path, args.batch_size, args.pause)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
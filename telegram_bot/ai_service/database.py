@@ -1,9 +1,19 @@
 import sqlite3
-from typing import List, Dict
+from typing import Any, Callable, List, Dict, Iterator, Optional, Tuple
 import json
 from datetime import datetime
 import os
 import logging
+import threading
+from contextlib import contextmanager
+from functools import partial
+from .migrations import migrate, restore_deferred_indexes
+from .compression import encode_json, decode_json
+from .search import index_dialogue
+from .analytics import record_recommendations, record_user_dialogue
+from .catalog import catalog_stub, store_recommendation_items, decode_recommendations
+from .sharding import get_user_database_path, get_record_database_path
+from .cache import dialogue_cache, recommendations_cache, clear_caches, MemoizedDecode
 
 # Configure logging
 logging.basicConfig(
@@ -14,52 +24,147 @@ logging.basicConfig(
 # Путь к базе данных относительно корня проекта
 DATABASE_PATH = 'telegram_bot/ai_service/dialogues.db'
 
+# Сжимать ли dialogue_json и recommendations_json при записи.
+# Старые несжатые записи читаются в любом режиме.
+COMPRESSION_ENABLED = False
+
+# Хранить книги и ресурсы рекомендаций только в каталоге (catalog_items),
+# оставляя в recommendations_json короткую заглушку. Каталог заполняется в любом режиме,
+# старые записи связываются с ним миграцией 8 и командой catalog --backfill.
+RECOMMENDATIONS_CATALOG_ONLY = True
+
+# Режим журнала, устанавливается при инициализации базы.
+# WAL позволяет читать параллельно с записью из соединений пула.
+JOURNAL_MODE = 'WAL'
+
+# Уровень PRAGMA synchronous для соединений пула; None - значение SQLite по умолчанию (FULL).
+# С WAL значение NORMAL безопасно для целостности базы, но может потерять последние транзакции при сбое питания.
+SYNCHRONOUS: Optional[str] = None
+
+# Максимальное число простаивающих соединений в пуле на один файл базы
+POOL_SIZE = 8
+BUSY_TIMEOUT_MS = 5000
+
+_pools: Dict[str, List[sqlite3.Connection]] = {}
+_pool_lock = threading.Lock()
+
+# Файлы баз, схема которых уже проверена в этом процессе
+_initialized_paths = set()
+_init_lock = threading.Lock()
+
 def get_db_connection():
     """Create a database connection and return it"""
+    ensure_db(DATABASE_PATH)
     logging.info("Creating database connection")
     conn = sqlite3.connect(DATABASE_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
-def init_db():
-    """Initialize the database with required tables"""
-    logging.info("Initializing database")
-    if not os.path.exists(os.path.dirname(DATABASE_PATH)):
-        os.makedirs(os.path.dirname(DATABASE_PATH))
-        logging.info(f"Created directory: {os.path.dirname(DATABASE_PATH)}")
-        
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Create dialogues table
-    logging.info("Creating dialogues table")
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS dialogues (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            issue_id TEXT NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            dialogue_json TEXT NOT NULL
-        )
-    ''')
-    
-    # Create book recommendations table
-    logging.info("Creating book_recommendations table")
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS book_recommendations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            issue_id TEXT NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            recommendations_json TEXT NOT NULL,
-            dialogue_id INTEGER,
-            FOREIGN KEY (dialogue_id) REFERENCES dialogues (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-    logging.info("Database initialization completed")
+def _create_pooled_connection(path: str) -> sqlite3.Connection:
+    """Open a connection that can be shared between threads through the pool"""
+    ensure_db(path)
+    logging.info(f"Creating pooled database connection to {path}")
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    if SYNCHRONOUS is not None:
+        conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS}")
+    return conn
+
+@contextmanager
+def pooled_connection(path: Optional[str] = None) -> Iterator[sqlite3.Connection]:
+    """
+    Borrow a connection from the pool of the database file
+
+    An open transaction left by the caller is rolled back before the
+    connection goes back to the pool.
+
+    Args:
+        path (Optional[str]): Database file, DATABASE_PATH by default
+
+    Yields:
+        sqlite3.Connection: Open database connection
+    """
+    path = path or DATABASE_PATH
+    with _pool_lock:
+        idle = _pools.setdefault(path, [])
+        conn = idle.pop() if idle else None
+    if conn is None:
+        conn = _create_pooled_connection(path)
+
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        with _pool_lock:
+            idle = _pools.setdefault(path, [])
+            if len(idle) < POOL_SIZE:
+                idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+
+def close_pool() -> None:
+    """Close all idle pooled connections"""
+    with _pool_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for idle in pools:
+        for conn in idle:
+            conn.close()
+    logging.info("Database connection pool closed")
+
+def ensure_db(path: Optional[str] = None, force: bool = False) -> None:
+    """
+    Create the database file and apply pending migrations once per process
+
+    Called by init_db() at startup and before opening connections, so code
+    that skipped the startup step still finds the schema in place. After
+    the first call for a path only an existence check is made.
+
+    Args:
+        path (Optional[str]): Database file, DATABASE_PATH by default
+        force (bool): Run the migration check even if it was done before
+    """
+    path = path or DATABASE_PATH
+    if not force and path in _initialized_paths and os.path.exists(path):
+        return
+
+    with _init_lock:
+        if not force and path in _initialized_paths and os.path.exists(path):
+            return
+        logging.info(f"Initializing database {path}")
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+            logging.info(f"Created directory: {directory}")
+
+        conn = sqlite3.connect(path)
+        # Takes effect only for a new file; archive.reclaim_space() converts old ones
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute(f"PRAGMA journal_mode = {JOURNAL_MODE}")
+        schema_version = migrate(conn)
+        # Indexes left dropped by an interrupted bulk load
+        restore_deferred_indexes(conn)
+        conn.close()
+
+        _initialized_paths.add(path)
+    # The file may have been recreated at the same path
+    clear_caches()
+    logging.info(f"Database initialization completed (schema version {schema_version})")
+
+def init_db(force: bool = False) -> None:
+    """
+    Initialize the database and apply pending schema migrations
+
+    Explicit startup step; repeated calls for the same file are no-ops
+    unless force is set.
+
+    Args:
+        force (bool): Run the migration check even if it was done before
+    """
+    ensure_db(DATABASE_PATH, force)
 
 def log_dialogue(user_id: str, issue_id: str, dialogue: List[Dict[str, str]]) -> int:
     """
@@ -74,22 +179,54 @@ def log_dialogue(user_id: str, issue_id: str, dialogue: List[Dict[str, str]]) ->
         int: ID of the inserted dialogue record
     """
     logging.info(f"Logging dialogue for user {user_id}, issue {issue_id}")
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    dialogue_json = json.dumps(dialogue, ensure_ascii=False)
-    
-    cursor.execute('''
-        INSERT INTO dialogues (user_id, issue_id, dialogue_json)
-        VALUES (?, ?, ?)
-    ''', (user_id, issue_id, dialogue_json))
+    path = get_user_database_path(user_id)
+    dialogue_json = encode_json(dialogue, path, COMPRESSION_ENABLED)
     
-    dialogue_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with pooled_connection(path) as conn:
+        cursor = conn.execute('''
+            INSERT INTO dialogues (user_id, issue_id, dialogue_json)
+            VALUES (?, ?, ?)
+        ''', (user_id, issue_id, dialogue_json))
+        
+        dialogue_id = cursor.lastrowid
+        index_dialogue(conn, dialogue_id, dialogue)
+        # The bot logs the whole history on every turn; the rollups count only what the previous snapshot lacks
+        record_user_dialogue(conn, user_id, issue_id, dialogue)
+        conn.commit()
     logging.info(f"Dialogue logged successfully with ID: {dialogue_id}")
     return dialogue_id
 
+def log_dialogues_bulk(records: List[Tuple[str, str, List[Dict[str, str]]]]) -> List[int]:
+    """
+    Log many dialogues in a single transaction per database file
+    
+    Args:
+        records (List[Tuple[str, str, List[Dict[str, str]]]]): (user_id, issue_id, dialogue) tuples
+        
+    Returns:
+        List[int]: IDs of the inserted dialogue records in input order
+    """
+    logging.info(f"Logging {len(records)} dialogues in bulk")
+    by_path: Dict[str, List[int]] = {}
+    for position, (user_id, _, _) in enumerate(records):
+        by_path.setdefault(get_user_database_path(user_id), []).append(position)
+
+    dialogue_ids: List[int] = [0] * len(records)
+    for path, positions in by_path.items():
+        with pooled_connection(path) as conn:
+            for position in positions:
+                user_id, issue_id, dialogue = records[position]
+                cursor = conn.execute('''
+                    INSERT INTO dialogues (user_id, issue_id, dialogue_json)
+                    VALUES (?, ?, ?)
+                ''', (user_id, issue_id, encode_json(dialogue, path, COMPRESSION_ENABLED)))
+                dialogue_ids[position] = cursor.lastrowid
+                index_dialogue(conn, cursor.lastrowid, dialogue)
+                record_user_dialogue(conn, user_id, issue_id, dialogue)
+            conn.commit()
+    logging.info(f"Bulk logged {len(dialogue_ids)} dialogues")
+    return dialogue_ids
+
 def log_book_recommendations(user_id: str, issue_id: str, recommendations: Dict, dialogue_id: int) -> int:
     """
     Log book recommendations to the database
@@ -104,114 +241,341 @@ def log_book_recommendations(user_id: str, issue_id: str, recommendations: Dict,
         int: ID of the inserted recommendation record
     """
     logging.info(f"Logging book recommendations for user {user_id}, issue {issue_id}, dialogue {dialogue_id}")
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    recommendations_json = json.dumps(recommendations, ensure_ascii=False)
+    path = get_user_database_path(user_id)
+    stub = catalog_stub(recommendations) if RECOMMENDATIONS_CATALOG_ONLY else None
+    recommendations_json = encode_json(recommendations if stub is None else stub, path, COMPRESSION_ENABLED)
     
-    cursor.execute('''
-        INSERT INTO book_recommendations (user_id, issue_id, recommendations_json, dialogue_id)
-        VALUES (?, ?, ?, ?)
-    ''', (user_id, issue_id, recommendations_json, dialogue_id))
-    
-    recommendation_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with pooled_connection(path) as conn:
+        cursor = conn.execute('''
+            INSERT INTO book_recommendations (user_id, issue_id, recommendations_json, dialogue_id)
+            VALUES (?, ?, ?, ?)
+        ''', (user_id, issue_id, recommendations_json, dialogue_id))
+        
+        recommendation_id = cursor.lastrowid
+        store_recommendation_items(conn, recommendation_id, issue_id, recommendations)
+        record_recommendations(conn, issue_id)
+        conn.commit()
+    recommendations_cache.invalidate((path, user_id))
     logging.info(f"Book recommendations logged successfully with ID: {recommendation_id}")
     return recommendation_id
 
-def get_user_dialogues(user_id: str) -> List[Dict]:
+# Columns returned by the metadata-only projection of the user readers
+DIALOGUE_METADATA_COLUMNS = ('id', 'user_id', 'issue_id', 'timestamp')
+RECOMMENDATION_METADATA_COLUMNS = ('id', 'user_id', 'issue_id', 'timestamp', 'dialogue_id')
+
+# Keyset cursor: (timestamp, id) of the last row of the previous page
+Cursor = Tuple[str, int]
+
+
+class LazyRecord(dict):
+    """
+    Database record whose JSON columns are decoded on first access.
+
+    Behaves like a regular dict; reading a JSON column through indexing,
+    get(), items(), values() or dict(record) returns the decoded value.
+    """
+
+    def __init__(self, row: sqlite3.Row, json_fields: Tuple[str, ...], decode: Callable[[Any], Any] = json.loads):
+        super().__init__(dict(row))
+        self._pending = {field for field in json_fields if field in self}
+        self._decode_value = decode
+
+    def _decode(self, key) -> None:
+        if key in self._pending:
+            self._pending.discard(key)
+            dict.__setitem__(self, key, self._decode_value(dict.__getitem__(self, key)))
+
+    def _decode_all(self) -> None:
+        for key in list(self._pending):
+            self._decode(key)
+
+    def __getitem__(self, key):
+        self._decode(key)
+        return dict.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        # _pending is absent while the record is being unpickled
+        getattr(self, '_pending', set()).discard(key)
+        dict.__setitem__(self, key, value)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def items(self):
+        self._decode_all()
+        return dict.items(self)
+
+    def values(self):
+        self._decode_all()
+        return dict.values(self)
+
+    def copy(self) -> Dict:
+        return dict(self.items())
+
+    def __eq__(self, other):
+        self._decode_all()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self) -> str:
+        self._decode_all()
+        return dict.__repr__(self)
+
+
+def _cache_entry(record: LazyRecord) -> Tuple[Dict, MemoizedDecode]:
+    """Split a freshly read record into its raw row and a decoder shared by cached copies"""
+    return dict(dict.items(record)), MemoizedDecode(record._decode_value)
+
+
+def _record_from_cache(entry: Tuple[Dict, MemoizedDecode], json_fields: Tuple[str, ...]) -> LazyRecord:
+    """Build a new record from a cache entry without decoding its JSON again"""
+    row, decode = entry
+    return LazyRecord(row, json_fields, decode)
+
+
+def get_json_decoder(table: str, db_path: str, record_id: int) -> Callable[[Any], Any]:
+    """
+    Return the decoder of the JSON column of a record
+
+    Args:
+        table (str): 'dialogues' or 'book_recommendations'
+        db_path (str): Database file the record was read from
+        record_id (int): ID of the record
+
+    Returns:
+        Callable[[Any], Any]: Function decoding the stored column value
+    """
+    if table == 'book_recommendations':
+        return partial(decode_recommendations, db_path=db_path, recommendation_id=record_id)
+    return partial(decode_json, db_path=db_path)
+
+
+def _fetch_user_page(table: str, json_field: str, metadata_columns: Tuple[str, ...], user_id: str,
+                     limit: int, cursor: Optional[Cursor], include_json: bool) -> Tuple[List[Dict], Optional[Cursor]]:
+    """Fetch one keyset page of a per-user table ordered from newest to oldest"""
+    columns = '*' if include_json else ', '.join(metadata_columns)
+    query = f'SELECT {columns} FROM {table} WHERE user_id = ?'
+    params: List = [user_id]
+    if cursor is not None:
+        query += ' AND (timestamp, id) < (?, ?)'
+        params.extend(cursor)
+    query += ' ORDER BY timestamp DESC, id DESC LIMIT ?'
+    params.append(limit)
+
+    path = get_user_database_path(user_id)
+    with pooled_connection(path) as conn:
+        rows = conn.execute(query, params).fetchall()
+
+    records = [LazyRecord(row, (json_field,), get_json_decoder(table, path, row['id'])) for row in rows]
+    next_cursor = None
+    if len(records) == limit:
+        next_cursor = (records[-1]['timestamp'], records[-1]['id'])
+    return records, next_cursor
+
+
+def get_user_dialogues_page(user_id: str, limit: int = 20, cursor: Optional[Cursor] = None,
+                            include_dialogue: bool = True) -> Tuple[List[Dict], Optional[Cursor]]:
+    """
+    Retrieve one page of dialogues for a user, newest first
+
+    Args:
+        user_id (str): Unique identifier for the user
+        limit (int): Maximum number of records in the page
+        cursor (Optional[Cursor]): Cursor returned with the previous page, None for the first page
+        include_dialogue (bool): If False, only metadata columns are selected
+
+    Returns:
+        Tuple[List[Dict], Optional[Cursor]]: Page of dialogue records and the cursor
+        of the next page (None when there are no more records)
+    """
+    logging.info(f"Retrieving dialogues page for user {user_id} (limit {limit}, cursor {cursor})")
+    return _fetch_user_page('dialogues', 'dialogue_json', DIALOGUE_METADATA_COLUMNS,
+                            user_id, limit, cursor, include_dialogue)
+
+
+def get_user_recommendations_page(user_id: str, limit: int = 20, cursor: Optional[Cursor] = None,
+                                  include_recommendations: bool = True) -> Tuple[List[Dict], Optional[Cursor]]:
+    """
+    Retrieve one page of book recommendations for a user, newest first
+
+    Args:
+        user_id (str): Unique identifier for the user
+        limit (int): Maximum number of records in the page
+        cursor (Optional[Cursor]): Cursor returned with the previous page, None for the first page
+        include_recommendations (bool): If False, only metadata columns are selected
+
+    Returns:
+        Tuple[List[Dict], Optional[Cursor]]: Page of recommendation records and the cursor
+        of the next page (None when there are no more records)
+    """
+    logging.info(f"Retrieving recommendations page for user {user_id} (limit {limit}, cursor {cursor})")
+    return _fetch_user_page('book_recommendations', 'recommendations_json', RECOMMENDATION_METADATA_COLUMNS,
+                            user_id, limit, cursor, include_recommendations)
+
+
+def _iter_archived(table: str, user_id: str, page_size: int, include_json: bool) -> Iterator[Dict]:
+    """Iterate over archived records of a user, newest first"""
+    from .archive import get_archived_user_page
+
+    cursor = None
+    while True:
+        records, cursor = get_archived_user_page(table, user_id, page_size, cursor, include_json)
+        yield from records
+        if cursor is None:
+            return
+
+
+def iter_user_dialogues(user_id: str, page_size: int = 50, include_dialogue: bool = True,
+                        include_archived: bool = False) -> Iterator[Dict]:
+    """
+    Iterate over all dialogues of a user, newest first, one page at a time
+
+    Args:
+        user_id (str): Unique identifier for the user
+        page_size (int): Number of records fetched per query
+        include_dialogue (bool): If False, only metadata columns are selected
+        include_archived (bool): Continue with archived dialogues after the hot ones
+
+    Yields:
+        Dict: Dialogue record
+    """
+    cursor = None
+    while True:
+        records, cursor = get_user_dialogues_page(user_id, page_size, cursor, include_dialogue)
+        yield from records
+        if cursor is None:
+            break
+    if include_archived:
+        yield from _iter_archived('dialogues', user_id, page_size, include_dialogue)
+
+
+def iter_user_recommendations(user_id: str, page_size: int = 50, include_recommendations: bool = True,
+                              include_archived: bool = False) -> Iterator[Dict]:
+    """
+    Iterate over all book recommendations of a user, newest first, one page at a time
+
+    Args:
+        user_id (str): Unique identifier for the user
+        page_size (int): Number of records fetched per query
+        include_recommendations (bool): If False, only metadata columns are selected
+        include_archived (bool): Continue with archived recommendations after the hot ones
+
+    Yields:
+        Dict: Recommendation record
+    """
+    cursor = None
+    while True:
+        records, cursor = get_user_recommendations_page(user_id, page_size, cursor, include_recommendations)
+        yield from records
+        if cursor is None:
+            break
+    if include_archived:
+        yield from _iter_archived('book_recommendations', user_id, page_size, include_recommendations)
+
+
+def get_latest_user_dialogue(user_id: str, include_dialogue: bool = True) -> Optional[Dict]:
+    """
+    Retrieve the most recent dialogue of a user
+
+    Args:
+        user_id (str): Unique identifier for the user
+        include_dialogue (bool): If False, only metadata columns are selected
+
+    Returns:
+        Optional[Dict]: Dialogue record or None if the user has no dialogues
+    """
+    records, _ = get_user_dialogues_page(user_id, 1, None, include_dialogue)
+    return records[0] if records else None
+
+
+def get_user_dialogues(user_id: str, include_archived: bool = False) -> List[Dict]:
     """
     Retrieve all dialogues for a specific user
     
     Args:
         user_id (str): Unique identifier for the user
+        include_archived (bool): Also return dialogues moved to archive files
         
     Returns:
         List[Dict]: List of dialogue records
     """
     logging.info(f"Retrieving dialogues for user {user_id}")
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT * FROM dialogues 
-        WHERE user_id = ? 
-        ORDER BY timestamp DESC
-    ''', (user_id,))
-    
-    rows = cursor.fetchall()
-    dialogues = []
-    for row in rows:
-        dialogue_dict = dict(row)
-        dialogue_dict['dialogue_json'] = json.loads(dialogue_dict['dialogue_json'])
-        dialogues.append(dialogue_dict)
-    
-    conn.close()
+    dialogues = list(iter_user_dialogues(user_id, include_archived=include_archived))
     logging.info(f"Retrieved {len(dialogues)} dialogues for user {user_id}")
     return dialogues
 
-def get_user_recommendations(user_id: str) -> List[Dict]:
+def get_user_recommendations(user_id: str, include_archived: bool = False) -> List[Dict]:
     """
     Retrieve all book recommendations for a specific user
     
+    Hot-database results are served from the read-through cache. Each call
+    returns new record dicts, the decoded JSON inside them is shared between
+    calls and must not be modified.
+    
     Args:
         user_id (str): Unique identifier for the user
+        include_archived (bool): Also return recommendations moved to archive files
         
     Returns:
         List[Dict]: List of recommendation records
     """
-    logging.info(f"Retrieving book recommendations for user {user_id}")
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT * FROM book_recommendations 
-        WHERE user_id = ? 
-        ORDER BY timestamp DESC
-    ''', (user_id,))
-    
-    rows = cursor.fetchall()
-    recommendations = []
-    for row in rows:
-        rec_dict = dict(row)
-        rec_dict['recommendations_json'] = json.loads(rec_dict['recommendations_json'])
-        recommendations.append(rec_dict)
-    
-    conn.close()
-    logging.info(f"Retrieved {len(recommendations)} book recommendations for user {user_id}")
-    return recommendations
+    if include_archived:
+        logging.info(f"Retrieving book recommendations for user {user_id} including archive")
+        return list(iter_user_recommendations(user_id, include_archived=True))
 
-def get_dialogue_by_id(dialogue_id: int) -> Dict:
+    key = (get_user_database_path(user_id), user_id)
+    found, entries = recommendations_cache.get(key)
+    if not found:
+        logging.info(f"Retrieving book recommendations for user {user_id}")
+        entries = [_cache_entry(record) for record in iter_user_recommendations(user_id)]
+        recommendations_cache.set(key, entries)
+        logging.info(f"Retrieved {len(entries)} book recommendations for user {user_id}")
+    return [_record_from_cache(entry, ('recommendations_json',)) for entry in entries]
+
+def get_dialogue_by_id(dialogue_id: int, include_archived: bool = False) -> Dict:
     """
     Retrieve a specific dialogue by its ID
     
+    Dialogues of the hot database are served from the read-through cache:
+    every call returns a new record, the decoded dialogue is parsed once
+    and shared between calls, so it must not be modified.
+    
     Args:
         dialogue_id (int): ID of the dialogue to retrieve
+        include_archived (bool): Look into archive files if the dialogue is not in the hot database
         
     Returns:
         Dict: Dialogue record or None if not found
     """
+    path = get_record_database_path(dialogue_id)
+    key = (path, dialogue_id)
+    found, entry = dialogue_cache.get(key)
+    if found:
+        return _record_from_cache(entry, ('dialogue_json',))
+
     logging.info(f"Retrieving dialogue with ID {dialogue_id}")
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT * FROM dialogues 
-        WHERE id = ?
-    ''', (dialogue_id,))
+    with pooled_connection(path) as conn:
+        row = conn.execute('''
+            SELECT * FROM dialogues 
+            WHERE id = ?
+        ''', (dialogue_id,)).fetchone()
     
-    row = cursor.fetchone()
     if row:
-        dialogue_dict = dict(row)
-        dialogue_dict['dialogue_json'] = json.loads(dialogue_dict['dialogue_json'])
-        conn.close()
+        entry = (dict(row), MemoizedDecode(partial(decode_json, db_path=path)))
+        dialogue_cache.set(key, entry)
         logging.info(f"Successfully retrieved dialogue {dialogue_id}")
-        return dialogue_dict
+        return _record_from_cache(entry, ('dialogue_json',))
     
-    conn.close()
+    if include_archived:
+        from .archive import get_archived_record
+        archived = get_archived_record('dialogues', dialogue_id)
+        if archived is not None:
+            logging.info(f"Successfully retrieved archived dialogue {dialogue_id}")
+            return archived
     logging.warning(f"Dialogue {dialogue_id} not found")
     return None
-
-# Initialize the database when the module is imported
-init_db() 
\ No newline at end of file
@@ -0,0 +1,291 @@
+import json
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+import hashlib
+import hmac
+import os
+import argparse
+import logging
+from . import database
+from .sharding import SHARDED_TABLES, get_database_paths
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Описание экспортируемых таблиц: колонки, JSON-колонки, колонка времени для
+# фильтра по датам, колонка проблемы и колонки с ID пользователя
+EXPORT_TABLES: Dict[str, Dict[str, Any]] = {
+    'dialogues': {
+        'columns': ('id', 'user_id', 'issue_id', 'timestamp', 'dialogue_json'),
+        'json_columns': ('dialogue_json',),
+        'time_column': 'timestamp',
+        'issue_column': 'issue_id',
+        'user_columns': ('user_id',),
+    },
+    'book_recommendations': {
+        'columns': ('id', 'user_id', 'issue_id', 'timestamp', 'recommendations_json', 'dialogue_id'),
+        'json_columns': ('recommendations_json',),
+        'time_column': 'timestamp',
+        'issue_column': 'issue_id',
+        'user_columns': ('user_id',),
+    },
+    'users': {
+        'columns': ('id', 'username'),
+        'json_columns': (),
+        'time_column': None,
+        'issue_column': None,
+        'user_columns': ('id',),
+    },
+    'feedback': {
+        'columns': ('id', 'user_id', 'feedback', 'feedback_date'),
+        'json_columns': (),
+        'time_column': 'feedback_date',
+        'issue_column': None,
+        'user_columns': ('user_id',),
+    },
+}
+
+# Размер блока, который сжимается одним потоком (отдельный gzip-member)
+GZIP_BLOCK_SIZE = 1024 * 1024
+GZIP_LEVEL = 6
+
+
+def anonymize_user_id(user_id: Any, key: bytes) -> str:
+    """
+    Replace a user ID with a keyed hash
+
+    The same key always gives the same pseudonym, so records of one user can
+    still be joined across tables and exports.
+
+    Args:
+        user_id (Any): Original user ID
+        key (bytes): Secret HMAC key
+
+    Returns:
+        str: 16 hex characters of HMAC-SHA256
+    """
+    return hmac.new(key, str(user_id).encode('utf-8'), hashlib.sha256).hexdigest()[:16]
+
+
+def iter_export_rows(table: str, since: Optional[str] = None, until: Optional[str] = None,
+                     issue_id: Optional[str] = None, anonymize_key: Optional[bytes] = None,
+                     chunk_size: int = 1000) -> Iterator[List[Dict]]:
+    """
+    Read a table in ID order, one chunk of decoded rows at a time
+
+    Only one chunk is held in memory, the query is resumed by ID.
+
+    Args:
+        table (str): Name of a table from EXPORT_TABLES
+        since (Optional[str]): Lower bound of the time column, inclusive
+        until (Optional[str]): Upper bound of the time column, exclusive
+        issue_id (Optional[str]): Only rows of this issue
+        anonymize_key (Optional[bytes]): Replace user IDs with HMAC pseudonyms and drop usernames
+        chunk_size (int): Number of rows per chunk
+
+    Yields:
+        List[Dict]: Chunk of rows with JSON columns decoded
+    """
+    spec = EXPORT_TABLES[table]
+    conditions = ['id > ?']
+    params: List = []
+    if spec['time_column'] is not None:
+        if since is not None:
+            conditions.append(f"{spec['time_column']} >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append(f"{spec['time_column']} < ?")
+            params.append(until)
+    if issue_id is not None and spec['issue_column'] is not None:
+        conditions.append(f"{spec['issue_column']} = ?")
+        params.append(issue_id)
+    query = f"SELECT {', '.join(spec['columns'])} FROM {table} WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?"
+
+    # Shard files are read one after another, their ID ranges do not overlap
+    paths = get_database_paths() if table in SHARDED_TABLES else [database.DATABASE_PATH]
+    for path in paths:
+        with database.pooled_connection(path) as conn:
+            last_id = 0
+            while True:
+                rows = conn.execute(query, [last_id] + params + [chunk_size]).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1]['id']
+                chunk = []
+                for row in rows:
+                    record = dict(row)
+                    for column in spec['json_columns']:
+                        record[column] = database.get_json_decoder(table, path, record['id'])(record[column])
+                    if anonymize_key is not None:
+                        for column in spec['user_columns']:
+                            record[column] = anonymize_user_id(record[column], anonymize_key)
+                        if 'username' in record:
+                            record['username'] = None
+                    chunk.append(record)
+                yield chunk
+
+
+def _gzip_member(data: bytes) -> bytes:
+    """Compress a block into a standalone gzip member, zlib releases the GIL while compressing"""
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+class ParallelGzipWriter:
+    """
+    Binary file writer compressing blocks in a thread pool
+
+    The output is a sequence of gzip members, which gzip, zcat and Python's
+    gzip module read as one stream. At most 2 * threads blocks are in memory.
+    """
+
+    def __init__(self, path: str, threads: Optional[int] = None):
+        self.file = open(path, 'wb')
+        self.threads = threads or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=self.threads)
+        self.pending = deque()
+        self.buffer = bytearray()
+
+    def write(self, data: bytes) -> None:
+        self.buffer += data
+        if len(self.buffer) >= GZIP_BLOCK_SIZE:
+            self._submit()
+
+    def _submit(self) -> None:
+        self.pending.append(self.executor.submit(_gzip_member, bytes(self.buffer)))
+        self.buffer.clear()
+        # Blocks are written in order; waiting on the oldest keeps memory bounded
+        while len(self.pending) > 2 * self.threads:
+            self.file.write(self.pending.popleft().result())
+
+    def close(self) -> None:
+        if self.buffer:
+            self._submit()
+        while self.pending:
+            self.file.write(self.pending.popleft().result())
+        self.executor.shutdown()
+        self.file.close()
+
+
+def _export_jsonl(chunks: Iterator[List[Dict]], output_path: str, threads: Optional[int]) -> int:
+    """Write chunks as JSON lines, gzip-compressed in parallel when the path ends with .gz"""
+    if output_path.endswith('.gz'):
+        output = ParallelGzipWriter(output_path, threads)
+    else:
+        output = open(output_path, 'wb')
+    exported = 0
+    try:
+        for chunk in chunks:
+            lines = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in chunk)
+            output.write(lines.encode('utf-8'))
+            exported += len(chunk)
+    finally:
+        output.close()
+    return exported
+
+
+def _export_parquet(table: str, chunks: Iterator[List[Dict]], output_path: str, anonymized: bool) -> int:
+    """Write chunks as Parquet row groups, JSON columns are stored as JSON strings"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export requires the pyarrow package")
+
+    spec = EXPORT_TABLES[table]
+    # users.id and feedback.user_id are Telegram IDs; pseudonyms are always strings
+    integer_columns = {'id', 'dialogue_id', 'user_id'} if table in ('users', 'feedback') else {'id', 'dialogue_id'}
+    if anonymized:
+        integer_columns -= set(spec['user_columns'])
+    schema = pa.schema([(column, pa.int64() if column in integer_columns else pa.string())
+                        for column in spec['columns']])
+
+    exported = 0
+    # Arrow compresses column chunks on its own thread pool
+    with pq.ParquetWriter(output_path, schema, compression='zstd') as writer:
+        for chunk in chunks:
+            for record in chunk:
+                for column in spec['json_columns']:
+                    record[column] = json.dumps(record[column], ensure_ascii=False)
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            exported += len(chunk)
+    return exported
+
+
+def export_table(table: str, output_path: str, output_format: str = 'jsonl', since: Optional[str] = None,
+                 until: Optional[str] = None, issue_id: Optional[str] = None,
+                 anonymize_key: Optional[bytes] = None, chunk_size: int = 1000,
+                 threads: Optional[int] = None) -> int:
+    """
+    Stream one table into a JSONL (optionally .gz) or Parquet file
+
+    Memory use depends on chunk_size, not on the size of the database.
+
+    Args:
+        table (str): 'dialogues', 'book_recommendations', 'users' or 'feedback'
+        output_path (str): Output file, JSONL is gzip-compressed if it ends with .gz
+        output_format (str): 'jsonl' or 'parquet'
+        since (Optional[str]): Lower bound of the row time, inclusive ('YYYY-MM-DD' or full timestamp)
+        until (Optional[str]): Upper bound of the row time, exclusive
+        issue_id (Optional[str]): Only rows of this issue
+        anonymize_key (Optional[bytes]): Replace user IDs with HMAC pseudonyms
+        chunk_size (int): Number of rows read per query
+        threads (Optional[int]): Compression threads for .gz output, CPU count by default
+
+    Returns:
+        int: Number of exported rows
+    """
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown table: {table}")
+    logging.info(f"Exporting {table} to {output_path}")
+
+    chunks = iter_export_rows(table, since, until, issue_id, anonymize_key, chunk_size)
+    if output_format == 'jsonl':
+        exported = _export_jsonl(chunks, output_path, threads)
+    elif output_format == 'parquet':
+        exported = _export_parquet(table, chunks, output_path, anonymize_key is not None)
+    else:
+        raise ValueError(f"Unknown export format: {output_format}")
+
+    logging.info(f"Exported {exported} rows from {table}")
+    return exported
+
+
+def main() -> None:
+    """Command line entry point for exporting tables"""
+    parser = argparse.ArgumentParser(description="Stream dialogue database tables to JSONL or Parquet")
+    parser.add_argument('--tables', nargs='+', default=list(EXPORT_TABLES), choices=list(EXPORT_TABLES),
+                        help="tables to export")
+    parser.add_argument('--format', dest='output_format', default='jsonl', choices=('jsonl', 'parquet'))
+    parser.add_argument('--output-dir', default='export', help="directory for the exported files")
+    parser.add_argument('--gzip', action='store_true', help="gzip JSONL output in parallel")
+    parser.add_argument('--threads', type=int, help="compression threads")
+    parser.add_argument('--from', dest='since', help="first day or timestamp, inclusive")
+    parser.add_argument('--to', dest='until', help="last day or timestamp, exclusive")
+    parser.add_argument('--issue', help="export only this issue")
+    parser.add_argument('--anonymize', action='store_true',
+                        help="replace user IDs with HMAC pseudonyms keyed by EXPORT_HMAC_KEY")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="rows read per query")
+    args = parser.parse_args()
+
+    anonymize_key = None
+    if args.anonymize:
+        key = os.getenv('EXPORT_HMAC_KEY')
+        if not key:
+            parser.error("--anonymize requires the EXPORT_HMAC_KEY environment variable")
+        anonymize_key = key.encode('utf-8')
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    extension = 'parquet' if args.output_format == 'parquet' else ('jsonl.gz' if args.gzip else 'jsonl')
+    for table in args.tables:
+        export_table(table, os.path.join(args.output_dir, f"{table}.{extension}"), args.output_format,
+                     args.since, args.until, args.issue, anonymize_key, args.chunk_size, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import asyncio
+from typing import Any, Dict, Mapping, Optional
+import json
+import os
+import logging
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from .sessions import SessionStore
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# FSM states and data of the bot survive restarts: SQLiteStorage keeps them
+# in the fsm_states table of the main database, RedisStorage of aiogram in
+# any Redis-protocol server. CachedStorage in front of either one answers
+# reads from memory and passes every write through to the storage behind it.
+# The cache is only correct while all updates of a user are handled by one
+# process, which is the case for polling and for workers sharded by user.
+
+# Интервал (в секундах), за который изменения состояний собираются в одну транзакцию; 0 - писать сразу
+FSM_FLUSH_INTERVAL_SECONDS = 0.5
+
+# Максимальное число состояний пользователей в кэше чтения
+FSM_CACHE_MAX_ENTRIES = 10000
+# Состояние без обращений дольше этого времени (в секундах) удаляется из кэша, но не из хранилища
+FSM_CACHE_IDLE_TTL_SECONDS = 6 * 60 * 60
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    """Convert a State object into the string stored in the storage"""
+    return state.state if isinstance(state, State) else state
+
+
+def _check_data(data: Mapping[str, Any]) -> Dict[str, Any]:
+    """Copy FSM data, rejecting values that are not dicts like aiogram storages do"""
+    if not isinstance(data, dict):
+        raise TypeError(f"Data must be a dict, got {type(data).__name__}")
+    return data.copy()
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    aiogram FSM storage in the fsm_states table of the dialogues database.
+
+    Writes are collected in memory and flushed in one transaction every
+    flush_interval seconds, so a burst of state changes costs one commit.
+    Reads see the pending changes. close() flushes what is left; a crash
+    loses at most the last flush_interval seconds of changes.
+    """
+
+    def __init__(self, path: Optional[str] = None, flush_interval: Optional[float] = None,
+                 key_builder: Optional[KeyBuilder] = None):
+        self.path = path
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._flush_interval = flush_interval
+        # storage key -> changed fields ('state' and/or 'data') not yet written
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        # Changes of the flush in progress, still visible to readers
+        self._flushing: Dict[str, Dict[str, Any]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.writes = 0
+        self.flushes = 0
+
+    @property
+    def flush_interval(self) -> float:
+        return FSM_FLUSH_INTERVAL_SECONDS if self._flush_interval is None else self._flush_interval
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._record(key, 'state', _state_name(state))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self._read(key, 'state')
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self._record(key, 'data', _check_data(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        data = await self._read(key, 'data')
+        return data.copy()
+
+    async def _record(self, key: StorageKey, field: str, value: Any) -> None:
+        """Queue a change and make sure a flush will pick it up"""
+        self._pending.setdefault(self.key_builder.build(key), {})[field] = value
+        self.writes += 1
+        if self.flush_interval <= 0:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        # Changes made during the flush schedule the next one
+        self._flush_task = None
+        await self.flush()
+
+    async def _read(self, key: StorageKey, field: str) -> Any:
+        storage_key = self.key_builder.build(key)
+        for changes in (self._pending, self._flushing):
+            fields = changes.get(storage_key)
+            if fields is not None and field in fields:
+                return fields[field]
+        row = await asyncio.to_thread(self._load, storage_key)
+        if field == 'state':
+            return row['state'] if row else None
+        return json.loads(row['data_json']) if row else {}
+
+    def _load(self, storage_key: str) -> Optional[Dict[str, Any]]:
+        from .database import pooled_connection
+
+        with pooled_connection(self.path) as conn:
+            row = conn.execute("SELECT state, data_json FROM fsm_states WHERE storage_key = ?",
+                               (storage_key,)).fetchone()
+        return dict(row) if row else None
+
+    def _write(self, changes: Dict[str, Dict[str, Any]]) -> None:
+        """Write a batch of changes in one transaction"""
+        from .database import pooled_connection
+
+        both, states, data = [], [], []
+        for storage_key, fields in changes.items():
+            data_json = json.dumps(fields['data'], ensure_ascii=False) if 'data' in fields else None
+            if 'state' in fields and 'data' in fields:
+                both.append((storage_key, fields['state'], data_json))
+            elif 'state' in fields:
+                states.append((storage_key, fields['state']))
+            else:
+                data.append((storage_key, data_json))
+
+        with pooled_connection(self.path) as conn:
+            conn.executemany('''
+                INSERT INTO fsm_states (storage_key, state, data_json) VALUES (?, ?, ?)
+                ON CONFLICT (storage_key) DO UPDATE SET
+                    state = excluded.state, data_json = excluded.data_json, updated_at = CURRENT_TIMESTAMP
+            ''', both)
+            conn.executemany('''
+                INSERT INTO fsm_states (storage_key, state) VALUES (?, ?)
+                ON CONFLICT (storage_key) DO UPDATE SET state = excluded.state, updated_at = CURRENT_TIMESTAMP
+            ''', states)
+            conn.executemany('''
+                INSERT INTO fsm_states (storage_key, data_json) VALUES (?, ?)
+                ON CONFLICT (storage_key) DO UPDATE SET data_json = excluded.data_json, updated_at = CURRENT_TIMESTAMP
+            ''', data)
+            # state.clear() leaves an empty row, there is nothing to keep
+            conn.executemany('''
+                DELETE FROM fsm_states WHERE storage_key = ? AND state IS NULL AND data_json = '{}'
+            ''', [(storage_key,) for storage_key in changes])
+            conn.commit()
+
+    async def flush(self) -> int:
+        """
+        Write all pending changes to the database
+
+        A failed write keeps the changes pending for the next flush.
+
+        Returns:
+            int: Number of storage keys written
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            changes, self._pending = self._pending, {}
+            self._flushing = changes
+            try:
+                await asyncio.to_thread(self._write, changes)
+            except Exception as e:
+                logging.error(f"Failed to save {len(changes)} FSM states: {e}")
+                for storage_key, fields in changes.items():
+                    self._pending[storage_key] = {**fields, **self._pending.get(storage_key, {})}
+                return 0
+            finally:
+                self._flushing = {}
+            self.flushes += 1
+            return len(changes)
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+
+class CachedStorage(BaseStorage):
+    """
+    Write-through cache of FSM states and data in front of another storage.
+
+    Reads of a user seen recently are answered from memory without I/O;
+    every write updates the cache and the storage behind it. The cache is
+    a bounded SessionStore, evicted users are read again from the storage.
+    """
+
+    def __init__(self, storage: BaseStorage, max_entries: Optional[int] = None,
+                 idle_ttl_seconds: Optional[float] = None):
+        self.storage = storage
+        self._cache = SessionStore(
+            'fsm_states',
+            max_entries=FSM_CACHE_MAX_ENTRIES if max_entries is None else max_entries,
+            idle_ttl_seconds=FSM_CACHE_IDLE_TTL_SECONDS if idle_ttl_seconds is None else idle_ttl_seconds,
+        )
+
+    def _entry(self, key: StorageKey) -> Dict[str, Any]:
+        entry = self._cache.get(key)
+        if entry is None:
+            entry = {}
+            self._cache[key] = entry
+        return entry
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = _state_name(state)
+        self._entry(key)['state'] = state
+        await self.storage.set_state(key, state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        entry = self._cache.get(key)
+        if entry is not None and 'state' in entry:
+            return entry['state']
+        state = await self.storage.get_state(key)
+        # A write made while the storage was read wins over the value read
+        return self._entry(key).setdefault('state', state)
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        data = _check_data(data)
+        self._entry(key)['data'] = data
+        await self.storage.set_data(key, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        entry = self._cache.get(key)
+        if entry is not None and 'data' in entry:
+            return entry['data'].copy()
+        data = await self.storage.get_data(key)
+        return self._entry(key).setdefault('data', data).copy()
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache metrics, see SessionStore.stats()"""
+        return self._cache.stats()
+
+    async def close(self) -> None:
+        await self.storage.close()
+
+
+def create_fsm_storage(url: Optional[str] = None) -> BaseStorage:
+    """
+    Create the FSM storage of the bot from a URL
+
+    Empty or 'sqlite:///path' selects SQLiteStorage (the dialogues database
+    by default), 'redis://...', 'rediss://...' or 'unix://...' selects the
+    RedisStorage of aiogram, which needs the redis package and works with
+    any server speaking the Redis protocol. 'memory://' keeps the states in
+    memory only. Persistent storages are wrapped in CachedStorage.
+
+    Args:
+        url (Optional[str]): Storage URL, the FSM_STORAGE_URL environment variable by default
+
+    Returns:
+        BaseStorage: Storage to pass to the Dispatcher
+    """
+    if url is None:
+        url = os.getenv('FSM_STORAGE_URL', '')
+    if url == 'memory://':
+        return MemoryStorage()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        try:
+            from aiogram.fsm.storage.redis import RedisStorage
+        except ImportError as e:  # redis is only needed when a Redis URL is configured
+            raise ImportError("FSM_STORAGE_URL points to Redis, install the redis package") from e
+        storage = RedisStorage.from_url(url, key_builder=DefaultKeyBuilder(with_bot_id=True, with_destiny=True))
+        logging.info("FSM states are stored in Redis")
+        return CachedStorage(storage)
+    if url.startswith('sqlite:///'):
+        return CachedStorage(SQLiteStorage(url[len('sqlite:///'):]))
+    if url:
+        raise ValueError(f"Unsupported FSM storage URL: {url}")
+    return CachedStorage(SQLiteStorage())
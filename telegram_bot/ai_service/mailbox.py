@@ -0,0 +1,87 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+
+class Mailbox:
+    """
+    Per-key serialization of asynchronous work with merging of bursts.
+
+    submit(key, item) runs handler(key, [item]) unless a turn for the key
+    is already in progress. Items submitted during a turn are queued and,
+    once the turn is over, handed to the handler together as one follow-up
+    turn. Turns of different keys run concurrently.
+
+    The caller that started a turn awaits all follow-up turns; callers whose
+    items were queued return immediately.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Hashable, List[Any]], Awaitable[None]]):
+        self.name = name
+        self.handler = handler
+        # key -> items waiting for the next turn; present while a turn is running
+        self._queued: Dict[Hashable, List[Any]] = {}
+        self.turns = 0
+        self.merged = 0
+        self.failures = 0
+
+    def is_busy(self, key: Hashable) -> bool:
+        """Check whether a turn for the key is in progress"""
+        return key in self._queued
+
+    def queued(self, key: Hashable) -> int:
+        """Return the number of items waiting for the next turn of the key"""
+        return len(self._queued.get(key, ()))
+
+    async def submit(self, key: Hashable, item: Any) -> bool:
+        """
+        Process an item in the key's next turn
+
+        Args:
+            key (Hashable): Serialization key, e.g. user ID
+            item (Any): Item passed to the handler
+
+        Returns:
+            bool: True if this call ran the turns, False if the item was queued
+        """
+        queued = self._queued.get(key)
+        if queued is not None:
+            queued.append(item)
+            return False
+
+        self._queued[key] = []
+        batch = [item]
+        try:
+            while batch:
+                self.turns += 1
+                self.merged += len(batch) - 1
+                try:
+                    await self.handler(key, batch)
+                except Exception as e:
+                    # Items queued meanwhile are still processed
+                    self.failures += 1
+                    logging.error(f"Mailbox {self.name}: turn for {key} failed: {e}")
+                batch, self._queued[key] = self._queued[key], []
+        finally:
+            del self._queued[key]
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Collect mailbox metrics
+
+        Returns:
+            Dict[str, int]: busy keys, queued items, turns, merged items and failed turns
+        """
+        return {
+            'busy': len(self._queued),
+            'queued': sum(len(items) for items in self._queued.values()),
+            'turns': self.turns,
+            'merged': self.merged,
+            'failures': self.failures,
+        }
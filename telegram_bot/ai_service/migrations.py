@@ -0,0 +1,358 @@
+import sqlite3
+from typing import Callable, List, Optional, Tuple
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+
+def _create_base_tables(conn: sqlite3.Connection) -> None:
+    """Create the dialogues and book_recommendations tables"""
+    logging.info("Creating dialogues table")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS dialogues (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            issue_id TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            dialogue_json TEXT NOT NULL
+        )
+    ''')
+
+    logging.info("Creating book_recommendations table")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS book_recommendations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            issue_id TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            recommendations_json TEXT NOT NULL,
+            dialogue_id INTEGER,
+            FOREIGN KEY (dialogue_id) REFERENCES dialogues (id)
+        )
+    ''')
+
+
+def _create_lookup_indexes(conn: sqlite3.Connection) -> None:
+    """Add indexes for per-user lookups ordered by time and for dialogue joins"""
+    logging.info("Creating per-user lookup indexes")
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_dialogues_user_timestamp
+        ON dialogues (user_id, timestamp)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_book_recommendations_user_timestamp
+        ON book_recommendations (user_id, timestamp)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_book_recommendations_dialogue_id
+        ON book_recommendations (dialogue_id)
+    ''')
+
+
+def _create_compression_dictionaries(conn: sqlite3.Connection) -> None:
+    """Add storage for preset dictionaries of compressed JSON columns"""
+    logging.info("Creating compression_dictionaries table")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS compression_dictionaries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created DATETIME DEFAULT CURRENT_TIMESTAMP,
+            data BLOB NOT NULL
+        )
+    ''')
+
+
+def _create_archive_metadata(conn: sqlite3.Connection) -> None:
+    """Add metadata tables for rows moved to monthly archive files"""
+    logging.info("Creating archive metadata tables")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archived_dialogues (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            issue_id TEXT NOT NULL,
+            timestamp DATETIME,
+            archive_month TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archived_book_recommendations (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            issue_id TEXT NOT NULL,
+            timestamp DATETIME,
+            dialogue_id INTEGER,
+            archive_month TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_archived_dialogues_user_timestamp
+        ON archived_dialogues (user_id, timestamp)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_archived_book_recommendations_user_timestamp
+        ON archived_book_recommendations (user_id, timestamp)
+    ''')
+
+
+def _create_dialogue_fts(conn: sqlite3.Connection) -> None:
+    """Add the full-text index over message content and fill it from plain JSON rows"""
+    from .search import FTS_TOKENIZER, FTS_PREFIXES
+
+    logging.info("Creating dialogue_fts full-text index")
+    conn.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS dialogue_fts USING fts5(
+            content,
+            tokenize = '{FTS_TOKENIZER}',
+            prefix = '{FTS_PREFIXES}'
+        )
+    ''')
+    # Compressed rows are not readable from SQL, search.rebuild_index() covers them
+    conn.execute('''
+        INSERT INTO dialogue_fts (rowid, content)
+        SELECT d.id, replace(replace(group_concat(json_extract(m.value, '$.content'), char(10)), 'ё', 'е'), 'Ё', 'Е')
+        FROM dialogues d, json_each(d.dialogue_json) m
+        WHERE typeof(d.dialogue_json) = 'text'
+          AND json_extract(m.value, '$.role') != 'system'
+        GROUP BY d.id
+    ''')
+
+
+def _create_user_tables(conn: sqlite3.Connection) -> None:
+    """Move users and feedback (formerly in users.db) into the main database"""
+    logging.info("Creating users and feedback tables")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            username TEXT,
+            dialogs TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS feedback (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            feedback TEXT,
+            feedback_date DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_feedback_user_date
+        ON feedback (user_id, feedback_date)
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS storage_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+
+
+def _create_rollup_tables(conn: sqlite3.Connection) -> None:
+    """Add daily per-issue and feedback rollups and fill them from existing rows"""
+    logging.info("Creating analytics rollup tables")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily_issue_stats (
+            day TEXT NOT NULL,
+            issue_id TEXT NOT NULL,
+            dialogues INTEGER NOT NULL DEFAULT 0,
+            messages INTEGER NOT NULL DEFAULT 0,
+            recommendations INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, issue_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily_feedback_stats (
+            day TEXT PRIMARY KEY,
+            feedback INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    # The same count as analytics.rebuild_rollups(): continued dialogues and archived rows included.
+    # A missing archive file must not keep the database from opening, its dialogues are skipped
+    from .analytics import fill_rollups
+
+    db_path = conn.execute("PRAGMA database_list").fetchone()[2]
+    fill_rollups(conn, db_path, skip_missing=True)
+
+
+def _create_catalog_tables(conn: sqlite3.Connection) -> None:
+    """Add the recommendation catalog and link tables and link existing plain-text records"""
+    from .catalog import backfill_catalog
+
+    logging.info("Creating recommendation catalog tables")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_items (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            content_hash TEXT NOT NULL UNIQUE,
+            title TEXT,
+            author TEXT,
+            item_json TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS recommendation_items (
+            recommendation_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            issue_id TEXT NOT NULL,
+            item_id INTEGER NOT NULL REFERENCES catalog_items (id),
+            overrides_json TEXT,
+            PRIMARY KEY (recommendation_id, kind, position)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_recommendation_items_kind_issue_item
+        ON recommendation_items (kind, issue_id, item_id)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_recommendation_items_item
+        ON recommendation_items (item_id)
+    ''')
+    # Compressed rows are skipped, catalog.backfill_catalog() with a database path links them
+    backfill_catalog(conn, None)
+
+
+def _create_fsm_states(conn: sqlite3.Connection) -> None:
+    """Add the table of bot FSM states and data"""
+    logging.info("Creating FSM state table")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            storage_key TEXT PRIMARY KEY,
+            state TEXT,
+            data_json TEXT NOT NULL DEFAULT '{}',
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+
+
+def _create_dialogue_tails(conn: sqlite3.Connection) -> None:
+    """Add the last messages of every user's latest dialogue snapshot, used by the rollups on write"""
+    from .analytics import fill_dialogue_tails
+
+    logging.info("Creating dialogue_tails table")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS dialogue_tails (
+            user_id TEXT PRIMARY KEY,
+            issue_id TEXT NOT NULL,
+            tail_json TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    db_path = conn.execute("PRAGMA database_list").fetchone()[2]
+    fill_dialogue_tails(conn, db_path)
+
+
+def _create_deferred_indexes(conn: sqlite3.Connection) -> None:
+    """Add the journal of indexes dropped for a bulk load, so an interrupted load does not lose them"""
+    logging.info("Creating deferred_indexes table")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS deferred_indexes (
+            name TEXT PRIMARY KEY,
+            sql TEXT NOT NULL
+        )
+    ''')
+
+
+# Ordered list of (version, description, function). A migration is applied once,
+# after which PRAGMA user_version is set to its version. New schema changes are
+# added to the end of the list with the next version number.
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "base tables", _create_base_tables),
+    (2, "per-user lookup indexes", _create_lookup_indexes),
+    (3, "compression dictionaries", _create_compression_dictionaries),
+    (4, "archive metadata", _create_archive_metadata),
+    (5, "dialogue full-text index", _create_dialogue_fts),
+    (6, "users and feedback", _create_user_tables),
+    (7, "analytics rollups", _create_rollup_tables),
+    (8, "recommendation catalog", _create_catalog_tables),
+    (9, "bot FSM states", _create_fsm_states),
+    (10, "latest dialogue tails", _create_dialogue_tails),
+    (11, "deferred index journal", _create_deferred_indexes),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """
+    Read the schema version stored in the database file
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+
+    Returns:
+        int: Current value of PRAGMA user_version
+    """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, target_version: Optional[int] = None) -> int:
+    """
+    Apply all pending migrations up to target_version
+
+    Every migration runs in its own transaction together with the
+    user_version update, so a failed migration leaves the previous
+    version in place.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        target_version (Optional[int]): Version to migrate to, latest by default
+
+    Returns:
+        int: Schema version after migrating
+    """
+    if target_version is None:
+        target_version = LATEST_VERSION
+
+    current_version = get_schema_version(conn)
+    logging.info(f"Database schema version {current_version}, target {target_version}")
+
+    for version, description, apply in MIGRATIONS:
+        if version <= current_version or version > target_version:
+            continue
+
+        logging.info(f"Applying migration {version}: {description}")
+        try:
+            conn.execute("BEGIN")
+            apply(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logging.error(f"Migration {version} failed, schema stays at version {current_version}")
+            raise
+        current_version = version
+
+    return current_version
+
+
+def restore_deferred_indexes(conn: sqlite3.Connection) -> int:
+    """
+    Recreate indexes that a bulk load dropped and did not rebuild
+
+    bulk_load.py records every index it drops in deferred_indexes in the
+    same transaction as the DROP. If the load is killed, the next
+    ensure_db() finds the records and builds the indexes again.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+
+    Returns:
+        int: Number of recreated indexes
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'deferred_indexes'").fetchone() is None:
+        return 0
+    rows = conn.execute("SELECT name, sql FROM deferred_indexes").fetchall()
+    if not rows:
+        return 0
+    restored = 0
+    with conn:
+        for name, sql in rows:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone() is None:
+                logging.info(f"Recreating index {name} dropped by a bulk load")
+                conn.execute(sql)
+                restored += 1
+        conn.execute("DELETE FROM deferred_indexes")
+    return restored
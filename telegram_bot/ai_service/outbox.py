@@ -0,0 +1,268 @@
+import asyncio
+import re
+import time
+from typing import Any, Dict, List, Optional
+import logging
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import Message
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Outgoing messages go through token buckets that follow Telegram's limits:
+# one bucket for the whole bot and one per chat, stricter for groups. A send
+# takes a token from its chat's bucket, then from the global one, and waits
+# when there is none. Sends to one chat keep their order. If Telegram still
+# answers with RetryAfter, the chat's bucket and the global one are paused
+# for exactly the requested time and the message is sent again. Texts longer than the
+# message limit are split on sentence boundaries; the reply markup goes
+# with the last part.
+
+# Максимальная длина сообщения Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+# Сообщений в секунду на весь бот и допустимый всплеск
+OUTBOX_GLOBAL_RATE = 25
+OUTBOX_GLOBAL_BURST = 25
+
+# Сообщений в секунду в личный чат и допустимый всплеск
+OUTBOX_CHAT_RATE = 1
+OUTBOX_CHAT_BURST = 3
+
+# Сообщений в секунду в группу и допустимый всплеск
+OUTBOX_GROUP_RATE = 20 / 60
+OUTBOX_GROUP_BURST = 3
+
+# Сколько раз повторять отправку после RetryAfter
+OUTBOX_MAX_RETRIES = 3
+
+# При большем числе чатов удаляются ограничители простаивающих чатов
+OUTBOX_MAX_CHATS = 10000
+
+# Предложение с завершающими пробелами, строка или остаток текста
+_SENTENCE = re.compile(r'[^.!?…\n]*(?:[.!?…]+|\n+|$)\s*')
+_WORD = re.compile(r'\S*\s*')
+
+
+class TokenBucket:
+    """
+    Token bucket granting `rate` operations per second with bursts of `capacity`.
+
+    Tokens are reserved in call order, so waiting callers are served first
+    come, first served.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """
+        Take a token
+
+        Returns:
+            float: Seconds to wait before using it
+        """
+        self._refill()
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """Give out no tokens for the next `seconds`"""
+        self._refill()
+        self._tokens = min(self._tokens, 1 - seconds * self.rate)
+
+    @property
+    def idle(self) -> bool:
+        self._refill()
+        return self._tokens >= self.capacity
+
+
+def _fit(pieces: List[str], limit: int) -> List[str]:
+    """Greedily join pieces into parts of at most `limit` characters"""
+    parts = []
+    current = ''
+    for piece in pieces:
+        if current and len(current) + len(piece.rstrip()) > limit:
+            parts.append(current)
+            current = ''
+        current += piece if current else piece.lstrip()
+    if current.strip():
+        parts.append(current)
+    return [part.strip() for part in parts if part.strip()]
+
+
+def split_message(text: str, limit: Optional[int] = None) -> List[str]:
+    """
+    Split a text into messages Telegram accepts
+
+    The text is cut between sentences (or lines); a sentence longer than
+    the limit is cut between words, and a longer word is cut anywhere.
+
+    Args:
+        text (str): Message text
+        limit (Optional[int]): Maximum part length, MAX_MESSAGE_LENGTH by default
+
+    Returns:
+        List[str]: Parts in order, each at most `limit` characters
+    """
+    limit = limit or MAX_MESSAGE_LENGTH
+    if len(text) <= limit:
+        return [text]
+
+    pieces = []
+    for sentence in _SENTENCE.findall(text):
+        if len(sentence.rstrip()) <= limit:
+            pieces.append(sentence)
+            continue
+        for word in _WORD.findall(sentence):
+            while len(word.rstrip()) > limit:
+                pieces.append(word[:limit])
+                word = word[limit:]
+            pieces.append(word)
+    return _fit([piece for piece in pieces if piece], limit)
+
+
+class _ChatLimiter:
+    def __init__(self, chat_id: int):
+        if chat_id < 0:
+            self.bucket = TokenBucket(OUTBOX_GROUP_RATE, OUTBOX_GROUP_BURST)
+        else:
+            self.bucket = TokenBucket(OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST)
+        self.lock = asyncio.Lock()
+
+
+class Outbox:
+    """
+    Sends messages within Telegram's rate limits.
+
+    Usage:
+        await outbox.answer(message, text, reply_markup=keyboard)
+
+    The global limit is per process: with several worker processes each
+    should get its share of OUTBOX_GLOBAL_RATE.
+    """
+
+    def __init__(self, global_rate: Optional[float] = None, global_burst: Optional[float] = None,
+                 max_retries: Optional[int] = None):
+        self._global = TokenBucket(OUTBOX_GLOBAL_RATE if global_rate is None else global_rate,
+                                   OUTBOX_GLOBAL_BURST if global_burst is None else global_burst)
+        self._max_retries = max_retries
+        self._chats: Dict[int, _ChatLimiter] = {}
+        self.sent = 0
+        self.split = 0
+        self.retries = 0
+        self.failed = 0
+        self.waited = 0.0
+
+    @property
+    def max_retries(self) -> int:
+        return OUTBOX_MAX_RETRIES if self._max_retries is None else self._max_retries
+
+    def _chat(self, chat_id: int) -> _ChatLimiter:
+        limiter = self._chats.get(chat_id)
+        if limiter is None:
+            if len(self._chats) >= OUTBOX_MAX_CHATS:
+                for idle_chat in [chat for chat, idle in self._chats.items()
+                                  if not idle.lock.locked() and idle.bucket.idle]:
+                    del self._chats[idle_chat]
+            limiter = self._chats[chat_id] = _ChatLimiter(chat_id)
+        return limiter
+
+    async def _wait(self, bucket: TokenBucket) -> None:
+        delay = bucket.reserve()
+        if delay > 0:
+            self.waited += delay
+            await asyncio.sleep(delay)
+
+    async def _send_part(self, bot: Bot, chat_id: int, limiter: _ChatLimiter, text: str,
+                         **kwargs: Any) -> Message:
+        for attempt in range(self.max_retries + 1):
+            await self._wait(limiter.bucket)
+            await self._wait(self._global)
+            try:
+                sent = await bot.send_message(chat_id, text, **kwargs)
+                self.sent += 1
+                return sent
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    raise
+                self.retries += 1
+                logging.warning(f"Flood control in chat {chat_id}, retrying in {e.retry_after}s")
+                limiter.bucket.pause(e.retry_after)
+                # Flood control may be bot-wide, so other chats wait as well
+                self._global.pause(e.retry_after)
+
+    async def send(self, bot: Bot, chat_id: int, text: str, **kwargs: Any) -> List[Message]:
+        """
+        Send a text, split into several messages if it is too long
+
+        Args:
+            bot (Bot): Bot instance
+            chat_id (int): Chat to send to
+            text (str): Message text
+            **kwargs: Other send_message arguments; reply_markup is sent with the last part
+
+        Returns:
+            List[Message]: Sent messages
+        """
+        parts = split_message(text)
+        if len(parts) > 1:
+            self.split += 1
+        reply_markup = kwargs.pop('reply_markup', None)
+        limiter = self._chat(chat_id)
+        sent = []
+        async with limiter.lock:
+            for number, part in enumerate(parts, 1):
+                markup = reply_markup if number == len(parts) else None
+                sent.append(await self._send_part(bot, chat_id, limiter, part, reply_markup=markup, **kwargs))
+        return sent
+
+    async def answer(self, message: Message, text: str, **kwargs: Any) -> List[Message]:
+        """
+        Reply in the chat of a message, like message.answer()
+
+        Like message.answer(), the reply goes to the message's forum topic and
+        business connection unless the arguments say otherwise.
+
+        Args:
+            message (Message): Message to answer
+            text (str): Reply text
+            **kwargs: Other send_message arguments
+
+        Returns:
+            List[Message]: Sent messages
+        """
+        kwargs.setdefault('message_thread_id', message.message_thread_id if message.is_topic_message else None)
+        kwargs.setdefault('business_connection_id', message.business_connection_id)
+        return await self.send(message.bot, message.chat.id, text, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Collect outbox metrics
+
+        Returns:
+            Dict[str, Any]: sent messages, split texts, retries after flood control,
+            failed sends, chats with a limiter and total seconds spent waiting for tokens
+        """
+        return {
+            'sent': self.sent,
+            'split': self.split,
+            'retries': self.retries,
+            'failed': self.failed,
+            'chats': len(self._chats),
+            'waited': round(self.waited, 3),
+        }
@@ -0,0 +1,143 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Speculative prefetch of slow results, e.g. book recommendations that are
+# computed as soon as the button is offered instead of when it is pressed.
+# A result is kept per key (user) together with the version of the input it
+# was computed from (the dialogue's length); take() hands it out only for
+# the same version, so a result for a dialogue that has moved on is never
+# shown. A stale computation is not cancelled - it may hold a thread and an
+# admission slot - but its result is dropped.
+
+# Максимальное число хранимых заранее подготовленных результатов
+PREFETCH_MAX_ENTRIES = 1000
+
+# Сколько секунд хранится подготовленный, но не востребованный результат
+PREFETCH_TTL_SECONDS = 30 * 60
+
+
+class Prefetcher:
+    """
+    Computes results in the background before they are requested.
+
+    Usage:
+        prefetcher.start(user_id, version, fetch_coroutine_function, *args)
+        ...
+        task = prefetcher.take(user_id, version)
+        result = await task if task is not None else await compute_now()
+
+    The fetch function returns None when it could not produce a result
+    (e.g. the request was shed); the caller then computes it as usual.
+    """
+
+    def __init__(self, name: str, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.name = name
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        # key -> (version, started at, task)
+        self._entries: 'OrderedDict[Hashable, Tuple[Any, float, asyncio.Task]]' = OrderedDict()
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.failures = 0
+
+    @property
+    def max_entries(self) -> int:
+        return PREFETCH_MAX_ENTRIES if self._max_entries is None else self._max_entries
+
+    @property
+    def ttl_seconds(self) -> float:
+        return PREFETCH_TTL_SECONDS if self._ttl_seconds is None else self._ttl_seconds
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.stale += 1
+
+    def _done(self, task: asyncio.Task) -> None:
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self.failures += 1
+            logging.warning(f"Prefetch '{self.name}' failed: {error}")
+
+    def start(self, key: Hashable, version: Any, fetch: Callable[..., Awaitable[Any]], *args: Any) -> None:
+        """
+        Start computing the result for a key unless it is already computed for this version
+
+        Args:
+            key (Hashable): Whose result it is, e.g. the user ID
+            version (Any): Version of the input; a result is used only for the same version
+            fetch (Callable[..., Awaitable[Any]]): Coroutine function computing the result
+            *args: Arguments of fetch
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return
+        self._discard(key)
+        while len(self._entries) >= self.max_entries:
+            self._entries.popitem(last=False)
+            self.stale += 1
+
+        task = asyncio.create_task(fetch(*args))
+        task.add_done_callback(self._done)
+        self._entries[key] = (version, time.monotonic(), task)
+        self.started += 1
+
+    def take(self, key: Hashable, version: Any) -> Optional[asyncio.Task]:
+        """
+        Hand out the result computed for this version, once
+
+        Args:
+            key (Hashable): Whose result it is
+            version (Any): Current version of the input
+
+        Returns:
+            Optional[asyncio.Task]: Task with the result (possibly still running),
+            or None if there is no result for this version
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        entry_version, started, task = entry
+        if (entry_version != version or time.monotonic() - started > self.ttl_seconds
+                or (task.done() and (task.cancelled() or task.exception() is not None))):
+            self.stale += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return task
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop the result of a key, e.g. when its dialogue moves on"""
+        self._discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Collect prefetch metrics
+
+        Returns:
+            Dict[str, Any]: stored results, computations in progress, and counts of started
+            computations, hits, misses, dropped stale results and failures
+        """
+        return {
+            'entries': len(self._entries),
+            'running': sum(1 for _, _, task in self._entries.values() if not task.done()),
+            'started': self.started,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'failures': self.failures,
+        }
@@ -0,0 +1,248 @@
+import sqlite3
+from typing import Dict, List, Optional
+import glob
+import os
+import re
+import argparse
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# unicode61 folds case for Cyrillic; 'ё' is normalized to 'е' before indexing and
+# searching because the tokenizer keeps them distinct. Prefix indexes make the
+# stem* queries produced by build_match_query() cheap.
+#
+# The bot stores a snapshot of the conversation on every turn and every
+# snapshot is indexed: the snapshots are trimmed to the recent messages, so
+# only all of them together cover the whole conversation. Results are
+# grouped by conversation (user and issue) and show its best-matching
+# snapshot, so one conversation does not fill the results once per turn.
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+FTS_PREFIXES = "2 3 4 5"
+
+# Common Russian inflectional endings, longest first
+_REFLEXIVE_ENDINGS = ('ся', 'сь')
+_ENDINGS = (
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ешь', 'ишь',
+    'ий', 'ый', 'ой', 'ая', 'яя', 'ое', 'ее', 'ие', 'ые', 'ую', 'юю', 'ом', 'ем',
+    'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ей', 'ия', 'ья', 'ть', 'ет', 'ут', 'ют',
+    'ит', 'ат', 'ят', 'а', 'я', 'о', 'е', 'у', 'ю', 'ы', 'и', 'ь', 'й',
+)
+MIN_STEM_LENGTH = 3
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """Replace 'ё' with 'е', the tokenizer folds case by itself"""
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def stem_word(word: str) -> str:
+    """
+    Strip a Russian inflectional ending from a word
+
+    Args:
+        word (str): Normalized word
+
+    Returns:
+        str: Stem used as a prefix in full-text queries
+    """
+    for ending in _REFLEXIVE_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            word = word[:-len(ending)]
+            break
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    Turn a free-text query into an FTS5 MATCH expression
+
+    Every word becomes a quoted prefix query of its stem, so different
+    word forms match ("тревогу" finds "тревога", "тревоги").
+
+    Args:
+        query (str): User query
+
+    Returns:
+        Optional[str]: MATCH expression or None if the query has no words
+    """
+    words = _WORD_RE.findall(normalize_text(query.lower()))
+    if not words:
+        return None
+    return ' '.join(f'"{stem_word(word)}"*' for word in words)
+
+
+def extract_search_text(dialogue: List[Dict[str, str]]) -> str:
+    """Collect user and assistant messages of a dialogue into indexable text"""
+    return normalize_text('\n'.join(message.get('content') or '' for message in dialogue
+                                    if message.get('role') != 'system'))
+
+
+def index_dialogue(conn: sqlite3.Connection, dialogue_id: int, dialogue: List[Dict[str, str]]) -> None:
+    """
+    Add a dialogue to the full-text index
+
+    Called from the write path inside the same transaction as the insert.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        dialogue_id (int): ID of the dialogue row
+        dialogue (List[Dict[str, str]]): The dialogue history
+    """
+    conn.execute("INSERT INTO dialogue_fts (rowid, content) VALUES (?, ?)",
+                 (dialogue_id, extract_search_text(dialogue)))
+
+
+def rebuild_index(conn: sqlite3.Connection, db_path: str, batch_size: int = 500) -> int:
+    """
+    Rebuild the full-text index from all stored dialogues
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+        db_path (str): Path to the database file, used to decode compressed rows
+        batch_size (int): Number of rows indexed per transaction
+
+    Returns:
+        int: Number of indexed dialogues
+    """
+    from .compression import decode_json
+
+    conn.execute("DELETE FROM dialogue_fts")
+    conn.commit()
+    last_id = 0
+    indexed = 0
+    while True:
+        rows = conn.execute("SELECT id, dialogue_json FROM dialogues WHERE id > ? ORDER BY id LIMIT ?",
+                            (last_id, batch_size)).fetchall()
+        if not rows:
+            break
+        for row_id, value in rows:
+            index_dialogue(conn, row_id, decode_json(value, db_path))
+        conn.commit()
+        last_id = rows[-1][0]
+        indexed += len(rows)
+    logging.info(f"Full-text index rebuilt for {indexed} dialogues")
+    return indexed
+
+
+def _search_file(db_path: str, match: str, limit: int, user_id: Optional[str],
+                 issue_id: Optional[str], archived: bool) -> List[Dict]:
+    """Run a ranked full-text query against one database file, one result per conversation"""
+    query = '''
+        SELECT d.id AS dialogue_id, d.user_id, d.issue_id, d.timestamp,
+               bm25(dialogue_fts) AS rank,
+               snippet(dialogue_fts, 0, '[', ']', '…', 12) AS snippet
+        FROM dialogue_fts
+        JOIN dialogues d ON d.id = dialogue_fts.rowid
+        WHERE dialogue_fts MATCH ?
+    '''
+    params: List = [match]
+    if user_id is not None:
+        query += ' AND d.user_id = ?'
+        params.append(user_id)
+    if issue_id is not None:
+        query += ' AND d.issue_id = ?'
+        params.append(issue_id)
+    # The row with MIN(rank) supplies the other columns of its group. LIMIT -1 keeps
+    # SQLite from flattening the subquery: bm25() cannot run inside an aggregate
+    query = f'''
+        SELECT dialogue_id, user_id, issue_id, timestamp, MIN(rank) AS rank, snippet
+        FROM ({query} LIMIT -1) GROUP BY user_id, issue_id ORDER BY rank LIMIT ?
+    '''
+    params.append(limit)
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute(query, params).fetchall()
+    except sqlite3.OperationalError as e:
+        # Archive files created before the index existed have no dialogue_fts table
+        logging.warning(f"Full-text search skipped for {db_path}: {e}")
+        rows = []
+    conn.close()
+    return [dict(row, archived=archived) for row in rows]
+
+
+def search_dialogues(query: str, limit: int = 20, user_id: Optional[str] = None,
+                     issue_id: Optional[str] = None, include_archived: bool = False) -> List[Dict]:
+    """
+    Find conversations mentioning the given words
+
+    Args:
+        query (str): Free-text query, all words must match
+        limit (int): Maximum number of results
+        user_id (Optional[str]): Restrict results to one user
+        issue_id (Optional[str]): Restrict results to one issue
+        include_archived (bool): Also search monthly archive files
+
+    Returns:
+        List[Dict]: One result per conversation (user and issue) ordered by relevance, with
+        dialogue_id of its best-matching snapshot, user_id, issue_id, timestamp, rank, snippet
+        and archived keys
+    """
+    from .archive import get_archive_dir
+    from .sharding import fan_out, get_database_paths, get_user_database_path, is_enabled
+
+    match = build_match_query(query)
+    if match is None:
+        return []
+    logging.info(f"Searching dialogues for {match!r}")
+
+    if user_id is not None:
+        results = _search_file(get_user_database_path(user_id), match, limit, user_id, issue_id, False)
+    else:
+        results = [result for shard_results in fan_out(
+            lambda path: _search_file(path, match, limit, user_id, issue_id, False)) for result in shard_results]
+    if include_archived:
+        db_paths = [get_user_database_path(user_id)] if user_id is not None else get_database_paths()
+        for db_path in db_paths:
+            for archive_path in sorted(glob.glob(os.path.join(get_archive_dir(db_path), 'dialogues_*.db'))):
+                results.extend(_search_file(archive_path, match, limit, user_id, issue_id, True))
+    if include_archived or is_enabled():
+        results.sort(key=lambda result: result['rank'])
+    if include_archived:
+        # A conversation may continue in the hot database after part of it was archived
+        best: Dict = {}
+        for result in results:
+            best.setdefault((result['user_id'], result['issue_id']), result)
+        results = list(best.values())
+    return results[:limit]
+
+
+def main() -> None:
+    """Command line entry point for searching and rebuilding the index"""
+    from . import database
+    from .sharding import get_database_paths
+
+    parser = argparse.ArgumentParser(description="Full-text search over stored dialogues")
+    parser.add_argument('query', nargs='?', help="words to search for")
+    parser.add_argument('--limit', type=int, default=20, help="maximum number of results")
+    parser.add_argument('--user', help="restrict results to one user")
+    parser.add_argument('--issue', help="restrict results to one issue")
+    parser.add_argument('--archived', action='store_true', help="also search archive files")
+    parser.add_argument('--rebuild', action='store_true', help="rebuild the index from all dialogues")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        for db_path in get_database_paths():
+            database.ensure_db(db_path)
+            conn = sqlite3.connect(db_path)
+            rebuild_index(conn, db_path)
+            conn.close()
+    if args.query:
+        for result in search_dialogues(args.query, args.limit, args.user, args.issue, args.archived):
+            print(f"{result['dialogue_id']}\t{result['user_id']}\t{result['issue_id']}\t"
+                  f"{result['timestamp']}\t{result['snippet']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Tuple
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Максимальное число активных сессий в памяти; вытесненная сессия восстанавливается из базы
+SESSION_MAX_ENTRIES = 2000
+# Максимальный суммарный размер сессий в байтах (оценка по sys.getsizeof)
+SESSION_MAX_BYTES = 64 * 1024 * 1024
+# Сессия без обращений дольше этого времени (в секундах) удаляется
+SESSION_IDLE_TTL_SECONDS = 6 * 60 * 60
+
+# Диалог, последнее сообщение которого старше этого времени (в секундах), не восстанавливается
+SESSION_REHYDRATE_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+# Сколько последних сообщений восстанавливается в сессию
+SESSION_REHYDRATE_MESSAGES = 10
+
+_MISSING = object()
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Estimate the memory held by a session value
+
+    Counts the containers and the strings and numbers inside them,
+    shared objects are counted once.
+
+    Args:
+        value (Any): Session value, usually a dict with a messages list
+
+    Returns:
+        int: Size in bytes
+    """
+    seen = set()
+    stack = [value]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+    return total
+
+
+class SessionStore:
+    """
+    Bounded in-memory store of active user sessions.
+
+    Used like a dict: `key in store`, `store[key]`, `store[key] = value`,
+    `del store[key]`. Sessions are evicted least recently used first when
+    the entry or byte limit is exceeded, and dropped after an idle TTL.
+
+    Values may be modified in place after `store[key]`; their size is
+    measured again on the next call to the store.
+
+    With a loader, get() and `store[key]` rebuild a missing session by
+    calling loader(key); `key in store` checks memory only. The loader may
+    block (e.g. read the database), so async code uses get_async(), which
+    runs it in a thread.
+    """
+
+    def __init__(self, name: str, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 idle_ttl_seconds: Optional[float] = None, loader: Optional[Callable[[Hashable], Any]] = None):
+        self.name = name
+        self.loader = loader
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._idle_ttl_seconds = idle_ttl_seconds
+        # key -> (last access time, size, value), oldest access first
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._dirty = set()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.loads = 0
+
+    @property
+    def max_entries(self) -> int:
+        return SESSION_MAX_ENTRIES if self._max_entries is None else self._max_entries
+
+    @property
+    def max_bytes(self) -> int:
+        return SESSION_MAX_BYTES if self._max_bytes is None else self._max_bytes
+
+    @property
+    def idle_ttl_seconds(self) -> float:
+        return SESSION_IDLE_TTL_SECONDS if self._idle_ttl_seconds is None else self._idle_ttl_seconds
+
+    def _remeasure(self) -> None:
+        """Update sizes of values handed out since the last call"""
+        for key in self._dirty:
+            entry = self._entries.get(key)
+            if entry is not None:
+                accessed_at, size, value = entry
+                new_size = estimate_size(value)
+                self._bytes += new_size - size
+                self._entries[key] = (accessed_at, new_size, value)
+        self._dirty.clear()
+
+    def _remove(self, key: Hashable) -> Any:
+        _, size, value = self._entries.pop(key)
+        self._dirty.discard(key)
+        self._bytes -= size
+        return value
+
+    def _expire(self, now: float) -> None:
+        """Drop idle sessions; they sit at the front in access order"""
+        deadline = now - self.idle_ttl_seconds
+        while self._entries:
+            key, (accessed_at, _, _) = next(iter(self._entries.items()))
+            if accessed_at > deadline:
+                break
+            self._remove(key)
+            self.expirations += 1
+
+    def _enforce_limits(self) -> None:
+        """
+        Evict least recently used sessions above the entry and byte limits
+
+        The most recently used session is kept even if it alone exceeds the byte limit.
+        """
+        while len(self._entries) > self.max_entries or (len(self._entries) > 1 and self._bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+            logging.info(f"Session store {self.name}: evicted session {key}")
+
+    def _maintain(self, now: float) -> None:
+        self._remeasure()
+        self._expire(now)
+        self._enforce_limits()
+
+    def _lookup(self, key: Hashable) -> Any:
+        """Return a session in memory and mark it as used, or _MISSING"""
+        now = time.monotonic()
+        with self._lock:
+            self._maintain(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            _, size, value = entry
+            self._entries[key] = (now, size, value)
+            self._entries.move_to_end(key)
+            self._dirty.add(key)
+            self.hits += 1
+            return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Return a session and mark it as used
+
+        Args:
+            key (Hashable): Session key, e.g. user ID
+            default (Any): Value returned when there is no active session
+
+        Returns:
+            Any: Session value or default
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+        return self._load(key, default)
+
+    async def get_async(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Return a session like get(), rebuilding a missing one in a thread
+
+        Args:
+            key (Hashable): Session key, e.g. user ID
+            default (Any): Value returned when there is no session to restore
+
+        Returns:
+            Any: Session value or default
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+        if self.loader is None:
+            return default
+        return await asyncio.to_thread(self._load, key, default)
+
+    def _load(self, key: Hashable, default: Any) -> Any:
+        """Rebuild a missing session with the loader, outside the lock"""
+        if self.loader is None:
+            return default
+        value = self.loader(key)
+        if value is None:
+            return default
+        with self._lock:
+            self.loads += 1
+            if key in self._entries:
+                # Another thread loaded or set the session meanwhile
+                return self._entries[key][2]
+            self[key] = value
+        logging.info(f"Session store {self.name}: session {key} restored")
+        return value
+
+    def __getitem__(self, key: Hashable) -> Any:
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        now = time.monotonic()
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (now, size, value)
+            self._bytes += size
+            self._maintain(now)
+            # The caller may keep modifying the value it has just stored
+            self._dirty.add(key)
+
+    def __delitem__(self, key: Hashable) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove a session and return it, or default if there is none"""
+        with self._lock:
+            if key not in self._entries:
+                return default
+            return self._remove(key)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            self._maintain(time.monotonic())
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._maintain(time.monotonic())
+            return len(self._entries)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        with self._lock:
+            self._maintain(time.monotonic())
+            return iter(list(self._entries))
+
+    def clear(self) -> None:
+        """Drop all sessions, counters are kept"""
+        with self._lock:
+            self._entries.clear()
+            self._dirty.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Collect memory and eviction metrics
+
+        Returns:
+            Dict[str, Any]: entries, bytes, limits, hits, misses, loads, evictions and expirations
+        """
+        with self._lock:
+            self._maintain(time.monotonic())
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'loads': self.loads,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    """Parse a stored UTC timestamp ('YYYY-MM-DD HH:MM:SS', fractional seconds or ISO 'T' allowed)"""
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+def load_dialogue_session(user_id: Hashable) -> Optional[Dict[str, Any]]:
+    """
+    Rebuild a bot dialogue session from the latest stored dialogue of a user
+
+    Every bot reply is logged as a dialogue record of the system prompt,
+    the greeting and the recent messages, so the newest record (found via
+    the (user_id, timestamp) index) holds the state of the conversation.
+
+    Args:
+        user_id (Hashable): Telegram user ID as used in the dialogues table
+
+    Returns:
+        Optional[Dict[str, Any]]: Session with dialogue_id, issue_id and messages keys,
+        or None if the user has no recent dialogue (a record with an unreadable timestamp is treated as old)
+    """
+    from .database import get_latest_user_dialogue
+
+    record = get_latest_user_dialogue(str(user_id))
+    if record is None:
+        return None
+    timestamp = _parse_timestamp(record['timestamp'])
+    if timestamp is None:
+        logging.warning(f"Dialogue {record['id']} has an unreadable timestamp {record['timestamp']!r}, "
+                        f"session of user {user_id} is not restored")
+        return None
+    age = datetime.now(timezone.utc) - timestamp
+    if age.total_seconds() > SESSION_REHYDRATE_MAX_AGE_SECONDS:
+        return None
+
+    dialogue = record['dialogue_json']
+    # Skip the system prompt and the greeting, they are added again for every request
+    if dialogue and dialogue[0].get('role') == 'system':
+        dialogue = dialogue[2:]
+    return {
+        'dialogue_id': record['id'],
+        'issue_id': record['issue_id'],
+        'messages': list(dialogue[-SESSION_REHYDRATE_MESSAGES:]),
+    }
@@ -0,0 +1,225 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, TypeVar
+import argparse
+import os
+import threading
+import zlib
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# In sharded mode every user's dialogues and recommendations live in one of
+# SHARD_COUNT SQLite files chosen by a stable hash of user_id, so writers of
+# different users do not wait for each other's locks. Shard 0 is the main
+# DATABASE_PATH, which also keeps users and feedback. Record IDs of shard N
+# start at N * SHARD_ID_SPAN, so a record ID alone tells which file holds it.
+# The shard count must not change once data has been written; startup
+# refuses a main file that holds history of users of other shards.
+
+# Число файлов-шардов; 0 или 1 - одна база DATABASE_PATH
+SHARD_COUNT = 0
+
+# Каталог с файлами шардов 1..N-1; по умолчанию shards/ рядом с основной базой
+SHARD_DIR: Optional[str] = None
+
+# Размер диапазона ID записей одного шарда
+SHARD_ID_SPAN = 10 ** 12
+
+# Таблицы, ID которых выделяются из диапазона шарда
+SHARDED_TABLES = ('dialogues', 'book_recommendations')
+
+# Таблицы с историей пользователей, проверяемые при запуске с шардированием
+USER_HISTORY_TABLES = SHARDED_TABLES + ('archived_dialogues', 'archived_book_recommendations')
+
+_prepared_paths = set()
+_prepare_lock = threading.Lock()
+
+T = TypeVar('T')
+
+
+def is_enabled() -> bool:
+    """Check whether user data is spread over several files"""
+    return SHARD_COUNT > 1
+
+
+def shard_index(user_id: str) -> int:
+    """
+    Return the shard of a user
+
+    CRC32 is used instead of hash() so the mapping is the same in every process.
+
+    Args:
+        user_id (str): Unique identifier for the user
+
+    Returns:
+        int: Shard number in range(SHARD_COUNT), 0 when sharding is off
+    """
+    if not is_enabled():
+        return 0
+    return zlib.crc32(str(user_id).encode('utf-8')) % SHARD_COUNT
+
+
+def get_shard_dir() -> str:
+    """Return the directory with shard files 1..N-1"""
+    from . import database
+
+    return SHARD_DIR or os.path.join(os.path.dirname(database.DATABASE_PATH), 'shards')
+
+
+def _prepare_shard(path: str, index: int) -> None:
+    """Create a shard file and start its ID sequences at the shard's range"""
+    from . import database
+
+    database.ensure_db(path)
+    conn = sqlite3.connect(path)
+    for table in SHARDED_TABLES:
+        conn.execute('''
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+        ''', (table, index * SHARD_ID_SPAN, table))
+    conn.commit()
+    conn.close()
+    logging.info(f"Prepared shard {index} at {path}")
+
+
+def get_shard_path(index: int) -> str:
+    """
+    Return the database file of a shard, creating it on first use
+
+    Args:
+        index (int): Shard number
+
+    Returns:
+        str: Path to the shard database file
+    """
+    from . import database
+
+    if index == 0:
+        return database.DATABASE_PATH
+    path = os.path.join(get_shard_dir(), f"dialogues_shard_{index}.db")
+    if path not in _prepared_paths or not os.path.exists(path):
+        with _prepare_lock:
+            if path not in _prepared_paths or not os.path.exists(path):
+                _prepare_shard(path, index)
+                _prepared_paths.add(path)
+    return path
+
+
+def get_user_database_path(user_id: str) -> str:
+    """
+    Return the database file holding a user's dialogues and recommendations
+
+    Args:
+        user_id (str): Unique identifier for the user
+
+    Returns:
+        str: Path to the database file
+    """
+    return get_shard_path(shard_index(user_id))
+
+
+def get_record_database_path(record_id: int) -> str:
+    """
+    Return the database file holding a dialogue or recommendation record
+
+    Args:
+        record_id (int): ID of the record
+
+    Returns:
+        str: Path to the database file
+    """
+    if not is_enabled():
+        return get_shard_path(0)
+    return get_shard_path(min(int(record_id) // SHARD_ID_SPAN, SHARD_COUNT - 1))
+
+
+def get_database_paths() -> List[str]:
+    """Return the database files of all shards, the main file first"""
+    return [get_shard_path(index) for index in range(max(SHARD_COUNT, 1))]
+
+
+def check_shard_layout() -> None:
+    """
+    Refuse sharding over a main file that still holds other shards' users
+
+    Enabling SHARD_COUNT > 1 on an existing single-file database would route
+    those users to empty shards and hide their history, so the data has to
+    be moved first (export.py, then bulk_load.py into a fresh sharded setup).
+
+    Raises:
+        RuntimeError: If shard 0 has dialogues or recommendations of users of other shards
+    """
+    from .database import pooled_connection
+
+    if not is_enabled():
+        return
+    with pooled_connection(get_shard_path(0)) as conn:
+        users = {row[0] for table in USER_HISTORY_TABLES
+                 for row in conn.execute(f"SELECT DISTINCT user_id FROM {table}")}
+    misplaced = sum(1 for user_id in users if shard_index(user_id) != 0)
+    if misplaced:
+        raise RuntimeError(f"{misplaced} users in {get_shard_path(0)} belong to other shards; "
+                           f"SHARD_COUNT={SHARD_COUNT} cannot be enabled on an unsharded database")
+
+
+def fan_out(func: Callable[[str], T]) -> List[T]:
+    """
+    Run a function against every shard in parallel
+
+    Args:
+        func (Callable[[str], T]): Function taking the path of a database file
+
+    Returns:
+        List[T]: Results in shard order
+    """
+    paths = get_database_paths()
+    if len(paths) == 1:
+        return [func(paths[0])]
+    with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+        return list(executor.map(func, paths))
+
+
+def query_all(query: str, params: tuple = ()) -> List[Dict]:
+    """
+    Run a read query against every shard and concatenate the rows
+
+    Args:
+        query (str): SQL query
+        params (tuple): Query parameters
+
+    Returns:
+        List[Dict]: Rows of all shards, in shard order
+    """
+    from .database import pooled_connection
+
+    def run(path: str) -> List[Dict]:
+        with pooled_connection(path) as conn:
+            return [dict(row) for row in conn.execute(query, params)]
+
+    return [row for rows in fan_out(run) for row in rows]
+
+
+def main() -> None:
+    """Command line entry point for printing the number of rows per shard"""
+    from .database import pooled_connection
+
+    global SHARD_COUNT
+    parser = argparse.ArgumentParser(description="Rows per shard of the sharded dialogue storage")
+    parser.add_argument('--shards', type=int, default=SHARD_COUNT, help="number of shards")
+    args = parser.parse_args()
+
+    SHARD_COUNT = args.shards
+    for index, path in enumerate(get_database_paths()):
+        with pooled_connection(path) as conn:
+            dialogues = conn.execute("SELECT COUNT(*) FROM dialogues").fetchone()[0]
+            recommendations = conn.execute("SELECT COUNT(*) FROM book_recommendations").fetchone()[0]
+        print(f"{index}\t{dialogues}\t{recommendations}\t{path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+import logging
+
+from aiogram import Dispatcher
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.types import Update
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Graceful shutdown of the bot's dispatcher. By the time the dispatcher
+# shuts down it no longer receives updates (polling is stopped, the webhook
+# server answers 503, worker processes got their stop marker), but updates
+# already being handled - dialogue turns waiting for the AI - would be
+# abandoned. The shutdown sequence is:
+#   1. wait up to SHUTDOWN_TIMEOUT_SECONDS for updates in flight;
+#   2. close the FSM storage, which writes its pending changes;
+#   3. close the database connection pool.
+# The dispatcher closes its FSM storage first thing on shutdown, so the wait
+# is part of closing the storage: the dispatcher is created with a
+# DrainingStorage, which waits for the updates in flight before it closes the
+# storage behind it. The bot's HTTP session is closed last by the polling
+# loop, run_webhook() or the worker process.
+
+# Сколько секунд при остановке ждать завершения обрабатываемых обновлений
+SHUTDOWN_TIMEOUT_SECONDS = 25
+
+
+class InFlightTracker:
+    """
+    Counts updates being handled by a dispatcher and waits for them on shutdown.
+
+    Registered as an outer update middleware, so an update counts as in
+    flight until its handler, including a dialogue turn queued in a mailbox,
+    has finished.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self._timeout = timeout
+        self._in_flight = 0
+        self._idle: Optional[asyncio.Event] = None
+        self.closing = False
+        self.handled = 0
+        self.abandoned = 0
+
+    @property
+    def timeout(self) -> float:
+        return SHUTDOWN_TIMEOUT_SECONDS if self._timeout is None else self._timeout
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _idle_event(self) -> asyncio.Event:
+        if self._idle is None:
+            self._idle = asyncio.Event()
+            self._idle.set()
+        return self._idle
+
+    async def __call__(self, handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]], update: Update,
+                       data: Dict[str, Any]) -> Any:
+        self._in_flight += 1
+        self._idle_event().clear()
+        try:
+            return await handler(update, data)
+        finally:
+            self._in_flight -= 1
+            self.handled += 1
+            if not self._in_flight:
+                self._idle_event().set()
+
+    async def drain(self) -> bool:
+        """
+        Wait for the updates in flight
+
+        Returns:
+            bool: True if all of them finished before the timeout
+        """
+        self.closing = True
+        if not self._in_flight:
+            return True
+        logging.info(f"Waiting up to {self.timeout}s for {self._in_flight} updates in flight")
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._idle_event().wait(), self.timeout)
+        except asyncio.TimeoutError:
+            self.abandoned = self._in_flight
+            logging.warning(f"Shutdown timeout: {self.abandoned} updates in flight are abandoned")
+            return False
+        logging.info(f"Updates in flight finished in {time.monotonic() - started:.1f}s")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Collect shutdown metrics
+
+        Returns:
+            Dict[str, Any]: updates in flight, handled updates, updates abandoned
+            at shutdown and whether the shutdown has started
+        """
+        return {
+            'in_flight': self._in_flight,
+            'handled': self.handled,
+            'abandoned': self.abandoned,
+            'closing': self.closing,
+        }
+
+
+class DrainingStorage(BaseStorage):
+    """
+    FSM storage that waits for the updates in flight before it is closed.
+
+    Usage:
+        dp = Dispatcher(storage=DrainingStorage(create_fsm_storage()))
+        install_graceful_shutdown(dp)
+
+    Reads and writes go to the storage behind it unchanged.
+    """
+
+    def __init__(self, storage: BaseStorage, timeout: Optional[float] = None):
+        self.storage = storage
+        self.tracker = InFlightTracker(timeout)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self.storage.set_state(key, state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self.storage.get_state(key)
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self.storage.set_data(key, data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return await self.storage.get_data(key)
+
+    async def close(self) -> None:
+        await self.tracker.drain()
+        await self.storage.close()
+
+
+async def close_database() -> None:
+    """Close the idle connections of the database pool"""
+    from .database import close_pool
+
+    await asyncio.to_thread(close_pool)
+
+
+def install_graceful_shutdown(dispatcher: Dispatcher) -> InFlightTracker:
+    """
+    Make the dispatcher finish updates in flight and flush writes when it shuts down
+
+    Args:
+        dispatcher (Dispatcher): Dispatcher with the bot's routers, created with a DrainingStorage
+
+    Returns:
+        InFlightTracker: Tracker of the dispatcher's updates in flight
+
+    Raises:
+        ValueError: If the dispatcher's FSM storage is not a DrainingStorage
+    """
+    if not isinstance(dispatcher.storage, DrainingStorage):
+        raise ValueError("Create the dispatcher with storage=DrainingStorage(...) to drain it on shutdown")
+    tracker = dispatcher.storage.tracker
+    dispatcher.update.outer_middleware(tracker)
+    # The FSM storage may write through the pool, so the pool is closed after it
+    dispatcher.shutdown.register(close_database)
+    return tracker
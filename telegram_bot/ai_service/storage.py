@@ -0,0 +1,199 @@
+"""
+Unified storage layer for users, feedback, dialogues and book recommendations.
+
+All tables live in the dialogues database and are served through the
+connection pool of the database module. Schema setup happens once per
+process in init_storage(), not on the request path.
+"""
+
+from typing import Dict, List, Optional
+from datetime import datetime
+import os
+import logging
+from . import database
+from .analytics import record_feedback
+from .sharding import check_shard_layout, is_enabled, get_user_database_path
+from .database import (
+    pooled_connection,
+    close_pool,
+    log_dialogue,
+    log_book_recommendations,
+    get_user_dialogues,
+    get_user_recommendations,
+    get_dialogue_by_id,
+    get_latest_user_dialogue
+)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Отдельная база пользователей, которую раньше вел bot_main; импортируется один раз
+LEGACY_USERS_DATABASE_PATH = 'users.db'
+
+_initialized_paths = set()
+
+
+def _import_legacy_users() -> None:
+    """Copy users and feedback from the legacy users.db into the main database once"""
+    if not os.path.exists(LEGACY_USERS_DATABASE_PATH):
+        return
+
+    with pooled_connection() as conn:
+        imported = conn.execute("SELECT value FROM storage_meta WHERE key = 'legacy_users_imported'").fetchone()
+        if imported is not None:
+            return
+
+        logging.info(f"Importing users and feedback from {LEGACY_USERS_DATABASE_PATH}")
+        conn.execute("ATTACH DATABASE ? AS legacy", (LEGACY_USERS_DATABASE_PATH,))
+        try:
+            tables = {row['name'] for row in conn.execute("SELECT name FROM legacy.sqlite_master WHERE type = 'table'")}
+            conn.execute("BEGIN")
+            if 'users' in tables:
+                conn.execute("INSERT OR REPLACE INTO main.users (id, username, dialogs) "
+                             "SELECT id, username, dialogs FROM legacy.users")
+            if 'feedback' in tables:
+                # bot_main wrote datetime.now(), i.e. local time; the main database keeps UTC
+                conn.execute("INSERT INTO main.feedback (user_id, feedback, feedback_date) "
+                             "SELECT user_id, feedback, COALESCE(datetime(feedback_date, 'utc'), feedback_date) "
+                             "FROM legacy.feedback ORDER BY id")
+                # The rollups were filled by the migrations before this import
+                conn.execute("INSERT INTO main.daily_feedback_stats (day, feedback) "
+                             "SELECT date(feedback_date, 'utc') AS day, COUNT(*) FROM legacy.feedback "
+                             "WHERE day IS NOT NULL GROUP BY day "
+                             "ON CONFLICT (day) DO UPDATE SET feedback = feedback + excluded.feedback")
+            conn.execute("INSERT INTO storage_meta (key, value) VALUES ('legacy_users_imported', ?)",
+                         (os.path.abspath(LEGACY_USERS_DATABASE_PATH),))
+            conn.commit()
+        except Exception:
+            # A database with an open transaction cannot be detached
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("DETACH DATABASE legacy")
+
+
+def init_storage() -> None:
+    """
+    Prepare the storage once per process: apply migrations and import legacy data
+
+    Repeated calls for the same database file return immediately.
+    """
+    if database.DATABASE_PATH in _initialized_paths:
+        return
+    database.init_db()
+    check_shard_layout()
+    _import_legacy_users()
+    _initialized_paths.add(database.DATABASE_PATH)
+    logging.info("Storage initialized")
+
+
+def save_user(user_id: int, username: Optional[str]) -> None:
+    """
+    Create or update a user
+
+    Args:
+        user_id (int): Telegram user ID
+        username (Optional[str]): Telegram username
+    """
+    with pooled_connection() as conn:
+        conn.execute("INSERT OR REPLACE INTO users (id, username, dialogs) VALUES (?, ?, ?)",
+                     (user_id, username, ''))
+        conn.commit()
+    logging.info(f"User {username} saved")
+
+
+def get_user(user_id: int) -> Optional[Dict]:
+    """
+    Retrieve a user by Telegram ID
+
+    Args:
+        user_id (int): Telegram user ID
+
+    Returns:
+        Optional[Dict]: User record or None if not found
+    """
+    with pooled_connection() as conn:
+        row = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def save_feedback(user_id: int, feedback_text: str, feedback_date: Optional[datetime] = None) -> int:
+    """
+    Save user feedback
+
+    Args:
+        user_id (int): Telegram user ID
+        feedback_text (str): Feedback message
+        feedback_date (Optional[datetime]): Time of the feedback, current UTC time by default
+
+    Returns:
+        int: ID of the inserted feedback record
+    """
+    with pooled_connection() as conn:
+        if feedback_date is None:
+            cursor = conn.execute("INSERT INTO feedback (user_id, feedback) VALUES (?, ?)",
+                                  (user_id, feedback_text))
+            record_feedback(conn)
+        else:
+            cursor = conn.execute("INSERT INTO feedback (user_id, feedback, feedback_date) VALUES (?, ?, ?)",
+                                  (user_id, feedback_text, feedback_date.strftime('%Y-%m-%d %H:%M:%S')))
+            record_feedback(conn, feedback_date.strftime('%Y-%m-%d'))
+        conn.commit()
+    logging.info(f"Feedback from user {user_id} saved with ID: {cursor.lastrowid}")
+    return cursor.lastrowid
+
+
+def get_feedback_with_dialogues(limit: int = 100, since: Optional[str] = None) -> List[Dict]:
+    """
+    Retrieve feedback together with the user's last dialogue before it
+
+    Args:
+        limit (int): Maximum number of feedback records, newest first
+        since (Optional[str]): Only feedback at or after this 'YYYY-MM-DD HH:MM:SS' time
+
+    Returns:
+        List[Dict]: Feedback records with username, dialogue_id, issue_id,
+        dialogue_timestamp and dialogue_count keys
+    """
+    query = '''
+        SELECT f.id, f.user_id, u.username, f.feedback, f.feedback_date,
+               d.id AS dialogue_id, d.issue_id, d.timestamp AS dialogue_timestamp,
+               (SELECT COUNT(*) FROM dialogues c WHERE c.user_id = CAST(f.user_id AS TEXT)) AS dialogue_count
+        FROM feedback f
+        LEFT JOIN users u ON u.id = f.user_id
+        LEFT JOIN dialogues d ON d.id = (
+            SELECT l.id FROM dialogues l
+            WHERE l.user_id = CAST(f.user_id AS TEXT) AND l.timestamp <= f.feedback_date
+            ORDER BY l.timestamp DESC, l.id DESC
+            LIMIT 1
+        )
+    '''
+    params: List = []
+    if since is not None:
+        query += ' WHERE f.feedback_date >= ?'
+        params.append(since)
+    query += ' ORDER BY f.feedback_date DESC, f.id DESC LIMIT ?'
+    params.append(limit)
+
+    with pooled_connection() as conn:
+        rows = conn.execute(query, params).fetchall()
+    records = [dict(row) for row in rows]
+    if is_enabled():
+        # The join above sees only the main file, dialogues of other shards are looked up per user
+        for record in records:
+            user_id = str(record['user_id'])
+            with pooled_connection(get_user_database_path(user_id)) as conn:
+                dialogue = conn.execute('''
+                    SELECT id, issue_id, timestamp FROM dialogues
+                    WHERE user_id = ? AND timestamp <= ?
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT 1
+                ''', (user_id, record['feedback_date'])).fetchone()
+                dialogue_count = conn.execute("SELECT COUNT(*) FROM dialogues WHERE user_id = ?",
+                                              (user_id,)).fetchone()[0]
+            record['dialogue_id'], record['issue_id'], record['dialogue_timestamp'] = dialogue or (None, None, None)
+            record['dialogue_count'] = dialogue_count
+    return records
@@ -0,0 +1,246 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+import hmac
+import logging
+import signal
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiogram.webhook.aiohttp_server import setup_application
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+except ImportError:  # prometheus_client is only needed for the /metrics route
+    generate_latest = None
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# In webhook mode Telegram posts every update to an aiohttp endpoint. The
+# handler validates the secret token, puts the update on a bounded queue and
+# answers at once; WEBHOOK_WORKERS tasks feed queued updates to the
+# dispatcher. A full queue is answered with 503 so Telegram retries later
+# instead of the bot buffering without limit. Several instances can run
+# behind a load balancer with the same URL and secret.
+
+# Путь, на который Telegram отправляет обновления
+WEBHOOK_PATH = '/webhook'
+
+# Максимальное число принятых, но еще не обработанных обновлений
+WEBHOOK_QUEUE_SIZE = 1000
+
+# Число обновлений, обрабатываемых одновременно
+WEBHOOK_WORKERS = 64
+
+# Сколько секунд при остановке ждать обработки уже принятых обновлений
+# (и завершения обрабатываемых: задачи обработки затем отменяются)
+WEBHOOK_DRAIN_TIMEOUT_SECONDS = 25
+
+# Заголовок, в котором Telegram передает секретный токен вебхука
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """
+    aiohttp application receiving Telegram updates for a dispatcher.
+
+    Routes:
+        POST WEBHOOK_PATH - updates from Telegram
+        GET /healthz - liveness, always 200 while the process serves requests
+        GET /readyz - readiness, 503 while the queue is full or the server is stopping
+        GET /metrics - Prometheus metrics of the process, if prometheus_client is installed
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: Optional[str] = None,
+                 path: Optional[str] = None, queue_size: Optional[int] = None, workers: Optional[int] = None):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.secret_token = secret_token
+        self.path = path or WEBHOOK_PATH
+        self.queue_size = WEBHOOK_QUEUE_SIZE if queue_size is None else queue_size
+        self.workers = WEBHOOK_WORKERS if workers is None else workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._accepting = False
+        self.received = 0
+        self.rejected = 0
+        self.unauthorized = 0
+        self.processed = 0
+        self.failed = 0
+        if not secret_token:
+            logging.warning("Webhook secret token is not set, updates are accepted from anyone")
+
+    def create_app(self) -> web.Application:
+        """
+        Build the aiohttp application
+
+        The dispatcher's startup and shutdown handlers run with the
+        application; accepted updates are processed before the dispatcher
+        shuts down.
+
+        Returns:
+            web.Application: Application to pass to web.AppRunner or web.run_app
+        """
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get('/healthz', self.handle_health)
+        app.router.add_get('/readyz', self.handle_ready)
+        if generate_latest is not None:
+            app.router.add_get('/metrics', self.handle_metrics)
+        app.on_startup.append(self.start)
+        app.on_shutdown.append(self.stop)
+        setup_application(app, self.dispatcher, bot=self.bot)
+        return app
+
+    async def start(self, app: web.Application) -> None:
+        """Start the workers feeding updates to the dispatcher"""
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._accepting = True
+        logging.info(f"Webhook server listening on {self.path} with {self.workers} workers")
+
+    async def stop(self, app: web.Application) -> None:
+        """Stop accepting updates, wait for accepted ones and stop the workers"""
+        self._accepting = False
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), WEBHOOK_DRAIN_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                logging.warning(f"Webhook server stopped with {self._queue.qsize()} unprocessed updates")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        while True:
+            update = await self._queue.get()
+            try:
+                await self.dispatcher.feed_update(self.bot, update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"Failed to process update {update.update_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _authorized(self, request: web.Request) -> bool:
+        if not self.secret_token:
+            return True
+        return hmac.compare_digest(request.headers.get(SECRET_TOKEN_HEADER, ''), self.secret_token)
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """Validate an update from Telegram and queue it for processing"""
+        if not self._authorized(request):
+            self.unauthorized += 1
+            return web.json_response({'error': 'unauthorized'}, status=401)
+        if not self._accepting:
+            return web.json_response({'error': 'stopping'}, status=503)
+
+        try:
+            update = Update.model_validate(await request.json(), context={'bot': self.bot})
+        except ValueError as e:
+            logging.warning(f"Rejected malformed update: {e}")
+            return web.json_response({'error': 'malformed update'}, status=400)
+
+        self.received += 1
+        try:
+            self._queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Telegram delivers the update again later
+            self.rejected += 1
+            logging.warning(f"Update queue is full, rejected update {update.update_id}")
+            return web.json_response({'error': 'queue full'}, status=503, headers={'Retry-After': '1'})
+        return web.json_response({'ok': True})
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({'status': 'ok'})
+
+    async def handle_ready(self, request: web.Request) -> web.Response:
+        stats = self.stats()
+        ready = self._accepting and not self._queue.full()
+        return web.json_response(dict(stats, status='ready' if ready else 'busy'), status=200 if ready else 503)
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        response = web.Response(body=generate_latest())
+        response.headers['Content-Type'] = CONTENT_TYPE_LATEST
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Collect webhook metrics
+
+        Returns:
+            Dict[str, Any]: queued updates, queue size, workers and counters of received,
+            rejected, unauthorized, processed and failed updates
+        """
+        return {
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'queue_size': self.queue_size,
+            'workers': self.workers,
+            'received': self.received,
+            'rejected': self.rejected,
+            'unauthorized': self.unauthorized,
+            'processed': self.processed,
+            'failed': self.failed,
+        }
+
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot, url: Optional[str] = None,
+                      secret_token: Optional[str] = None, host: str = '0.0.0.0', port: int = 8080,
+                      allowed_updates: Optional[List[str]] = None) -> None:
+    """
+    Serve updates through a webhook until SIGTERM or SIGINT arrives or the task is cancelled
+
+    On stop the server refuses new updates (Telegram delivers them again,
+    e.g. to another instance), finishes the accepted ones, shuts the
+    dispatcher down and closes the bot session.
+
+    Args:
+        dispatcher (Dispatcher): Dispatcher with the bot's routers
+        bot (Bot): Bot instance
+        url (Optional[str]): Public URL of the webhook; if given, it is registered with Telegram
+            on startup, otherwise the webhook must be set up separately
+        secret_token (Optional[str]): Secret Telegram sends with every update
+        host (str): Interface to listen on
+        port (int): Port to listen on
+        allowed_updates (Optional[List[str]]): Update types to receive, by default the ones
+            the dispatcher has handlers for
+    """
+    server = WebhookServer(dispatcher, bot, secret_token=secret_token)
+    app = server.create_app()
+
+    if url:
+        async def register_webhook(app: web.Application) -> None:
+            await bot.set_webhook(url.rstrip('/') + server.path, secret_token=secret_token,
+                                  allowed_updates=allowed_updates or dispatcher.resolve_used_update_types())
+            logging.info(f"Webhook registered at {url}")
+
+        app.on_startup.append(register_webhook)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signal_number, stopping.set)
+        except (NotImplementedError, RuntimeError):  # Windows: Ctrl+C cancels the task instead
+            pass
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+        await stopping.wait()
+        logging.info("Stopping the webhook server")
+    finally:
+        for signal_number in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.remove_signal_handler(signal_number)
+            except (NotImplementedError, RuntimeError):
+                pass
+        await runner.cleanup()
+        await bot.session.close()
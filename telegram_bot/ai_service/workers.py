@@ -0,0 +1,314 @@
+import asyncio
+import multiprocessing
+import queue
+import signal
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import zlib
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# The front process receives updates (polling or webhook) with a dispatcher
+# that has no handlers, only a middleware forwarding every update to one of
+# N worker processes chosen by a stable hash of the user ID. Each worker
+# runs the bot's own dispatcher, so all updates of a user, their session
+# and mailbox stay in one process. A supervisor in the front process
+# restarts workers that exit or stop sending heartbeats. A graceful restart
+# keeps the updates waiting in the worker's queue for its replacement; a
+# killed worker may hold the queue's lock, so it gets a new queue and the
+# updates still waiting for it are lost.
+
+# Максимальное число обновлений в очереди одного процесса-обработчика
+WORKER_QUEUE_SIZE = 1000
+
+# Сколько секунд ждать места в очереди обработчика, прежде чем отказаться от обновления
+WORKER_PUT_TIMEOUT_SECONDS = 5
+
+# Интервал (в секундах), с которым обработчик сообщает, что его цикл событий жив
+WORKER_HEARTBEAT_INTERVAL_SECONDS = 1
+# Обработчик без сигнала дольше этого времени (в секундах) считается зависшим и перезапускается
+WORKER_HEARTBEAT_TIMEOUT_SECONDS = 30
+
+# Интервал (в секундах) проверки состояния обработчиков
+WORKER_HEALTH_INTERVAL_SECONDS = 5
+
+# Сколько секунд при остановке ждать, пока обработчик завершит принятые обновления
+WORKER_STOP_TIMEOUT_SECONDS = 30
+
+WorkerFactory = Callable[[], Tuple[Dispatcher, Bot]]
+
+
+def worker_index(key: Any, workers: int) -> int:
+    """
+    Return the worker process responsible for a user
+
+    CRC32 is used instead of hash() so the mapping is the same in every process.
+
+    Args:
+        key (Any): User ID (or chat ID for updates without a user)
+        workers (int): Number of worker processes
+
+    Returns:
+        int: Worker number in range(workers)
+    """
+    return zlib.crc32(str(key).encode('utf-8')) % workers
+
+
+async def _run_worker(index: int, factory: WorkerFactory, updates: multiprocessing.Queue,
+                      heartbeat: Any) -> None:
+    """Feed updates from the queue to the worker's dispatcher until a stop marker arrives"""
+    dispatcher, bot = factory()
+    await dispatcher.emit_startup(bot=bot)
+
+    async def beat() -> None:
+        while True:
+            heartbeat.value = time.time()
+            await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL_SECONDS)
+
+    beat_task = asyncio.create_task(beat())
+    handling = set()
+    logging.info(f"Worker {index} started")
+    try:
+        while True:
+            payload = await asyncio.to_thread(updates.get)
+            if payload is None:
+                break
+            update = Update.model_validate(payload, context={'bot': bot})
+            # Updates are handled concurrently, like in polling mode
+            task = asyncio.create_task(dispatcher.feed_update(bot, update))
+            handling.add(task)
+            task.add_done_callback(handling.discard)
+        await asyncio.gather(*handling, return_exceptions=True)
+    finally:
+        beat_task.cancel()
+        await dispatcher.emit_shutdown(bot=bot)
+        await bot.session.close()
+        logging.info(f"Worker {index} stopped")
+
+
+def _worker_main(index: int, factory: WorkerFactory, updates: multiprocessing.Queue, heartbeat: Any) -> None:
+    """Entry point of a worker process"""
+    # Ctrl+C and a service manager's SIGTERM reach the whole process group;
+    # the front process stops the workers in order, letting them drain first
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(_run_worker(index, factory, updates, heartbeat))
+
+
+class WorkerPool:
+    """
+    Worker processes handling updates sharded by user ID.
+
+    The factory is called in every worker process and returns the
+    dispatcher with the bot's routers and the bot. It must be a module
+    level function, because worker processes are started with 'spawn'.
+    """
+
+    def __init__(self, factory: WorkerFactory, workers: int, queue_size: Optional[int] = None):
+        if workers < 1:
+            raise ValueError("At least one worker process is required")
+        self.factory = factory
+        self.workers = workers
+        self._context = multiprocessing.get_context('spawn')
+        self._queue_size = WORKER_QUEUE_SIZE if queue_size is None else queue_size
+        self._queues = [self._context.Queue(self._queue_size) for _ in range(workers)]
+        # Without a lock: a killed worker must not leave its heartbeat locked
+        self._heartbeats = [self._context.Value('d', 0.0, lock=False) for _ in range(workers)]
+        self._processes: List[Optional[Any]] = [None] * workers
+        self._supervisor: Optional[asyncio.Task] = None
+        self._restart_lock = asyncio.Lock()
+        self.routed = [0] * workers
+        self.dropped = [0] * workers
+        self.restarts = 0
+
+    def _spawn(self, index: int) -> None:
+        self._heartbeats[index].value = time.time()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, self.factory, self._queues[index], self._heartbeats[index]),
+            name=f"bot-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[index] = process
+
+    def _replace_queue(self, index: int) -> None:
+        """Give a worker that did not exit cleanly a new queue, moving over what can still be read"""
+        old_queue = self._queues[index]
+        self._queues[index] = self._context.Queue(self._queue_size)
+        moved = 0
+        while True:
+            try:
+                self._queues[index].put_nowait(old_queue.get_nowait())
+                moved += 1
+            except (queue.Empty, queue.Full, OSError):
+                break
+        try:
+            lost = old_queue.qsize()
+        except NotImplementedError:  # not available on macOS
+            lost = 0
+        old_queue.close()
+        old_queue.cancel_join_thread()
+        if lost:
+            logging.warning(f"Worker {index}: {lost} queued updates were lost")
+        elif moved:
+            logging.info(f"Worker {index}: {moved} queued updates moved to the new queue")
+
+    def start(self) -> None:
+        """Start all worker processes"""
+        for index in range(self.workers):
+            self._spawn(index)
+        logging.info(f"Started {self.workers} worker processes")
+
+    async def forward(self, handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]], update: Update,
+                      data: Dict[str, Any]) -> Any:
+        """Outer update middleware of the front dispatcher sending the update to its worker"""
+        user = data.get('event_from_user')
+        chat = data.get('event_chat')
+        key = user.id if user is not None else chat.id if chat is not None else update.update_id
+        index = worker_index(key, self.workers)
+        payload = update.model_dump(mode='json', by_alias=True, exclude_none=True)
+        try:
+            self._queues[index].put_nowait(payload)
+        except queue.Full:
+            # The worker is behind; wait for it up to WORKER_PUT_TIMEOUT_SECONDS, then drop the update
+            try:
+                await asyncio.to_thread(self._queues[index].put, payload, True, WORKER_PUT_TIMEOUT_SECONDS)
+            except queue.Full:
+                self.dropped[index] += 1
+                logging.error(f"Worker {index} queue is full for {WORKER_PUT_TIMEOUT_SECONDS}s, "
+                              f"update {update.update_id} dropped")
+                return True
+        self.routed[index] += 1
+        return True
+
+    def create_dispatcher(self) -> Dispatcher:
+        """
+        Build the dispatcher of the front process
+
+        Pass it to start_polling() or the webhook server; the worker
+        processes are started and stopped with it.
+
+        Returns:
+            Dispatcher: Dispatcher forwarding every update to a worker
+        """
+        dispatcher = Dispatcher(disable_fsm=True)
+        dispatcher.update.outer_middleware(self.forward)
+        dispatcher.startup.register(self._on_startup)
+        dispatcher.shutdown.register(self.stop)
+        return dispatcher
+
+    async def _on_startup(self) -> None:
+        self.start()
+        self._supervisor = asyncio.create_task(self.supervise())
+        # SIGHUP restarts the workers one by one, e.g. after a code update
+        if hasattr(signal, 'SIGHUP'):
+            try:
+                asyncio.get_running_loop().add_signal_handler(
+                    signal.SIGHUP, lambda: asyncio.create_task(self.restart_all()))
+            except (NotImplementedError, RuntimeError):
+                pass
+
+    def check_health(self) -> int:
+        """
+        Restart workers that have exited or stopped sending heartbeats
+
+        Returns:
+            int: Number of restarted workers
+        """
+        restarted = 0
+        now = time.time()
+        for index, process in enumerate(self._processes):
+            if process is None:
+                continue
+            if not process.is_alive():
+                logging.error(f"Worker {index} exited with code {process.exitcode}, restarting")
+            elif now - self._heartbeats[index].value > WORKER_HEARTBEAT_TIMEOUT_SECONDS:
+                logging.error(f"Worker {index} sent no heartbeat for {WORKER_HEARTBEAT_TIMEOUT_SECONDS}s, restarting")
+                process.kill()
+                process.join()
+            else:
+                continue
+            self._replace_queue(index)
+            self._spawn(index)
+            self.restarts += 1
+            restarted += 1
+        return restarted
+
+    async def supervise(self) -> None:
+        """Check the workers every WORKER_HEALTH_INTERVAL_SECONDS until cancelled"""
+        while True:
+            await asyncio.sleep(WORKER_HEALTH_INTERVAL_SECONDS)
+            async with self._restart_lock:
+                self.check_health()
+
+    async def _stop_worker(self, index: int) -> None:
+        """Let a worker finish the updates queued before the stop marker, then make sure it exited"""
+        process = self._processes[index]
+        if process is None:
+            return
+        await asyncio.to_thread(self._queues[index].put, None)
+        await asyncio.to_thread(process.join, WORKER_STOP_TIMEOUT_SECONDS)
+        if process.is_alive():
+            # Workers ignore SIGTERM, so a stuck one is killed
+            logging.warning(f"Worker {index} did not stop in {WORKER_STOP_TIMEOUT_SECONDS}s, killing")
+            process.kill()
+            await asyncio.to_thread(process.join)
+            self._replace_queue(index)
+        self._processes[index] = None
+
+    async def restart(self, index: int) -> None:
+        """
+        Gracefully restart one worker
+
+        Updates routed to it meanwhile wait in its queue and are handled
+        by the new process in order.
+
+        Args:
+            index (int): Worker number
+        """
+        async with self._restart_lock:
+            await self._stop_worker(index)
+            self._spawn(index)
+            self.restarts += 1
+            logging.info(f"Worker {index} restarted")
+
+    async def restart_all(self) -> None:
+        """Restart the workers one by one, the others keep handling updates"""
+        for index in range(self.workers):
+            await self.restart(index)
+
+    async def stop(self) -> None:
+        """Stop the supervisor and all workers after they finish queued updates"""
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            self._supervisor = None
+        async with self._restart_lock:
+            await asyncio.gather(*(self._stop_worker(index) for index in range(self.workers)))
+        logging.info("All worker processes stopped")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Collect worker metrics
+
+        Returns:
+            Dict[str, Any]: workers, alive workers, restarts, updates routed to and dropped
+            for each worker (its queue stayed full) and seconds since each worker's last heartbeat
+        """
+        now = time.time()
+        return {
+            'workers': self.workers,
+            'alive': sum(1 for process in self._processes if process is not None and process.is_alive()),
+            'restarts': self.restarts,
+            'routed': list(self.routed),
+            'dropped': list(self.dropped),
+            'heartbeat_age': [round(now - heartbeat.value, 1) for heartbeat in self._heartbeats],
+        }
@@ -1,19 +1,27 @@
 import asyncio
 import logging
-from datetime import datetime
 
 from aiogram import Bot, Dispatcher, types, Router
 from aiogram.filters import CommandStart, Command
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove, InlineKeyboardMarkup, \
     InlineKeyboardButton
-import aiosqlite
 from dotenv import load_dotenv
 import os
 import json
 
+from ai_service.admission import AdmissionController, PRIORITY_DIALOGUE, PRIORITY_NEW_SESSION, \
+    PRIORITY_RECOMMENDATIONS
+from ai_service.fsm_storage import create_fsm_storage
+from ai_service.mailbox import Mailbox
+from ai_service.outbox import Outbox, OUTBOX_GLOBAL_RATE
+from ai_service.prefetch import Prefetcher
+from ai_service.sessions import SessionStore, load_dialogue_session
+from ai_service.shutdown import DrainingStorage, install_graceful_shutdown
+from ai_service.webhook import run_webhook
+from ai_service.workers import WorkerPool
+
 # Загрузка переменных окружения из файла .env
 load_dotenv()
 
@@ -30,19 +38,31 @@ class UserStates(StatesGroup):
     feedback = State()
 
 
-# Словарь для хранения активных диалогов пользователей
-user_dialogues = {}
+# Ограничение одновременных запросов к AI (ADMISSION_MAX_IN_FLIGHT) и очереди ожидающих
+llm_admission = AdmissionController('llm')
+BUSY_MESSAGE = ("Сейчас ко мне обращается много людей, и я не успеваю ответить. "
+                "Пожалуйста, напишите мне еще раз через минуту.")
+
+
+# Исходящие сообщения с учетом ограничений Telegram на частоту отправки;
+# общий лимит бота делится между процессами-обработчиками
+outbox = Outbox(global_rate=OUTBOX_GLOBAL_RATE / max(1, int(os.getenv('BOT_WORKERS', '1'))))
+
+
+# Рекомендации книг, подготовленные заранее, пока пользователь не нажал кнопку
+book_prefetch = Prefetcher('book_recommendations')
+
+
+# Активные диалоги пользователей: ограничены по числу, объему памяти и времени простоя.
+# Вытесненная или потерянная при перезапуске сессия восстанавливается из последнего диалога в базе
+# (get_async читает базу в потоке, не останавливая обработку других пользователей).
+user_dialogues = SessionStore('user_dialogues', loader=load_dialogue_session)
 
 
 # Функция для сохранения пользователя в базе данных
+# (схема создается один раз при запуске в init_storage, запрос выполняется в пуле соединений)
 async def save_user(user_id, username):
-    async with aiosqlite.connect('users.db') as db:
-        await db.execute("CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, username TEXT, dialogs TEXT)")
-        await db.execute("CREATE TABLE IF NOT EXISTS feedback (id INTEGER PRIMARY KEY, user_id INTEGER, feedback TEXT, "
-                         "feedback_date DATETIME)")
-        await db.execute("INSERT OR REPLACE INTO users (id, username, dialogs) VALUES (?, ?, ?)",
-                         (user_id, username, ''))
-        await db.commit()
+    await asyncio.to_thread(storage.save_user, user_id, username)
     logger.info(f"Пользователь {username} сохранён в базе данных")
 
 
@@ -51,15 +71,19 @@ bot_token = os.getenv('BOT_TOKEN')
 if bot_token is None:
     raise ValueError("Токен бота не найден в переменных окружения")
 
-# Инициализация бота и диспетчера
+# Инициализация бота и диспетчера.
+# Состояния FSM хранятся в базе (или в Redis, см. FSM_STORAGE_URL) и переживают перезапуск;
+# при остановке диспетчер закрывает хранилище: DrainingStorage сначала дожидается текущих ходов диалога,
+# затем несохраненные изменения записываются
 bot = Bot(token=bot_token)
-dp = Dispatcher(storage=MemoryStorage())
+dp = Dispatcher(storage=DrainingStorage(create_fsm_storage()))
 
 # Создание роутера
 router = Router()
 
 # Импортируем функции из ai_service
 from ai_service import initialize_dialogue, get_llm_response, get_book_recommendations
+from ai_service import storage
 
 
 # Команда для начала взаимодействия с ботом
@@ -81,14 +105,14 @@ async def start(message: types.Message, state: FSMContext) -> None:
     )
 
     await state.set_state(UserStates.choosing_issue)
-    await message.answer("Выберите тему, которую хотите обсудить:",
-                         reply_markup=reply_keyboard)
+    await outbox.answer(message, "Выберите тему, которую хотите обсудить:",
+                        reply_markup=reply_keyboard)
 
 
 # Команда для предоставления помощи по использованию бота
 @router.message(Command(commands="help"))
 async def start(message: types.Message, state: FSMContext) -> None:
-    await message.answer("""Привет! Я бот психологической поддержки. Я здесь, чтобы помочь тебе выразить свои чувства и получить поддержку. Вот как со мной можно взаимодействовать:
+    await outbox.answer(message, """Привет! Я бот психологической поддержки. Я здесь, чтобы помочь тебе выразить свои чувства и получить поддержку. Вот как со мной можно взаимодействовать:
 /start — команда для начала работы с ботом. После её ввода ты начнешь диалог с психологом.
 /help — команда, которую ты сейчас используешь, чтобы получить справочную информацию о работе бота и список команд.
 /feedback — если у тебя есть какие-либо вопросы, пожелания или ты хочешь поделиться своим опытом работы с ботом, используй эту команду, чтобы отправить мне сообщение.
@@ -98,7 +122,8 @@ async def start(message: types.Message, state: FSMContext) -> None:
 # Обработчик команды /feedback
 @router.message(Command(commands="feedback"))
 async def feedback(message: types.Message, state: FSMContext):
-    await message.answer(
+    await outbox.answer(
+        message,
         "Спасибо за ваш интерес к улучшению бота! Пожалуйста, оставьте свои пожелания или комментарии:",
         reply_markup=types.ReplyKeyboardRemove())
     await state.set_state(UserStates.feedback)
@@ -109,14 +134,10 @@ async def feedback(message: types.Message, state: FSMContext):
 async def handle_feedback(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
     feedback_text = message.text
-    feedback_date = datetime.now()
 
-    async with aiosqlite.connect('users.db') as db:
-        await db.execute("INSERT INTO feedback (user_id, feedback, feedback_date) VALUES (?, ?, ?)",
-                         (user_id, feedback_text, feedback_date))
-        await db.commit()
+    await asyncio.to_thread(storage.save_feedback, user_id, feedback_text)
 
-    await message.answer("Спасибо за вашу обратную связь! Мы ценим ваше мнение и будем работать над улучшением бота.")
+    await outbox.answer(message, "Спасибо за вашу обратную связь! Мы ценим ваше мнение и будем работать над улучшением бота.")
     await state.clear()
 
 
@@ -153,39 +174,56 @@ async def choose_issue(message: types.Message, state: FSMContext):
             initial_message = prompts[issue_id]["initial_message"]
 
             await state.set_state(UserStates.in_dialogue)
-            await message.answer(initial_message, reply_markup=ReplyKeyboardRemove())
+            await outbox.answer(message, initial_message, reply_markup=ReplyKeyboardRemove())
 
         except Exception as e:
             logger.error(f"Ошибка инициализации диалога: {e}")
-            await message.answer("Произошла ошибка. Попробуйте начать заново с команды /start")
+            await outbox.answer(message, "Произошла ошибка. Попробуйте начать заново с команды /start")
             await state.clear()
     else:
-        await message.answer("Пожалуйста, выберите один из предложенных вариантов.")
+        await outbox.answer(message, "Пожалуйста, выберите один из предложенных вариантов.")
 
 
 # Обработчик диалога с AI
 @router.message(UserStates.in_dialogue)
 async def handle_dialogue(message: types.Message, state: FSMContext):
-    user_id = str(message.from_user.id)
-    user_text = message.text
+    # Ходы диалога пользователя выполняются по одному; сообщения, пришедшие во время хода,
+    # попадают в историю вместе и получают один общий ответ AI
+    await dialogue_mailbox.submit(str(message.from_user.id), (message, state))
+
 
-    if user_id not in user_dialogues:
-        await message.answer("Сессия завершена. Начните заново с команды /start")
+# Один ход диалога: сообщения пользователя (одно или несколько, пришедших подряд) и ответ AI
+async def process_dialogue_turn(user_id: str, updates: list):
+    message, state = updates[-1]
+
+    # Сессия восстанавливается из базы; None - у пользователя нет недавнего диалога
+    dialogue_info = await user_dialogues.get_async(user_id)
+    if dialogue_info is None:
+        await outbox.answer(message, "Сессия завершена. Начните заново с команды /start")
         await state.clear()
         return
 
-    dialogue_info = user_dialogues[user_id]
     issue_id = dialogue_info['issue_id']
+    user_messages_before = len([msg for msg in dialogue_info['messages'] if msg['role'] == 'user'])
 
-    # Добавляем сообщение пользователя в историю
-    dialogue_info['messages'].append({
-        "role": "user",
-        "content": user_text
-    })
-
-    logger.info(f"Пользователь {user_id} сказал: {user_text}")
+    # При перегрузке продолжающиеся диалоги обслуживаются раньше новых, а не дождавшийся
+    # своей очереди пользователь сразу получает ответ "занят"; сообщения в историю не попадают
+    priority = PRIORITY_DIALOGUE if user_messages_before else PRIORITY_NEW_SESSION
+    if not await llm_admission.acquire(priority):
+        await outbox.answer(message, BUSY_MESSAGE)
+        return
 
     try:
+        # Добавляем сообщения пользователя в историю
+        for user_message, _ in updates:
+            dialogue_info['messages'].append({
+                "role": "user",
+                "content": user_message.text
+            })
+            logger.info(f"Пользователь {user_id} сказал: {user_message.text}")
+        # Диалог продвинулся: подготовленные рекомендации больше не соответствуют ему
+        book_prefetch.invalidate(user_id)
+
         # Получаем ответ от AI
         # Формируем полную историю диалога (ограничиваем контекст для стабильности)
         with open('telegram_bot/ai_service/system_prompts.json', 'r', encoding='utf-8') as f:
@@ -200,7 +238,9 @@ async def handle_dialogue(message: types.Message, state: FSMContext):
                             {"role": "assistant", "content": prompts[issue_id]["initial_message"]}
                         ] + recent_messages
 
-        ai_response = get_llm_response(full_messages, user_id, issue_id)
+        # Запрос к AI выполняется в потоке контроля нагрузки (по потоку на место),
+        # чтобы не останавливать обработку других пользователей
+        ai_response = await llm_admission.run(get_llm_response, full_messages, user_id, issue_id)
 
         # Усиленная проверка корректности ответа от AI
         if (not ai_response or
@@ -236,32 +276,71 @@ async def handle_dialogue(message: types.Message, state: FSMContext):
             "content": ai_response
         })
 
-        await message.answer(ai_response)
-
         # Если AI сам предложил книги в ответе, добавляем кнопку
+        books_offer = None
         books_trigger_phrases = ["могу порекомендовать", "есть отличные книги", "полезные книги", "книги по этой теме"]
         if any(phrase in ai_response.lower() for phrase in books_trigger_phrases):
-            inline_kb = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="📚 Да, покажите рекомендации", callback_data=f"books_{user_id}")]
-            ])
-            await message.answer("Хотите получить персональные рекомендации?", reply_markup=inline_kb)
+            books_offer = ("Хотите получить персональные рекомендации?", "📚 Да, покажите рекомендации")
 
         # Предлагаем кнопку с рекомендациями после 3-4 сообщений (когда пользователь уже рассказал о проблеме)  
         else:
             user_messages_count = len([msg for msg in dialogue_info['messages'] if msg['role'] == 'user'])
 
-            if user_messages_count == 3:  # После 3-го сообщения пользователя
-                inline_kb = InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="📚 Получить рекомендации книг", callback_data=f"books_{user_id}")]
-                ])
-                await message.answer(
-                    "💡 Кстати, если хотите, я могу подобрать для вас полезные книги и ресурсы по вашей теме",
-                    reply_markup=inline_kb)
+            # После 3-го сообщения пользователя (объединенные сообщения могут перешагнуть через него)
+            if user_messages_before < 3 <= user_messages_count:
+                books_offer = ("💡 Кстати, если хотите, я могу подобрать для вас полезные книги и ресурсы по вашей теме",
+                               "📚 Получить рекомендации книг")
+
+        # Предложение с кнопкой отправляется в одном сообщении с ответом AI
+        # (длинный ответ делится на части, кнопка остается у последней)
+        if books_offer is None:
+            await outbox.answer(message, ai_response)
+        else:
+            offer_text, button_text = books_offer
+            inline_kb = InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text=button_text, callback_data=f"books_{user_id}")]
+            ])
+            # Рекомендации начинают готовиться сразу, чтобы ответ на кнопку был мгновенным
+            book_prefetch.start(user_id, dialogue_version(dialogue_info), prefetch_book_recommendations,
+                                user_id, dialogue_info['dialogue_id'], issue_id, list(dialogue_info['messages']))
+            await outbox.answer(message, f"{ai_response}\n\n{offer_text}", reply_markup=inline_kb)
 
     except Exception as e:
         logger.error(f"Ошибка получения ответа от AI: {e}")
-        await message.answer(
+        await outbox.answer(
+            message,
             "Извините, произошла техническая ошибка. Я психолог-бот и хочу вам помочь. Можете повторить ваш вопрос или попробовать начать заново с /start")
+    finally:
+        llm_admission.release()
+
+
+dialogue_mailbox = Mailbox('dialogue', process_dialogue_turn)
+
+
+# Версия диалога для подготовленных рекомендаций: меняется с каждым новым сообщением
+def dialogue_version(dialogue_info):
+    return dialogue_info['dialogue_id'], len(dialogue_info['messages'])
+
+
+# Полная история диалога для подбора рекомендаций
+def recommendation_messages(issue_id, messages):
+    with open('telegram_bot/ai_service/system_prompts.json', 'r', encoding='utf-8') as f:
+        prompts = json.load(f)
+
+    return [
+               {"role": "system", "content": prompts[issue_id]["system_prompt"]},
+               {"role": "assistant", "content": prompts[issue_id]["initial_message"]}
+           ] + messages
+
+
+# Подготовка рекомендаций в фоне; None - при перегрузке (рекомендации подберутся по нажатию кнопки).
+# В базу рекомендации записываются только когда показаны пользователю
+async def prefetch_book_recommendations(user_id, dialogue_id, issue_id, messages):
+    async with llm_admission.slot(PRIORITY_RECOMMENDATIONS) as admitted:
+        if not admitted:
+            return None
+        return await llm_admission.run(get_book_recommendations, dialogue_id, user_id, issue_id,
+                                       recommendation_messages(issue_id, messages), False)
 
 
 # Обработчик inline кнопки для рекомендаций книг
@@ -272,30 +351,43 @@ async def handle_books_callback(callback: types.CallbackQuery):
     user_id = callback.data.split('_')[1]
 
     # Проверяем, есть ли активный диалог
-    if user_id not in user_dialogues:
-        await callback.message.answer("Сессия завершена. Начните заново с команды /start")
+    dialogue_info = await user_dialogues.get_async(user_id)
+    if dialogue_info is None:
+        await outbox.answer(callback.message, "Сессия завершена. Начните заново с команды /start")
         return
 
-    dialogue_info = user_dialogues[user_id]
     issue_id = dialogue_info['issue_id']
 
     try:
-        # Формируем полную историю диалога для рекомендаций
-        with open('telegram_bot/ai_service/system_prompts.json', 'r', encoding='utf-8') as f:
-            prompts = json.load(f)
-
-        full_messages = [
-                            {"role": "system", "content": prompts[issue_id]["system_prompt"]},
-                            {"role": "assistant", "content": prompts[issue_id]["initial_message"]}
-                        ] + dialogue_info['messages']
-
-        # Получаем рекомендации
-        recommendations = get_book_recommendations(
-            dialogue_info['dialogue_id'],
-            user_id,
-            issue_id,
-            full_messages
-        )
+        # Обычно рекомендации уже подготовлены в фоне для текущей версии диалога
+        recommendations = None
+        prefetched = book_prefetch.take(user_id, dialogue_version(dialogue_info))
+        if prefetched is not None:
+            # Ошибка фонового расчета не должна мешать расчету по кнопке
+            try:
+                recommendations = await prefetched
+            except Exception as e:
+                logger.warning(f"Подготовленные рекомендации недоступны, считаем заново: {e}")
+                recommendations = None
+        if recommendations and (recommendations.get("books") or recommendations.get("resources")):
+            await asyncio.to_thread(storage.log_book_recommendations, user_id, issue_id, recommendations,
+                                    dialogue_info['dialogue_id'])
+        else:
+            # Формируем полную историю диалога для рекомендаций
+            full_messages = recommendation_messages(issue_id, dialogue_info['messages'])
+
+            # Получаем рекомендации; при перегрузке они уступают место диалогам
+            async with llm_admission.slot(PRIORITY_RECOMMENDATIONS) as admitted:
+                if not admitted:
+                    await outbox.answer(callback.message, BUSY_MESSAGE)
+                    return
+                recommendations = await llm_admission.run(
+                    get_book_recommendations,
+                    dialogue_info['dialogue_id'],
+                    user_id,
+                    issue_id,
+                    full_messages
+                )
 
         # Проверяем, что рекомендации не пустые
         if recommendations and (recommendations.get("books") or recommendations.get("resources")):
@@ -304,13 +396,14 @@ async def handle_books_callback(callback: types.CallbackQuery):
 
             # Проверяем, что форматированные рекомендации не пустые
             if len(formatted_recs.strip()) > 50:
-                await callback.message.answer(f"📚 Персональные рекомендации для вас:\n\n{formatted_recs}")
+                await outbox.answer(callback.message, f"📚 Персональные рекомендации для вас:\n\n{formatted_recs}")
             else:
                 # Предлагаем повторить попытку
                 retry_kb = InlineKeyboardMarkup(inline_keyboard=[
                     [InlineKeyboardButton(text="🔄 Попробовать еще раз", callback_data=f"books_{user_id}")]
                 ])
-                await callback.message.answer(
+                await outbox.answer(
+                    callback.message,
                     "К сожалению, не удалось сформировать рекомендации. Это может быть временная проблема с сервисом попробуйте чуть позже",
                     reply_markup=retry_kb)
         else:
@@ -318,18 +411,49 @@ async def handle_books_callback(callback: types.CallbackQuery):
             retry_kb = InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(text="🔄 Попробовать еще раз", callback_data=f"books_{user_id}")]
             ])
-            await callback.message.answer(
+            await outbox.answer(
+                callback.message,
                 "К сожалению, не удалось получить рекомендации. Это может быть временная проблема с AI сервисом.",
                 reply_markup=retry_kb)
 
     except Exception as e:
         logger.error(f"Ошибка получения рекомендаций по кнопке: {e}")
-        await callback.message.answer("Извините, произошла ошибка при получении рекомендаций.")
+        await outbox.answer(callback.message, "Извините, произошла ошибка при получении рекомендаций.")
 
 
-async def main():
+# Подготовка диспетчера с обработчиками бота; вызывается в основном процессе
+# или в каждом процессе-обработчике, если их несколько
+def setup_dispatcher():
+    storage.init_storage()
     dp.include_router(router)
-    await dp.start_polling(bot, skip_updates=True)
+    # При остановке диспетчер дожидается текущих ходов диалога (до SHUTDOWN_TIMEOUT_SECONDS),
+    # затем записывает состояния FSM и закрывает пул соединений с базой
+    install_graceful_shutdown(dp)
+    return dp, bot
+
+
+async def main():
+    # С BOT_WORKERS > 1 этот процесс только принимает обновления и распределяет их
+    # по процессам-обработчикам по user_id; сессии пользователя живут в его процессе
+    worker_count = int(os.getenv('BOT_WORKERS', '1'))
+    if worker_count > 1:
+        front_dp = WorkerPool(setup_dispatcher, worker_count).create_dispatcher()
+    else:
+        front_dp, _ = setup_dispatcher()
+
+    # Типы обновлений берутся из обработчиков бота: у диспетчера процесса приема их нет
+    allowed_updates = router.resolve_used_update_types()
+
+    # С WEBHOOK_URL обновления принимает встроенный aiohttp-сервер, иначе - long polling
+    webhook_url = os.getenv('WEBHOOK_URL')
+    if webhook_url:
+        await run_webhook(front_dp, bot, webhook_url,
+                          secret_token=os.getenv('WEBHOOK_SECRET'),
+                          host=os.getenv('WEBHOOK_HOST', '0.0.0.0'),
+                          port=int(os.getenv('WEBHOOK_PORT', '8080')),
+                          allowed_updates=allowed_updates)
+    else:
+        await front_dp.start_polling(bot, skip_updates=True, allowed_updates=allowed_updates)
 
 
 if __name__ == '__main__':
@@ -19,6 +19,7 @@ sys.path.append(BASE_DIR)
 from telegram_bot.test.load_tests.test_concurrent_dialogs import ConcurrentDialogsTest
 from telegram_bot.test.load_tests.test_response_time import ResponseTimeTest
 from telegram_bot.test.load_tests.test_long_dialogs import LongDialogsTest
+from telegram_bot.test.load_tests.test_storage_benchmark import StorageBenchmarkTest
 
 # Настройка логирования
 os.makedirs(os.path.join(TEST_DIR, "result_tests"), exist_ok=True)
@@ -112,6 +113,34 @@ async def run_long_dialogs_test(args: argparse.Namespace) -> Dict[str, Any]:
     logger.info(f"Long dialogs test completed. Results saved to {test.results.result_dir}")
     return results
 
+async def run_storage_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Запускает бенчмарк слоя хранения с заданными параметрами
+    
+    Args:
+        args: Аргументы командной строки
+        
+    Returns:
+        Результаты теста
+    """
+    logger.info("Starting storage benchmark")
+    
+    params = {
+        "inserts_per_length": args.storage_inserts,
+        "writer_counts": args.storage_writers,
+        "inserts_per_writer": args.storage_inserts,
+        "table_sizes": args.storage_table_sizes,
+        "read_samples": args.storage_reads,
+        "shard_counts": args.storage_shards,
+        "mongodb_url": args.storage_mongodb_url
+    }
+    
+    test = StorageBenchmarkTest(**params)
+    results = await test.run()
+    
+    logger.info(f"Storage benchmark completed. Results saved to {test.results.result_dir}")
+    return results
+
 async def run_all_tests(args: argparse.Namespace) -> List[Dict[str, Any]]:
     """
     Запускает все выбранные тесты последовательно
@@ -139,6 +168,9 @@ async def run_all_tests(args: argparse.Namespace) -> List[Dict[str, Any]]:
     if args.all or args.long:
         tests_to_run.append(("long_dialogs", run_long_dialogs_test))
     
+    if args.all or args.storage:
+        tests_to_run.append(("storage_benchmark", run_storage_benchmark))
+    
     # Запускаем тесты последовательно
     for test_name, test_func in tests_to_run:
         print(f"\n=== Запуск теста: {test_name} ===")
@@ -197,6 +229,7 @@ def parse_args() -> argparse.Namespace:
     test_group.add_argument("--concurrent", action="store_true", help="Запустить тест одновременных диалогов")
     test_group.add_argument("--response", action="store_true", help="Запустить тест времени отклика")
     test_group.add_argument("--long", action="store_true", help="Запустить тест длительных диалогов")
+    test_group.add_argument("--storage", action="store_true", help="Запустить бенчмарк слоя хранения")
     
     # Аргументы для теста одновременных диалогов
     concurrent_group = parser.add_argument_group("Параметры теста одновременных диалогов")
@@ -220,6 +253,15 @@ def parse_args() -> argparse.Namespace:
     long_group.add_argument("--long-delay", type=float, default=0.5, help="Задержка между сообщениями (секунды)")
     long_group.add_argument("--long-save-full", action="store_true", help="Сохранять полные тексты диалогов")
     
+    # Аргументы для бенчмарка слоя хранения
+    storage_group = parser.add_argument_group("Параметры бенчмарка слоя хранения")
+    storage_group.add_argument("--storage-inserts", type=int, default=200, help="Количество записей в каждом замере записи")
+    storage_group.add_argument("--storage-writers", type=int, nargs="+", default=[1, 4, 8], help="Количества одновременных писателей")
+    storage_group.add_argument("--storage-table-sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Размеры таблицы диалогов для замера чтения")
+    storage_group.add_argument("--storage-reads", type=int, default=200, help="Количество чтений в каждом замере")
+    storage_group.add_argument("--storage-shards", type=int, nargs="+", default=[1, 2, 4], help="Количества шардов для замера записи")
+    storage_group.add_argument("--storage-mongodb-url", default=os.getenv("STORAGE_BENCHMARK_MONGODB_URL"), help="URL MongoDB для сравнения бэкендов")
+    
     # Общие аргументы
     general_group = parser.add_argument_group("Общие параметры")
     general_group.add_argument("--no-visualize", action="store_true", help="Отключить автоматическую визуализацию результатов")
@@ -227,7 +269,7 @@ def parse_args() -> argparse.Namespace:
     args = parser.parse_args()
     
     # Если не выбрано ни одного теста, запускаем все
-    if not (args.all or args.concurrent or args.response or args.long):
+    if not (args.all or args.concurrent or args.response or args.long or args.storage):
         args.all = True
     
     return args
@@ -0,0 +1,80 @@
+import sys
+import os
+import random
+import argparse
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterator
+
+# Определяем пути
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Добавляем корневую директорию проекта в путь для импорта
+sys.path.append(BASE_DIR)
+
+# Импортируем утилиты для тестирования
+from telegram_bot.test.load_tests.utils import generate_mock_dialog_messages
+
+# Импортируем модули AI-сервиса
+from telegram_bot.ai_service import database
+from telegram_bot.ai_service.bulk_load import bulk_load_dialogues
+
+# Настройка логирования
+logger = logging.getLogger("seed_database")
+
+SYSTEM_PROMPT = {"role": "system", "content": "Ты - опытный психолог-консультант. Будь эмпатичным и профессиональным."}
+
+
+def generate_synthetic_dialogues(count: int, users: int, days: int, max_messages: int) -> Iterator[Dict]:
+    """
+    Генерирует синтетические диалоги для заполнения базы
+
+    Args:
+        count: Количество диалогов
+        users: Количество разных пользователей
+        days: За сколько последних дней распределить диалоги
+        max_messages: Максимальное количество пар сообщений в диалоге
+
+    Yields:
+        Записи в формате bulk_load_dialogues
+    """
+    now = datetime.utcnow()
+    for _ in range(count):
+        issue_id = random.choice(["1", "2", "3"])
+        timestamp = now - timedelta(seconds=random.randint(0, days * 24 * 3600))
+        yield {
+            "user_id": f"seed_user_{random.randint(1, users)}",
+            "issue_id": issue_id,
+            "timestamp": timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            "dialogue_json": [SYSTEM_PROMPT] + generate_mock_dialog_messages(issue_id, random.randint(1, max_messages))
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заполнение базы диалогов синтетическими данными")
+    parser.add_argument("--dialogues", type=int, default=100000, help="Количество диалогов")
+    parser.add_argument("--users", type=int, default=10000, help="Количество пользователей")
+    parser.add_argument("--days", type=int, default=180, help="Период в днях, за который распределяются диалоги")
+    parser.add_argument("--max-messages", type=int, default=10, help="Максимум пар сообщений в диалоге")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Диалогов в одной транзакции")
+    parser.add_argument("--database", default=database.DATABASE_PATH, help="Путь к файлу базы")
+    parser.add_argument("--compress", action="store_true", help="Сжимать JSON-колонки")
+    parser.add_argument("--no-search-index", action="store_true", help="Не заполнять полнотекстовый индекс")
+    parser.add_argument("--seed", type=int, help="Начальное значение генератора случайных чисел")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+    if args.seed is not None:
+        random.seed(args.seed)
+    database.DATABASE_PATH = args.database
+    database.COMPRESSION_ENABLED = args.compress
+
+    logger.info(f"Seeding {args.database} with {args.dialogues} dialogues")
+    records = generate_synthetic_dialogues(args.dialogues, args.users, args.days, args.max_messages)
+    loaded = bulk_load_dialogues(records, args.batch_size, index_text=not args.no_search_index)
+    logger.info(f"Seeded {loaded} dialogues")
+
+
+if __name__ == "__main__":
+    main()
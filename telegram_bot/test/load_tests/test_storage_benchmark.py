@@ -0,0 +1,336 @@
+import sys
+import os
+import asyncio
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import logging
+from typing import List, Dict, Any, Optional, Sequence
+
+# Определяем пути
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Добавляем корневую директорию проекта в путь для импорта
+sys.path.append(BASE_DIR)
+
+# Импортируем утилиты для тестирования
+from telegram_bot.test.load_tests.utils import TestResults, calculate_percentile, generate_mock_dialog_messages
+
+# Импортируем модули AI-сервиса
+from telegram_bot.ai_service import database, sharding
+from telegram_bot.ai_service.bulk_load import bulk_load_dialogues
+from telegram_bot.ai_service.backends import SQLiteBackend
+
+# Настройка логирования
+logger = logging.getLogger("storage_benchmark")
+
+# Профили PRAGMA: режим журнала и уровень synchronous для соединений пула
+PRAGMA_PROFILES = {
+    "delete_full": {"journal_mode": "DELETE", "synchronous": "FULL"},
+    "wal_full": {"journal_mode": "WAL", "synchronous": "FULL"},
+    "wal_normal": {"journal_mode": "WAL", "synchronous": "NORMAL"},
+}
+
+
+def summarize(times: List[float]) -> Dict[str, float]:
+    """Сводка по списку времен в миллисекундах"""
+    return {
+        "count": len(times),
+        "avg_ms": round(sum(times) / len(times) if times else 0, 3),
+        "p50_ms": round(calculate_percentile(times, 50), 3),
+        "p95_ms": round(calculate_percentile(times, 95), 3),
+        "p99_ms": round(calculate_percentile(times, 99), 3),
+    }
+
+
+class StorageBenchmarkTest:
+    """
+    Бенчмарк слоя хранения ai_service.database без обращений к LLM
+    """
+
+    def __init__(
+        self,
+        dialogue_lengths: Sequence[int] = (2, 10, 50),
+        inserts_per_length: int = 200,
+        writer_counts: Sequence[int] = (1, 4, 8),
+        inserts_per_writer: int = 100,
+        contention_busy_timeout_ms: int = 50,
+        table_sizes: Sequence[int] = (1000, 10000, 100000),
+        read_samples: int = 200,
+        pragma_profiles: Sequence[str] = tuple(PRAGMA_PROFILES),
+        shard_counts: Sequence[int] = (1, 2, 4),
+        mongodb_url: Optional[str] = None
+    ):
+        """
+        Инициализация теста
+
+        Args:
+            dialogue_lengths: Количество пар сообщений в диалоге для теста скорости записи
+            inserts_per_length: Количество записей для каждой длины диалога
+            writer_counts: Количества одновременных потоков-писателей
+            inserts_per_writer: Количество записей каждого писателя
+            contention_busy_timeout_ms: busy_timeout в тесте конкуренции, чтобы проявились ошибки блокировки
+            table_sizes: Размеры таблицы dialogues для теста чтения
+            read_samples: Количество чтений для каждого размера таблицы
+            pragma_profiles: Сравниваемые профили из PRAGMA_PROFILES
+            shard_counts: Количества шардов для замера записи (писателей - максимум из writer_counts)
+            mongodb_url: URL MongoDB для сравнения бэкендов (без него сравнивается только SQLite)
+        """
+        self.dialogue_lengths = dialogue_lengths
+        self.inserts_per_length = inserts_per_length
+        self.writer_counts = writer_counts
+        self.inserts_per_writer = inserts_per_writer
+        self.contention_busy_timeout_ms = contention_busy_timeout_ms
+        self.table_sizes = table_sizes
+        self.read_samples = read_samples
+        self.pragma_profiles = pragma_profiles
+        self.shard_counts = shard_counts
+        self.mongodb_url = mongodb_url
+
+        # Инициализируем хранилище результатов
+        self.results = TestResults("storage_benchmark")
+        self.results.set_test_data("dialogue_lengths", list(dialogue_lengths))
+        self.results.set_test_data("inserts_per_length", inserts_per_length)
+        self.results.set_test_data("writer_counts", list(writer_counts))
+        self.results.set_test_data("inserts_per_writer", inserts_per_writer)
+        self.results.set_test_data("table_sizes", list(table_sizes))
+        self.results.set_test_data("read_samples", read_samples)
+        self.results.set_test_data("pragma_profiles", {name: PRAGMA_PROFILES[name] for name in pragma_profiles})
+        self.results.set_test_data("shard_counts", list(shard_counts))
+
+        self.work_dir = None
+        self.original_settings = None
+
+    def use_database(self, name: str, journal_mode: str = "WAL", synchronous: Optional[str] = None,
+                     busy_timeout_ms: Optional[int] = None):
+        """Переключает модуль database на новый файл во временной директории"""
+        database.close_pool()
+        database.DATABASE_PATH = os.path.join(self.work_dir, f"{name}.db")
+        database.JOURNAL_MODE = journal_mode
+        database.SYNCHRONOUS = synchronous
+        database.BUSY_TIMEOUT_MS = busy_timeout_ms or self.original_settings["BUSY_TIMEOUT_MS"]
+        database.init_db()
+
+    def timed_insert(self, user_id: str, issue_id: str, dialogue: List[Dict[str, str]]) -> Optional[float]:
+        """Записывает диалог и возвращает время записи в миллисекундах или None при ошибке"""
+        start = time.perf_counter()
+        try:
+            database.log_dialogue(user_id, issue_id, dialogue)
+        except sqlite3.OperationalError as e:
+            self.results.add_error(f"Insert failed: {str(e)}")
+            return None
+        elapsed = (time.perf_counter() - start) * 1000
+        self.results.add_response_time(elapsed)
+        return elapsed
+
+    def run_insert_throughput(self) -> List[Dict[str, Any]]:
+        """Скорость записи в зависимости от длины диалога"""
+        rows = []
+        for length in self.dialogue_lengths:
+            self.use_database(f"insert_{length}")
+            dialogues = [generate_mock_dialog_messages(str(i % 3 + 1), length) for i in range(self.inserts_per_length)]
+            times = []
+            start = time.perf_counter()
+            for i, dialogue in enumerate(dialogues):
+                elapsed = self.timed_insert(f"bench_user_{i % 50}", str(i % 3 + 1), dialogue)
+                if elapsed is not None:
+                    times.append(elapsed)
+            duration = time.perf_counter() - start
+            row = {"message_pairs": length, "inserts_per_second": round(len(times) / duration, 1), **summarize(times)}
+            logger.info(f"Insert throughput for {length} message pairs: {row['inserts_per_second']} inserts/s")
+            rows.append(row)
+        return rows
+
+    def run_concurrent_writers(self, writers: int) -> Dict[str, Any]:
+        """Запись из нескольких потоков в текущую базу, у каждого писателя свои пользователи"""
+        times: List[float] = []
+        failures = [0]
+        lock = threading.Lock()
+
+        def writer(writer_id: int):
+            for i in range(self.inserts_per_writer):
+                dialogue = generate_mock_dialog_messages(str(i % 3 + 1), 5)
+                elapsed = self.timed_insert(f"writer_{writer_id}_{i % 10}", str(i % 3 + 1), dialogue)
+                with lock:
+                    if elapsed is None:
+                        failures[0] += 1
+                    else:
+                        times.append(elapsed)
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - start
+
+        attempts = writers * self.inserts_per_writer
+        return {
+            "writers": writers,
+            "inserts_per_second": round(len(times) / duration, 1),
+            "locked_errors": failures[0],
+            "locked_rate": round(failures[0] / attempts, 4),
+            **summarize(times)
+        }
+
+    def run_writer_contention(self) -> List[Dict[str, Any]]:
+        """Конкуренция одновременных писателей и доля ошибок 'database is locked'"""
+        rows = []
+        for writers in self.writer_counts:
+            self.use_database(f"contention_{writers}", busy_timeout_ms=self.contention_busy_timeout_ms)
+            row = self.run_concurrent_writers(writers)
+            logger.info(f"{writers} writers: {row['inserts_per_second']} inserts/s, locked rate {row['locked_rate']}")
+            rows.append(row)
+        return rows
+
+    def run_sharded_writes(self) -> List[Dict[str, Any]]:
+        """Скорость одновременной записи в зависимости от количества шардов"""
+        rows = []
+        writers = max(self.writer_counts)
+        for shards in self.shard_counts:
+            self.use_database(f"sharded_{shards}")
+            sharding.SHARD_COUNT = shards
+            try:
+                row = {"shards": shards, **self.run_concurrent_writers(writers)}
+            finally:
+                sharding.SHARD_COUNT = self.original_shard_count
+            logger.info(f"{shards} shards, {writers} writers: {row['inserts_per_second']} inserts/s")
+            rows.append(row)
+        return rows
+
+    def run_read_latency(self) -> List[Dict[str, Any]]:
+        """Задержка чтения диалогов пользователя в зависимости от размера таблицы"""
+        rows = []
+        for size in self.table_sizes:
+            self.use_database(f"read_{size}")
+            users = max(1, size // 20)
+            records = ({
+                "user_id": f"bench_user_{random.randint(1, users)}",
+                "issue_id": str(i % 3 + 1),
+                "timestamp": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d} {i % 24:02d}:00:00",
+                "dialogue_json": generate_mock_dialog_messages(str(i % 3 + 1), 5)
+            } for i in range(size))
+            bulk_load_dialogues(records)
+
+            page_times, full_times = [], []
+            for _ in range(self.read_samples):
+                user_id = f"bench_user_{random.randint(1, users)}"
+                start = time.perf_counter()
+                database.get_user_dialogues_page(user_id, limit=20)
+                page_times.append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                database.get_user_dialogues(user_id)
+                full_times.append((time.perf_counter() - start) * 1000)
+            self.results.response_times.extend(page_times)
+
+            row = {"table_size": size, "page": summarize(page_times), "all_user_dialogues": summarize(full_times)}
+            logger.info(f"Read latency at {size} rows: page p95 {row['page']['p95_ms']} ms")
+            rows.append(row)
+        return rows
+
+    def run_pragma_profiles(self) -> List[Dict[str, Any]]:
+        """Сравнение профилей PRAGMA на записи и чтении"""
+        rows = []
+        for name in self.pragma_profiles:
+            profile = PRAGMA_PROFILES[name]
+            self.use_database(f"pragma_{name}", profile["journal_mode"], profile["synchronous"])
+            insert_times = []
+            start = time.perf_counter()
+            for i in range(self.inserts_per_length):
+                elapsed = self.timed_insert(f"bench_user_{i % 20}", str(i % 3 + 1),
+                                            generate_mock_dialog_messages(str(i % 3 + 1), 5))
+                if elapsed is not None:
+                    insert_times.append(elapsed)
+            duration = time.perf_counter() - start
+            read_times = []
+            for i in range(self.read_samples):
+                start_read = time.perf_counter()
+                database.get_user_dialogues_page(f"bench_user_{i % 20}", limit=20)
+                read_times.append((time.perf_counter() - start_read) * 1000)
+
+            row = {"profile": name, **profile, "inserts_per_second": round(len(insert_times) / duration, 1),
+                   "insert": summarize(insert_times), "read": summarize(read_times)}
+            logger.info(f"Profile {name}: {row['inserts_per_second']} inserts/s")
+            rows.append(row)
+        return rows
+
+    async def benchmark_backend(self, name: str, backend) -> Dict[str, Any]:
+        """Запись и чтение через асинхронный интерфейс бэкенда"""
+        await backend.init()
+        insert_times, read_times = [], []
+        try:
+            for i in range(self.inserts_per_length):
+                start = time.perf_counter()
+                await backend.log_dialogue(f"bench_user_{i % 20}", str(i % 3 + 1),
+                                           generate_mock_dialog_messages(str(i % 3 + 1), 5))
+                insert_times.append((time.perf_counter() - start) * 1000)
+            for i in range(self.read_samples):
+                start = time.perf_counter()
+                await backend.get_user_dialogues(f"bench_user_{i % 20}", limit=20)
+                read_times.append((time.perf_counter() - start) * 1000)
+        finally:
+            await backend.close()
+        return {"backend": name, "insert": summarize(insert_times), "read": summarize(read_times)}
+
+    async def run_backends(self) -> List[Dict[str, Any]]:
+        """Сравнение бэкендов хранения"""
+        self.use_database("backend_sqlite")
+        rows = [await self.benchmark_backend("sqlite", SQLiteBackend())]
+        if self.mongodb_url:
+            from telegram_bot.ai_service.backends.mongo import MongoBackend
+            backend = MongoBackend(self.mongodb_url, database_name=f"storage_benchmark_{self.results.timestamp}")
+            try:
+                rows.append(await self.benchmark_backend("mongodb", backend))
+            finally:
+                client = MongoBackend(self.mongodb_url).client
+                await client.drop_database(f"storage_benchmark_{self.results.timestamp}")
+                client.close()
+        else:
+            logger.info("MongoDB URL is not set, backend comparison covers SQLite only")
+        return rows
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Запускает все части бенчмарка во временной директории
+
+        Returns:
+            Словарь с результатами теста
+        """
+        logger.info("Запуск бенчмарка слоя хранения")
+        self.work_dir = tempfile.mkdtemp(prefix="storage_benchmark_")
+        self.original_settings = {name: getattr(database, name) for name in
+                                  ("DATABASE_PATH", "JOURNAL_MODE", "SYNCHRONOUS", "BUSY_TIMEOUT_MS")}
+        self.original_shard_count = sharding.SHARD_COUNT
+        try:
+            self.results.set_test_data("insert_throughput", self.run_insert_throughput())
+            self.results.set_test_data("writer_contention", self.run_writer_contention())
+            self.results.set_test_data("sharded_writes", self.run_sharded_writes())
+            self.results.set_test_data("read_latency", self.run_read_latency())
+            self.results.set_test_data("pragma_profiles_comparison", self.run_pragma_profiles())
+            self.results.set_test_data("backends_comparison", await self.run_backends())
+        finally:
+            database.close_pool()
+            for name, value in self.original_settings.items():
+                setattr(database, name, value)
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+        results = self.results.save_results()
+        logger.info(f"Бенчмарк завершен, результаты сохранены в {self.results.result_dir}")
+        return results
+
+
+async def main():
+    """Точка входа для запуска теста"""
+    test = StorageBenchmarkTest(mongodb_url=os.getenv("STORAGE_BENCHMARK_MONGODB_URL"))
+    await test.run()
+    print(f"\nРезультаты: {test.results.result_dir}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+import unittest
+import asyncio
+import os
+import sys
+import threading
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from telegram_bot.ai_service.admission import (
+    AdmissionController,
+    PRIORITY_DIALOGUE,
+    PRIORITY_NEW_SESSION,
+    PRIORITY_RECOMMENDATIONS
+)
+
+
+class TestAdmission(unittest.IsolatedAsyncioTestCase):
+    """Тесты для модуля admission.py"""
+
+    async def test_in_flight_limit(self):
+        """Тест ограничения одновременных запросов и передачи места ожидающему"""
+        controller = AdmissionController('test', max_in_flight=2, max_queue=10)
+        self.assertTrue(await controller.acquire())
+        self.assertTrue(await controller.acquire())
+        waiters = [asyncio.create_task(controller.acquire()) for _ in range(2)]
+        await asyncio.sleep(0)
+        self.assertEqual((controller.stats()['in_flight'], controller.stats()['queued']), (2, 2))
+
+        controller.release()
+        self.assertTrue(await waiters[0])
+        self.assertFalse(waiters[1].done())
+        controller.release()
+        self.assertTrue(await waiters[1])
+        for _ in range(2):
+            controller.release()
+        stats = controller.stats()
+        self.assertEqual((stats['in_flight'], stats['queued'], stats['admitted']), (0, 0, 4))
+
+    async def test_dialogues_preferred(self):
+        """Тест приоритета продолжающихся диалогов над новыми и вытеснения из полной очереди"""
+        controller = AdmissionController('test', max_in_flight=1, max_queue=2)
+        self.assertTrue(await controller.acquire())
+        new_session = asyncio.create_task(controller.acquire(PRIORITY_NEW_SESSION))
+        dialogue = asyncio.create_task(controller.acquire(PRIORITY_DIALOGUE))
+        await asyncio.sleep(0)
+
+        # Очередь полна: рекомендации получают отказ сразу, диалог вытесняет новый сеанс
+        self.assertFalse(await controller.acquire(PRIORITY_RECOMMENDATIONS))
+        second_dialogue = asyncio.create_task(controller.acquire(PRIORITY_DIALOGUE))
+        self.assertFalse(await new_session)
+
+        controller.release()
+        self.assertTrue(await dialogue)
+        self.assertFalse(second_dialogue.done())
+        controller.release()
+        self.assertTrue(await second_dialogue)
+        controller.release()
+        stats = controller.stats()
+        self.assertEqual((stats['admitted'], stats['rejected'], stats['shed']), (3, 1, 1))
+
+    async def test_max_wait_and_slot(self):
+        """Тест отказа после максимального ожидания и освобождения места в блоке slot()"""
+        controller = AdmissionController('test', max_in_flight=1, max_wait_seconds=0.05)
+        async with controller.slot() as admitted:
+            self.assertTrue(admitted)
+            async with controller.slot() as waited:
+                self.assertFalse(waited)
+
+        self.assertEqual(controller.stats()['in_flight'], 0)
+        async with controller.slot(PRIORITY_NEW_SESSION) as admitted:
+            self.assertTrue(admitted)
+        stats = controller.stats()
+        self.assertEqual((stats['admitted'], stats['timed_out'], stats['queued']), (2, 1, 0))
+        self.assertEqual(stats['wait_max'], 0.0)
+
+    async def test_run_on_own_threads(self):
+        """Тест выполнения допущенных вызовов в собственных потоках, по потоку на место"""
+        controller = AdmissionController('llm_test', max_in_flight=3)
+        barrier = threading.Barrier(3, timeout=5)
+
+        def blocking_call(value):
+            # Все три вызова должны выполняться одновременно, иначе барьер не пройден
+            barrier.wait()
+            return value, threading.current_thread().name
+
+        results = await asyncio.gather(*(controller.run(blocking_call, index) for index in range(3)))
+        self.assertEqual([value for value, _ in results], [0, 1, 2])
+        self.assertTrue(all(name.startswith('llm_test') for _, name in results))
+        self.assertEqual(controller._executor._max_workers, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+from datetime import datetime
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from telegram_bot.ai_service import storage
+from telegram_bot.ai_service.archive import archive_old_dialogues
+from telegram_bot.ai_service.analytics import (
+    get_daily_issue_stats,
+    get_issue_totals,
+    get_daily_feedback_counts,
+    rebuild_rollups
+)
+
+
+def make_dialogue(user_messages):
+    dialogue = [{"role": "system", "content": "Ты - психолог"}]
+    for index in range(user_messages):
+        dialogue.append({"role": "assistant", "content": f"Вопрос {index}"})
+        dialogue.append({"role": "user", "content": f"Ответ {index}"})
+    return dialogue
+
+
+class TestAnalytics(unittest.TestCase):
+    """Тесты для модуля analytics.py"""
+
+    def setUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        self.test_dir = tempfile.mkdtemp()
+
+        import telegram_bot.ai_service.database as database_module
+        self.db = database_module
+        self.original_db_path = database_module.DATABASE_PATH
+        self.original_compression = database_module.COMPRESSION_ENABLED
+        database_module.DATABASE_PATH = os.path.join(self.test_dir, 'test_dialogues.db')
+        database_module.init_db()
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.db.close_pool()
+        self.db.DATABASE_PATH = self.original_db_path
+        self.db.COMPRESSION_ENABLED = self.original_compression
+        shutil.rmtree(self.test_dir)
+
+    def test_rollups_updated_on_write(self):
+        """Тест инкрементального обновления счетчиков при записи"""
+        first_id = self.db.log_dialogue('user_1', '1', make_dialogue(2))
+        self.db.log_dialogues_bulk([('user_2', '1', make_dialogue(1)), ('user_2', '2', make_dialogue(3))])
+        self.db.log_book_recommendations('user_1', '1', {"books": [], "resources": []}, first_id)
+
+        today = datetime.utcnow().strftime('%Y-%m-%d')
+        stats = get_daily_issue_stats(today, today)
+
+        self.assertEqual(stats, [
+            {'day': today, 'issue_id': '1', 'dialogues': 2, 'messages': 6, 'recommendations': 1},
+            {'day': today, 'issue_id': '2', 'dialogues': 1, 'messages': 6, 'recommendations': 0},
+        ])
+        totals = {total['issue_id']: total for total in get_issue_totals()}
+        self.assertEqual(totals['1']['average_messages'], 3.0)
+        self.assertEqual(get_daily_issue_stats(issue_id='3'), [])
+
+    def test_feedback_rollup(self):
+        """Тест подсчета обратной связи по дням"""
+        storage.save_feedback(42, 'Спасибо', datetime(2025, 1, 10, 12, 0, 0))
+        storage.save_feedback(43, 'Помогло', datetime(2025, 1, 10, 18, 0, 0))
+        storage.save_feedback(42, 'Снова спасибо', datetime(2025, 1, 11, 9, 0, 0))
+
+        self.assertEqual(get_daily_feedback_counts('2025-01-10', '2025-01-10'),
+                         [{'day': '2025-01-10', 'feedback': 2}])
+        self.assertEqual(len(get_daily_feedback_counts()), 2)
+
+    def test_rebuild_rollups(self):
+        """Тест пересчета счетчиков, включая сжатые записи"""
+        self.db.COMPRESSION_ENABLED = True
+        self.db.log_dialogue('user_1', '1', make_dialogue(2))
+        self.db.log_dialogue('user_1', '1', make_dialogue(1))
+        expected = get_daily_issue_stats()
+
+        conn = self.db.get_db_connection()
+        conn.execute("UPDATE daily_issue_stats SET dialogues = 0, messages = 0")
+        conn.commit()
+        rebuild_rollups(conn, self.db.DATABASE_PATH)
+        conn.close()
+
+        self.assertEqual(get_daily_issue_stats(), expected)
+        self.assertEqual(expected[0]['messages'], 6)
+
+    def test_multi_turn_dialogue_counted_once(self):
+        """Тест подсчета диалога, записываемого целиком после каждого хода, как одного"""
+        history = [{"role": "system", "content": "Ты - психолог"}, {"role": "assistant", "content": "Здравствуйте"}]
+        self.db.log_dialogue('user_1', '1', history)
+        for turn in range(3):
+            history = history + [{"role": "user", "content": f"Сообщение {turn}"},
+                                 {"role": "assistant", "content": f"Ответ {turn}"}]
+            self.db.log_dialogue('user_1', '1', history)
+
+        # Длинная история отправляется в AI не целиком: продолжение узнается по последним сообщениям
+        trimmed = history[:2] + history[-4:] + [{"role": "user", "content": "Еще"},
+                                                {"role": "assistant", "content": "Слушаю"}]
+        self.db.log_dialogue('user_1', '1', trimmed)
+        # Новый выбор темы начинает новый диалог
+        self.db.log_dialogue('user_1', '1', history[:2])
+
+        stats = get_daily_issue_stats()
+        self.assertEqual((stats[0]['dialogues'], stats[0]['messages']), (2, 10))
+
+        conn = self.db.get_db_connection()
+        rebuild_rollups(conn, self.db.DATABASE_PATH)
+        conn.close()
+        self.assertEqual(get_daily_issue_stats(), stats)
+
+        # База до миграции 10: последние сообщения пользователей восстанавливаются из сохраненных записей
+        conn = self.db.get_db_connection()
+        conn.execute("DROP TABLE dialogue_tails")
+        conn.execute("PRAGMA user_version = 9")
+        conn.commit()
+        conn.close()
+        self.db.ensure_db(self.db.DATABASE_PATH, force=True)
+        self.db.log_dialogue('user_1', '1', history[:2] + [{"role": "user", "content": "Тема"},
+                                                           {"role": "assistant", "content": "Расскажите"}])
+        stats = get_daily_issue_stats()
+        self.assertEqual((stats[0]['dialogues'], stats[0]['messages']), (2, 12))
+
+    def test_rebuild_includes_archived_rows(self):
+        """Тест пересчета счетчиков с учетом перенесенных в архив записей"""
+        old_id = self.db.log_dialogue('user_1', '1', make_dialogue(2))
+        self.db.log_book_recommendations('user_1', '1', {"books": [], "resources": []}, old_id)
+        self.db.log_dialogue('user_2', '1', make_dialogue(1))
+        conn = self.db.get_db_connection()
+        for table in ('dialogues', 'book_recommendations'):
+            conn.execute(f"UPDATE {table} SET timestamp = '2020-01-15 10:00:00' WHERE user_id = 'user_1'")
+        conn.execute("DELETE FROM daily_issue_stats")
+        conn.commit()
+        archive_old_dialogues(retention_days=30)
+
+        rebuild_rollups(conn, self.db.DATABASE_PATH)
+        self.assertEqual(get_daily_issue_stats('2020-01-15', '2020-01-15'), [
+            {'day': '2020-01-15', 'issue_id': '1', 'dialogues': 1, 'messages': 4, 'recommendations': 1}
+        ])
+
+        # Без файла архива счетчики не пересчитываются
+        from telegram_bot.ai_service.archive import get_archive_path
+        os.remove(get_archive_path('2020_01'))
+        with self.assertRaises(FileNotFoundError):
+            rebuild_rollups(conn, self.db.DATABASE_PATH)
+        self.assertEqual(len(get_daily_issue_stats()), 2)
+
+        # База до миграции 7 открывается и без файла архива: его диалоги пропускаются
+        conn.execute("DROP TABLE daily_issue_stats")
+        conn.execute("DROP TABLE daily_feedback_stats")
+        conn.execute("PRAGMA user_version = 6")
+        conn.commit()
+        conn.close()
+        self.db.ensure_db(self.db.DATABASE_PATH, force=True)
+        self.assertEqual(get_daily_issue_stats('2020-01-15', '2020-01-15'), [
+            {'day': '2020-01-15', 'issue_id': '1', 'dialogues': 0, 'messages': 0, 'recommendations': 1}
+        ])
+        self.assertEqual(sum(row['dialogues'] for row in get_daily_issue_stats()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from telegram_bot.ai_service.archive import (
+    archive_old_dialogues,
+    get_archive_path
+)
+
+class TestArchive(unittest.TestCase):
+    """Тесты для модуля archive.py"""
+
+    def setUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        self.test_dir = tempfile.mkdtemp()
+
+        import telegram_bot.ai_service.database as database_module
+        self.db = database_module
+        self.original_db_path = database_module.DATABASE_PATH
+        self.original_compression = database_module.COMPRESSION_ENABLED
+        database_module.DATABASE_PATH = os.path.join(self.test_dir, 'test_dialogues.db')
+        database_module.init_db()
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.db.close_pool()
+        self.db.DATABASE_PATH = self.original_db_path
+        self.db.COMPRESSION_ENABLED = self.original_compression
+        shutil.rmtree(self.test_dir)
+
+    def _set_timestamp(self, table, record_id, timestamp):
+        conn = self.db.get_db_connection()
+        conn.execute(f"UPDATE {table} SET timestamp = ? WHERE id = ?", (timestamp, record_id))
+        conn.commit()
+        conn.close()
+
+    def test_archive_old_dialogues(self):
+        """Тест переноса старых диалогов в помесячные архивы"""
+        old_id = self.db.log_dialogue('test_user', '1', [{"role": "user", "content": "Старый диалог"}])
+        new_id = self.db.log_dialogue('test_user', '1', [{"role": "user", "content": "Новый диалог"}])
+        rec_id = self.db.log_book_recommendations('test_user', '1', {"books": []}, old_id)
+        self._set_timestamp('dialogues', old_id, '2020-01-15 10:00:00')
+        self._set_timestamp('book_recommendations', rec_id, '2020-02-01 10:00:00')
+
+        result = archive_old_dialogues(retention_days=30)
+
+        self.assertEqual(result, {'dialogues': 1, 'book_recommendations': 1})
+        self.assertTrue(os.path.exists(get_archive_path('2020_01')))
+        self.assertTrue(os.path.exists(get_archive_path('2020_02')))
+
+        # В основной базе остались только свежие записи
+        self.assertIsNone(self.db.get_dialogue_by_id(old_id))
+        self.assertEqual([d['id'] for d in self.db.get_user_dialogues('test_user')], [new_id])
+        self.assertEqual(self.db.get_user_recommendations('test_user'), [])
+
+        # Повторный запуск ничего не переносит
+        self.assertEqual(archive_old_dialogues(retention_days=30), {'dialogues': 0, 'book_recommendations': 0})
+
+    def test_archived_records_readable(self):
+        """Тест чтения архивных записей через основной API"""
+        self.db.COMPRESSION_ENABLED = True
+        dialogue = [{"role": "user", "content": "Архивный диалог"}]
+        old_id = self.db.log_dialogue('test_user', '2', dialogue)
+        new_id = self.db.log_dialogue('test_user', '2', [{"role": "user", "content": "Новый"}])
+        self._set_timestamp('dialogues', old_id, '2020-03-10 10:00:00')
+        archive_old_dialogues(retention_days=30)
+
+        archived = self.db.get_dialogue_by_id(old_id, include_archived=True)
+        self.assertEqual(archived['issue_id'], '2')
+        self.assertEqual(archived['dialogue_json'], dialogue)
+
+        dialogues = self.db.get_user_dialogues('test_user', include_archived=True)
+        self.assertEqual([d['id'] for d in dialogues], [new_id, old_id])
+        self.assertEqual(dialogues[1]['dialogue_json'], dialogue)
+
+        # Метаданные архивных диалогов доступны без открытия архивов
+        metadata = list(self.db.iter_user_dialogues('test_user', include_dialogue=False, include_archived=True))
+        self.assertEqual(metadata[1], {'id': old_id, 'user_id': 'test_user', 'issue_id': '2',
+                                       'timestamp': '2020-03-10 10:00:00'})
+
+
+if __name__ == '__main__':
+    unittest.main()
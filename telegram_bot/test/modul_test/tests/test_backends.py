@@ -0,0 +1,130 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from telegram_bot.ai_service.backends import SQLiteBackend, create_backend
+from telegram_bot.ai_service.backends.mongo import MongoBackend
+
+
+def make_dialogue(index):
+    return [
+        {"role": "assistant", "content": "Здравствуйте! Расскажите, что вас беспокоит?"},
+        {"role": "user", "content": f"Сообщение пользователя номер {index}"}
+    ]
+
+
+class BackendContractMixin:
+    """Общие проверки, которые должен проходить любой бэкенд хранения"""
+
+    async def test_dialogues_roundtrip(self):
+        """Тест записи и чтения диалогов, включая пакетную запись"""
+        first_id = await self.backend.log_dialogue('test_user', '1', make_dialogue(0))
+        bulk_ids = await self.backend.log_dialogues_bulk([('test_user', '1', make_dialogue(i)) for i in range(1, 4)])
+        await self.backend.log_dialogue('other_user', '2', make_dialogue(9))
+
+        self.assertEqual(bulk_ids, [first_id + 1, first_id + 2, first_id + 3])
+        dialogue = await self.backend.get_dialogue_by_id(bulk_ids[0])
+        self.assertEqual(dialogue['user_id'], 'test_user')
+        self.assertEqual(dialogue['dialogue_json'], make_dialogue(1))
+        self.assertIsNone(await self.backend.get_dialogue_by_id(10 ** 6))
+
+        dialogues = await self.backend.get_user_dialogues('test_user')
+        self.assertEqual([d['id'] for d in dialogues], list(reversed([first_id] + bulk_ids)))
+        self.assertEqual(len(await self.backend.get_user_dialogues('test_user', limit=2)), 2)
+        latest = await self.backend.get_latest_user_dialogue('test_user')
+        self.assertEqual(latest['id'], bulk_ids[-1])
+
+    async def test_recommendations_users_and_feedback(self):
+        """Тест рекомендаций, пользователей и отзывов"""
+        dialogue_id = await self.backend.log_dialogue('test_user', '1', make_dialogue(0))
+        recommendations = {"books": [{"title": "Книга"}], "resources": []}
+        await self.backend.log_book_recommendations('test_user', '1', recommendations, dialogue_id)
+        await self.backend.save_user(42, 'tester')
+        feedback_id = await self.backend.save_feedback(42, 'Спасибо')
+
+        stored = await self.backend.get_user_recommendations('test_user')
+        self.assertEqual(len(stored), 1)
+        self.assertEqual(stored[0]['recommendations_json'], recommendations)
+        self.assertEqual(stored[0]['dialogue_id'], dialogue_id)
+        self.assertGreater(feedback_id, 0)
+
+
+class TestSQLiteBackend(BackendContractMixin, unittest.IsolatedAsyncioTestCase):
+    """Тесты SQLite-бэкенда"""
+
+    async def asyncSetUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        self.test_dir = tempfile.mkdtemp()
+
+        import telegram_bot.ai_service.database as database_module
+        self.database_module = database_module
+        self.original_db_path = database_module.DATABASE_PATH
+        self.backend = create_backend('sqlite:///' + os.path.join(self.test_dir, 'test_dialogues.db'))
+        await self.backend.init()
+
+    async def asyncTearDown(self):
+        """Очистка после каждого теста"""
+        await self.backend.close()
+        self.database_module.DATABASE_PATH = self.original_db_path
+        shutil.rmtree(self.test_dir)
+
+    def test_create_backend(self):
+        """Тест выбора бэкенда по URL"""
+        self.assertIsInstance(self.backend, SQLiteBackend)
+        with self.assertRaises(ValueError):
+            create_backend('redis://localhost')
+
+    async def test_database_path_is_process_global(self):
+        """Тест отказа открыть второй SQLite-бэкенд с другим путем, пока открыт первый"""
+        other_path = os.path.join(self.test_dir, 'other.db')
+        other = SQLiteBackend(other_path)
+        # Создание бэкенда не меняет путь базы процесса
+        self.assertEqual(self.database_module.DATABASE_PATH, os.path.join(self.test_dir, 'test_dialogues.db'))
+        with self.assertRaises(ValueError):
+            await other.init()
+
+        # Бэкенд с тем же путем разделяет пул соединений
+        same = SQLiteBackend(os.path.join(self.test_dir, 'test_dialogues.db'))
+        await same.init()
+        dialogue_id = await same.log_dialogue('user_1', '1', [{"role": "user", "content": "Привет"}])
+        self.assertEqual((await self.backend.get_dialogue_by_id(dialogue_id))['user_id'], 'user_1')
+
+        await self.backend.close()
+        await other.init()
+        self.assertEqual(self.database_module.DATABASE_PATH, other_path)
+        self.backend = other
+
+
+class TestMongoBackend(BackendContractMixin, unittest.IsolatedAsyncioTestCase):
+    """
+    Тесты MongoDB-бэкенда
+
+    Используют mongod из MONGODB_TEST_URL, а если он не задан - mongomock_motor.
+    """
+
+    async def asyncSetUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        url = os.getenv('MONGODB_TEST_URL')
+        if url:
+            self.backend = MongoBackend(url, database_name='psychological_help_test')
+        else:
+            try:
+                from mongomock_motor import AsyncMongoMockClient
+            except ImportError:
+                self.skipTest("MONGODB_TEST_URL is not set and mongomock_motor is not installed")
+            self.backend = MongoBackend(client=AsyncMongoMockClient(), database_name='psychological_help_test')
+        await self.backend.init()
+
+    async def asyncTearDown(self):
+        """Очистка после каждого теста"""
+        await self.backend.client.drop_database('psychological_help_test')
+        await self.backend.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -91,6 +91,7 @@ class TestBooks(unittest.TestCase):
         """Очистка после каждого теста"""
         # Возвращаем оригинальный путь к базе данных
         import telegram_bot.ai_service.database as database_module
+        database_module.close_pool()
         database_module.DATABASE_PATH = self.original_db_path
         
         # Удаляем временную директорию
@@ -178,6 +179,23 @@ class TestBooks(unittest.TestCase):
         self.assertEqual(latest_recommendation['recommendations_json']['books'][0]['title'], 
                          self.test_recommendations['books'][0]['title'])
     
+    @patch('telegram_bot.ai_service.ai_books.OpenAI')
+    def test_get_book_recommendations_without_logging(self, mock_openai):
+        """Тест получения рекомендаций без записи в базу (подготовка заранее)"""
+        mock_client = MagicMock()
+        mock_openai.return_value = mock_client
+        mock_completion = MagicMock()
+        mock_client.chat.completions.create.return_value = mock_completion
+        mock_completion.choices = [MagicMock()]
+        mock_completion.choices[0].message.content = json.dumps(self.test_recommendations)
+
+        recommendations = get_book_recommendations(1, 'prefetch_user', '1', [], log_result=False)
+
+        # Рекомендации возвращаются, но в базу не записываются
+        self.assertEqual(recommendations, self.test_recommendations)
+        import telegram_bot.ai_service.database as db
+        self.assertEqual(db.get_user_recommendations('prefetch_user'), [])
+    
     @patch('telegram_bot.ai_service.ai_books.get_book_recommendations')
     def test_get_book_recommendations_from_file(self, mock_get_recommendations):
         """Тест получения рекомендаций книг из файла"""
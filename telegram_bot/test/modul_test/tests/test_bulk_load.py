@@ -0,0 +1,116 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from telegram_bot.ai_service.bulk_load import bulk_load_dialogues, iter_jsonl, _drop_indexes
+from telegram_bot.ai_service.export import export_table
+from telegram_bot.ai_service.search import search_dialogues
+from telegram_bot.ai_service.analytics import get_daily_issue_stats, rebuild_rollups
+
+
+def make_record(index):
+    return {
+        "user_id": f"user_{index % 3}",
+        "issue_id": str(index % 2 + 1),
+        "timestamp": f"2025-01-{index % 5 + 1:02d} 12:00:00",
+        "dialogue_json": [
+            {"role": "system", "content": "Ты - психолог"},
+            {"role": "user", "content": f"Тревога перед экзаменом номер {index}"}
+        ]
+    }
+
+
+class TestBulkLoad(unittest.TestCase):
+    """Тесты для модуля bulk_load.py"""
+
+    def setUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        self.test_dir = tempfile.mkdtemp()
+
+        import telegram_bot.ai_service.database as database_module
+        self.db = database_module
+        self.original_db_path = database_module.DATABASE_PATH
+        database_module.DATABASE_PATH = os.path.join(self.test_dir, 'test_dialogues.db')
+        database_module.init_db()
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.db.close_pool()
+        self.db.DATABASE_PATH = self.original_db_path
+        shutil.rmtree(self.test_dir)
+
+    def test_bulk_load_batches(self):
+        """Тест пакетной загрузки с отложенным построением индексов"""
+        existing_id = self.db.log_dialogue('user_0', '1', make_record(0)['dialogue_json'])
+
+        loaded = bulk_load_dialogues((make_record(i) for i in range(25)), batch_size=10)
+
+        self.assertEqual(loaded, 25)
+        dialogues = self.db.get_user_dialogues('user_1')
+        self.assertEqual(len(dialogues), 8)
+        self.assertEqual(dialogues[0]['timestamp'], '2025-01-05 12:00:00')
+        self.assertTrue(all(d['id'] > existing_id for d in dialogues))
+        # Индексы восстановлены после загрузки
+        conn = self.db.get_db_connection()
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        conn.close()
+        self.assertIn('idx_dialogues_user_timestamp', indexes)
+        # Полнотекстовый индекс и агрегаты заполнены для загруженных диалогов
+        results = search_dialogues('экзамен номер 7')
+        self.assertEqual([self.db.get_dialogue_by_id(r['dialogue_id'])['dialogue_json'] for r in results],
+                         [make_record(7)['dialogue_json']])
+        # Запись 0 повторяет уже сохраненный снимок user_0 и считается его продолжением
+        stats = get_daily_issue_stats('2025-01-01', '2025-01-05')
+        self.assertEqual(sum(row['dialogues'] for row in stats), 24)
+        self.assertEqual(sum(row['messages'] for row in stats), 24)
+
+    def test_import_export_roundtrip(self):
+        """Тест загрузки файла, выгруженного модулем export.py"""
+        bulk_load_dialogues(make_record(i) for i in range(12))
+        export_path = os.path.join(self.test_dir, 'dialogues.jsonl.gz')
+        export_table('dialogues', export_path)
+
+        self.db.DATABASE_PATH = os.path.join(self.test_dir, 'copy.db')
+        loaded = bulk_load_dialogues(iter_jsonl(export_path), defer_indexes=False)
+
+        self.assertEqual(loaded, 12)
+        self.assertEqual([d['dialogue_json'] for d in self.db.get_user_dialogues('user_2')],
+                         [make_record(i)['dialogue_json'] for i in (8, 2, 11, 5)])
+
+    def test_multi_turn_dialogues_and_interrupted_load(self):
+        """Тест подсчета продолжений диалога между пакетами и восстановления индексов после прерванной загрузки"""
+        history = [{"role": "system", "content": "Ты - психолог"}, {"role": "assistant", "content": "Здравствуйте"}]
+        records = []
+        for turn in range(4):
+            history = history + [{"role": "user", "content": f"Сообщение {turn}"},
+                                 {"role": "assistant", "content": f"Ответ {turn}"}]
+            records.append({"user_id": "user_1", "issue_id": "1", "timestamp": "2025-01-01 12:00:00",
+                            "dialogue_json": history})
+        bulk_load_dialogues(records[:1])
+        bulk_load_dialogues(records[1:], batch_size=2)
+
+        stats = get_daily_issue_stats()
+        self.assertEqual((stats[0]['dialogues'], stats[0]['messages']), (1, 9))
+        conn = self.db.get_db_connection()
+        rebuild_rollups(conn, self.db.DATABASE_PATH)
+        self.assertEqual(get_daily_issue_stats(), stats)
+
+        # Загрузка прервана после удаления индексов: следующий запуск строит их заново
+        _drop_indexes(conn, 'dialogues')
+        conn.close()
+        self.db.ensure_db(self.db.DATABASE_PATH, force=True)
+        conn = self.db.get_db_connection()
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        journal = conn.execute("SELECT COUNT(*) FROM deferred_indexes").fetchone()[0]
+        conn.close()
+        self.assertIn('idx_dialogues_user_timestamp', indexes)
+        self.assertEqual(journal, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
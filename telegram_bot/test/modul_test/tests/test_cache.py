@@ -0,0 +1,85 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+from unittest.mock import patch
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from telegram_bot.ai_service import cache
+from telegram_bot.ai_service.cache import TTLCache
+
+
+class TestCache(unittest.TestCase):
+    """Тесты для модуля cache.py"""
+
+    def setUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        self.test_dir = tempfile.mkdtemp()
+
+        import telegram_bot.ai_service.database as database_module
+        self.db = database_module
+        self.original_db_path = database_module.DATABASE_PATH
+        database_module.DATABASE_PATH = os.path.join(self.test_dir, 'test_dialogues.db')
+        database_module.init_db()
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.db.close_pool()
+        self.db.DATABASE_PATH = self.original_db_path
+        cache.clear_caches()
+        shutil.rmtree(self.test_dir)
+
+    def test_lru_eviction_and_ttl(self):
+        """Тест вытеснения давно неиспользуемых записей и истечения TTL"""
+        lru = TTLCache('test', max_entries=2, ttl_seconds=10)
+        with patch('telegram_bot.ai_service.cache.time.monotonic', return_value=100.0):
+            lru.set('a', 1)
+            lru.set('b', 2)
+            self.assertEqual(lru.get('a'), (True, 1))
+            lru.set('c', 3)
+            # 'b' использовался давнее всех и вытеснен
+            self.assertEqual(lru.get('b'), (False, None))
+        with patch('telegram_bot.ai_service.cache.time.monotonic', return_value=111.0):
+            self.assertEqual(lru.get('a'), (False, None))
+
+        stats = lru.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions'], stats['expirations']), (1, 2, 1, 1))
+        self.assertAlmostEqual(stats['hit_rate'], 1 / 3, places=3)
+
+    def test_dialogue_read_through(self):
+        """Тест повторного чтения диалога из кэша без обращения к базе"""
+        dialogue = [{"role": "user", "content": "Сообщение"}]
+        dialogue_id = self.db.log_dialogue('test_user', '1', dialogue)
+
+        first = self.db.get_dialogue_by_id(dialogue_id)
+        self.assertEqual(first['dialogue_json'], dialogue)
+        with patch.object(self.db, 'pooled_connection', side_effect=AssertionError("database queried")):
+            second = self.db.get_dialogue_by_id(dialogue_id)
+            self.assertEqual(second['dialogue_json'], dialogue)
+
+        # Каждый вызов возвращает новую запись, декодированный диалог общий
+        second['issue_id'] = 'changed'
+        self.assertEqual(first['issue_id'], '1')
+        self.assertIs(first['dialogue_json'], second['dialogue_json'])
+        self.assertGreaterEqual(cache.get_cache_stats()['dialogues']['hits'], 1)
+
+    def test_recommendations_invalidated_on_write(self):
+        """Тест сброса кэша рекомендаций при записи новых рекомендаций"""
+        dialogue_id = self.db.log_dialogue('test_user', '1', [{"role": "user", "content": "Сообщение"}])
+        self.db.log_book_recommendations('test_user', '1', {"books": [{"title": "Первая"}]}, dialogue_id)
+        self.assertEqual(len(self.db.get_user_recommendations('test_user')), 1)
+        invalidations = cache.recommendations_cache.stats()['invalidations']
+
+        self.db.log_book_recommendations('test_user', '1', {"books": [{"title": "Вторая"}]}, dialogue_id)
+        recommendations = self.db.get_user_recommendations('test_user')
+
+        self.assertEqual(len(recommendations), 2)
+        self.assertEqual(recommendations[0]['recommendations_json'], {"books": [{"title": "Вторая"}]})
+        self.assertEqual(cache.recommendations_cache.stats()['invalidations'], invalidations + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import os
+import sys
+import json
+import sqlite3
+import tempfile
+import shutil
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from telegram_bot.ai_service import export as export_module
+from telegram_bot.ai_service.catalog import get_top_items, load_recommendations, is_catalog_stub
+from telegram_bot.ai_service.migrations import migrate
+
+
+RECOMMENDATIONS = {
+    "books": [
+        {"title": "Тревожность", "author": "Автор А", "description": "Описание", "why_relevant": "Про тревогу"},
+        {"title": "Сон", "author": "Автор Б", "description": "Про сон", "why_relevant": "Про бессонницу"},
+    ],
+    "resources": [
+        {"title": "Дыхание", "type": "упражнение", "description": "Техника", "link": "https://example.com"},
+    ],
+}
+
+
+class TestCatalog(unittest.TestCase):
+    """Тесты для модуля catalog.py"""
+
+    def setUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        self.test_dir = tempfile.mkdtemp()
+
+        import telegram_bot.ai_service.database as database_module
+        self.db = database_module
+        self.original_db_path = database_module.DATABASE_PATH
+        self.original_catalog_only = database_module.RECOMMENDATIONS_CATALOG_ONLY
+        database_module.DATABASE_PATH = os.path.join(self.test_dir, 'test_dialogues.db')
+        database_module.init_db()
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.db.close_pool()
+        self.db.DATABASE_PATH = self.original_db_path
+        self.db.RECOMMENDATIONS_CATALOG_ONLY = self.original_catalog_only
+        shutil.rmtree(self.test_dir)
+
+    def test_items_deduplicated(self):
+        """Тест хранения одинаковых книг одной записью каталога и подсчета по проблемам"""
+        # Каталог заполняется и при записи полного JSON
+        self.db.RECOMMENDATIONS_CATALOG_ONLY = False
+        dialogue_id = self.db.log_dialogue('user_1', '1', [{"role": "user", "content": "Сообщение"}])
+        first_id = self.db.log_book_recommendations('user_1', '1', RECOMMENDATIONS, dialogue_id)
+        # Та же книга с другим регистром и другим обоснованием
+        same_book = {"title": "тревожность ", "author": "автор а", "description": "Описание",
+                     "why_relevant": "Другое обоснование"}
+        self.db.log_book_recommendations('user_2', '1', {"books": [same_book]}, dialogue_id)
+        self.db.log_book_recommendations('user_3', '2', {"books": [RECOMMENDATIONS['books'][1]]}, dialogue_id)
+
+        conn = self.db.get_db_connection()
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM catalog_items").fetchone()[0], 3)
+        self.assertEqual(load_recommendations(conn, first_id, ['books', 'resources']), RECOMMENDATIONS)
+        conn.close()
+
+        top = get_top_items('book', issue_id='1')
+        self.assertEqual([(item['title'], item['recommendations']) for item in top], [('Тревожность', 2), ('Сон', 1)])
+        self.assertNotIn('why_relevant', top[0]['item'])
+        self.assertEqual([item['recommendations'] for item in get_top_items('book')], [2, 2])
+        self.assertEqual(get_top_items('resource')[0]['title'], 'Дыхание')
+
+    def test_catalog_only_storage(self):
+        """Тест записи рекомендаций только в каталог (режим по умолчанию) и восстановления при чтении"""
+        self.assertTrue(self.db.RECOMMENDATIONS_CATALOG_ONLY)
+        dialogue_id = self.db.log_dialogue('user_1', '1', [{"role": "user", "content": "Сообщение"}])
+        # Поле описания отсутствует у второй рекомендации той же книги
+        without_description = dict(RECOMMENDATIONS['books'][0])
+        del without_description['description']
+        first_id = self.db.log_book_recommendations('user_1', '1', RECOMMENDATIONS, dialogue_id)
+        self.db.log_book_recommendations('user_1', '1', {"books": [without_description]}, dialogue_id)
+        # Значение, которое каталог не может воспроизвести, хранится целиком
+        self.db.log_book_recommendations('user_1', '1', {"books": [], "note": "текст"}, dialogue_id)
+
+        conn = self.db.get_db_connection()
+        raw = [json.loads(row[0]) for row in conn.execute("SELECT recommendations_json FROM book_recommendations ORDER BY id")]
+        conn.close()
+        self.assertEqual([is_catalog_stub(value) for value in raw], [True, True, False])
+
+        stored = {record['id']: record['recommendations_json'] for record in self.db.get_user_recommendations('user_1')}
+        self.assertEqual(stored[first_id], RECOMMENDATIONS)
+        self.assertEqual(stored[first_id + 1], {"books": [without_description]})
+        self.assertEqual(stored[first_id + 2], {"books": [], "note": "текст"})
+
+        exported = [row for chunk in export_module.iter_export_rows('book_recommendations') for row in chunk]
+        self.assertEqual(exported[0]['recommendations_json'], RECOMMENDATIONS)
+
+    def test_migration_links_existing_rows(self):
+        """Тест заполнения каталога для записей, созданных до его появления"""
+        conn = sqlite3.connect(os.path.join(self.test_dir, 'legacy.db'))
+        migrate(conn, target_version=7)
+        conn.execute("INSERT INTO book_recommendations (user_id, issue_id, recommendations_json) VALUES (?, ?, ?)",
+                     ('user_1', '3', json.dumps(RECOMMENDATIONS, ensure_ascii=False)))
+        conn.commit()
+
+        migrate(conn)
+        links = conn.execute("SELECT kind, position, issue_id FROM recommendation_items ORDER BY kind, position").fetchall()
+        conn.close()
+        self.assertEqual(links, [('book', 0, '3'), ('book', 1, '3'), ('resource', 0, '3')])
+
+
+if __name__ == '__main__':
+    unittest.main()
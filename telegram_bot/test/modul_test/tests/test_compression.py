@@ -0,0 +1,108 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from telegram_bot.ai_service.compression import (
+    compress,
+    decompress,
+    is_compressed,
+    train_dictionary,
+    train_dictionary_from_database,
+    recompress_database
+)
+
+SYSTEM_PROMPT = ("Ты - опытный психолог-консультант, специализирующийся на работе с депрессией. "
+                 "Будь эмпатичным, поддерживающим, но профессиональным.")
+
+
+def make_dialogue(index):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "assistant", "content": "Здравствуйте! Расскажите, что вас беспокоит?"},
+        {"role": "user", "content": f"Сообщение пользователя номер {index}"}
+    ]
+
+
+class TestCompression(unittest.TestCase):
+    """Тесты для модуля compression.py"""
+
+    def setUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        self.test_dir = tempfile.mkdtemp()
+
+        import telegram_bot.ai_service.database as database_module
+        self.database_module = database_module
+        self.original_db_path = database_module.DATABASE_PATH
+        self.original_compression = database_module.COMPRESSION_ENABLED
+        database_module.DATABASE_PATH = os.path.join(self.test_dir, 'test_dialogues.db')
+        database_module.init_db()
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.database_module.close_pool()
+        self.database_module.DATABASE_PATH = self.original_db_path
+        self.database_module.COMPRESSION_ENABLED = self.original_compression
+        shutil.rmtree(self.test_dir)
+
+    def test_compress_roundtrip(self):
+        """Тест сжатия и распаковки со словарем и без него"""
+        text = '[{"role": "system", "content": "' + SYSTEM_PROMPT + '"}]'
+        dictionary = train_dictionary([make_dialogue(i) for i in range(3)])
+
+        plain = compress(text)
+        with_dictionary = compress(text, dictionary, 1)
+
+        self.assertTrue(is_compressed(plain))
+        self.assertEqual(decompress(plain), text)
+        self.assertEqual(decompress(with_dictionary, dictionary), text)
+        # Словарь, содержащий системный промпт, заметно уменьшает размер записи
+        self.assertLess(len(with_dictionary), len(plain))
+
+    def test_compressed_and_plain_rows_readable(self):
+        """Тест чтения старых несжатых и новых сжатых записей"""
+        db = self.database_module
+        plain_id = db.log_dialogue('test_user', '1', make_dialogue(1))
+
+        db.COMPRESSION_ENABLED = True
+        compressed_id = db.log_dialogue('test_user', '1', make_dialogue(2))
+
+        conn = db.get_db_connection()
+        raw = conn.execute("SELECT dialogue_json FROM dialogues WHERE id = ?", (compressed_id,)).fetchone()[0]
+        conn.close()
+        self.assertTrue(is_compressed(raw))
+
+        self.assertEqual(db.get_dialogue_by_id(plain_id)['dialogue_json'], make_dialogue(1))
+        self.assertEqual(db.get_dialogue_by_id(compressed_id)['dialogue_json'], make_dialogue(2))
+
+    def test_recompress_database(self):
+        """Тест фоновой перепаковки существующих записей обученным словарем"""
+        db = self.database_module
+        dialogue_ids = [db.log_dialogue('test_user', '1', make_dialogue(i)) for i in range(5)]
+        db.log_book_recommendations('test_user', '1', {"books": [], "resources": []}, dialogue_ids[0])
+
+        conn = db.get_db_connection()
+        dictionary_id = train_dictionary_from_database(conn, db.DATABASE_PATH)
+        rewritten = recompress_database(conn, db.DATABASE_PATH, batch_size=2)
+        # Повторный запуск ничего не переписывает
+        rewritten_again = recompress_database(conn, db.DATABASE_PATH)
+        raw_values = [row[0] for row in conn.execute("SELECT dialogue_json FROM dialogues")]
+        conn.close()
+
+        self.assertGreater(dictionary_id, 0)
+        self.assertEqual(rewritten, 6)
+        self.assertEqual(rewritten_again, 0)
+        self.assertTrue(all(is_compressed(value) for value in raw_values))
+
+        for index, dialogue_id in enumerate(dialogue_ids):
+            self.assertEqual(db.get_dialogue_by_id(dialogue_id)['dialogue_json'], make_dialogue(index))
+        self.assertEqual(db.get_user_recommendations('test_user')[0]['recommendations_json'],
+                         {"books": [], "resources": []})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,8 @@ from datetime import datetime
 import sys
 import tempfile
 import shutil
+import subprocess
+from unittest.mock import patch
 
 # Добавляем корневую директорию проекта в sys.path для импорта модулей
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
@@ -17,7 +19,10 @@ from telegram_bot.ai_service.database import (
     log_book_recommendations,
     get_user_dialogues,
     get_user_recommendations,
-    get_dialogue_by_id
+    get_dialogue_by_id,
+    get_user_dialogues_page,
+    iter_user_dialogues,
+    get_latest_user_dialogue
 )
 
 class TestDatabase(unittest.TestCase):
@@ -40,6 +45,7 @@ class TestDatabase(unittest.TestCase):
         """Очистка после каждого теста"""
         # Возвращаем оригинальный путь к базе данных
         import telegram_bot.ai_service.database as database_module
+        database_module.close_pool()
         database_module.DATABASE_PATH = self.original_db_path
         
         # Удаляем временную директорию
@@ -64,6 +70,29 @@ class TestDatabase(unittest.TestCase):
         self.assertIsNotNone(cursor.fetchone())
         
         conn.close()
+
+    def test_init_db_cached_per_process(self):
+        """Тест повторной инициализации: миграции проверяются один раз на файл"""
+        import telegram_bot.ai_service.database as database_module
+        with patch.object(database_module, 'migrate', return_value=0) as migrate_mock:
+            init_db()
+            get_db_connection().close()
+            self.assertEqual(migrate_mock.call_count, 0)
+
+            # Удаленный файл создается заново при следующем обращении
+            database_module.close_pool()
+            os.remove(database_module.DATABASE_PATH)
+            get_db_connection().close()
+            self.assertEqual(migrate_mock.call_count, 1)
+
+    def test_import_has_no_side_effects(self):
+        """Тест импорта пакета без создания файлов в текущей директории"""
+        project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../'))
+        subprocess.run([sys.executable, '-c', 'import telegram_bot.ai_service'], cwd=self.test_dir, check=True,
+                       env=dict(os.environ, PYTHONPATH=project_root))
+
+        created = [name for name in os.listdir(self.test_dir) if not name.startswith('test_dialogues.db')]
+        self.assertEqual(created, [])
     
     def test_log_dialogue(self):
         """Тест логирования диалога в базу данных"""
@@ -146,8 +175,9 @@ class TestDatabase(unittest.TestCase):
         self.assertEqual(record['issue_id'], issue_id)
         self.assertEqual(record['dialogue_id'], dialogue_id)
         
-        # Проверяем, что JSON рекомендаций сохранен корректно
-        saved_recommendations = json.loads(record['recommendations_json'])
+        # Книги хранятся в каталоге, в записи - только заглушка; при чтении рекомендации восстанавливаются
+        self.assertNotIn('books', json.loads(record['recommendations_json']))
+        saved_recommendations = get_user_recommendations(user_id)[0]['recommendations_json']
         self.assertEqual(len(saved_recommendations['books']), len(recommendations['books']))
         self.assertEqual(saved_recommendations['books'][0]['title'], recommendations['books'][0]['title'])
     
@@ -252,6 +282,55 @@ class TestDatabase(unittest.TestCase):
         # Проверяем, что возвращается None
         self.assertIsNone(nonexistent_dialogue)
 
+    def test_get_user_dialogues_page(self):
+        """Тест постраничного получения диалогов по курсору"""
+        user_id = 'test_user'
+        dialogue_ids = [log_dialogue(user_id, '1', [{"role": "user", "content": f"Диалог {i}"}]) for i in range(5)]
+        log_dialogue('other_user', '1', [{"role": "user", "content": "Чужой диалог"}])
+
+        # Первая страница содержит самые новые диалоги
+        page, cursor = get_user_dialogues_page(user_id, limit=2)
+        self.assertEqual([d['id'] for d in page], dialogue_ids[:-3:-1])
+        self.assertIsNotNone(cursor)
+
+        # Итерация по всем страницам возвращает все диалоги пользователя без повторов
+        all_ids = [d['id'] for d in iter_user_dialogues(user_id, page_size=2)]
+        self.assertEqual(all_ids, list(reversed(dialogue_ids)))
+
+        # Последняя страница не возвращает курсор
+        page, cursor = get_user_dialogues_page(user_id, limit=10)
+        self.assertEqual(len(page), 5)
+        self.assertIsNone(cursor)
+
+    def test_get_latest_user_dialogue_metadata_only(self):
+        """Тест получения метаданных последнего диалога без JSON"""
+        user_id = 'test_user'
+        log_dialogue(user_id, '1', [{"role": "user", "content": "Первый"}])
+        latest_id = log_dialogue(user_id, '2', [{"role": "user", "content": "Второй"}])
+
+        latest = get_latest_user_dialogue(user_id, include_dialogue=False)
+        self.assertEqual(latest['id'], latest_id)
+        self.assertEqual(latest['issue_id'], '2')
+        self.assertNotIn('dialogue_json', latest)
+
+        # Для пользователя без диалогов возвращается None
+        self.assertIsNone(get_latest_user_dialogue('unknown_user'))
+
+    def test_dialogue_json_decoded_lazily(self):
+        """Тест ленивого декодирования JSON диалога"""
+        dialogue = [{"role": "user", "content": "Сообщение"}]
+        dialogue_id = log_dialogue('test_user', '1', dialogue)
+
+        record = get_dialogue_by_id(dialogue_id)
+
+        # До обращения к полю хранится исходная строка
+        self.assertIsInstance(dict.__getitem__(record, 'dialogue_json'), str)
+
+        # При обращении возвращается декодированный диалог
+        self.assertEqual(record['dialogue_json'], dialogue)
+        self.assertEqual(dict(record)['dialogue_json'], dialogue)
+        self.assertEqual(json.loads(json.dumps(record))['dialogue_json'], dialogue)
+
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
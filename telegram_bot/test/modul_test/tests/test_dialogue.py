@@ -80,6 +80,7 @@ class TestDialogue(unittest.TestCase):
         """Очистка после каждого теста"""
         # Возвращаем оригинальный путь к базе данных
         import telegram_bot.ai_service.database as database_module
+        database_module.close_pool()
         database_module.DATABASE_PATH = self.original_db_path
         
         # Удаляем временную директорию
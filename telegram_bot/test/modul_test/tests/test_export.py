@@ -0,0 +1,106 @@
+import unittest
+import os
+import sys
+import gzip
+import json
+import tempfile
+import shutil
+from datetime import datetime
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from telegram_bot.ai_service import storage
+from telegram_bot.ai_service import export as export_module
+from telegram_bot.ai_service.export import export_table, anonymize_user_id
+
+
+def make_dialogue(index):
+    return [
+        {"role": "assistant", "content": "Здравствуйте! Расскажите, что вас беспокоит?"},
+        {"role": "user", "content": f"Сообщение пользователя номер {index}"}
+    ]
+
+
+def read_jsonl(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+class TestExport(unittest.TestCase):
+    """Тесты для модуля export.py"""
+
+    def setUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        self.test_dir = tempfile.mkdtemp()
+
+        import telegram_bot.ai_service.database as database_module
+        self.db = database_module
+        self.original_db_path = database_module.DATABASE_PATH
+        self.original_compression = database_module.COMPRESSION_ENABLED
+        database_module.DATABASE_PATH = os.path.join(self.test_dir, 'test_dialogues.db')
+        database_module.init_db()
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.db.close_pool()
+        self.db.DATABASE_PATH = self.original_db_path
+        self.db.COMPRESSION_ENABLED = self.original_compression
+        shutil.rmtree(self.test_dir)
+
+    def test_export_jsonl_with_filters(self):
+        """Тест потокового экспорта с фильтрами и анонимизацией"""
+        self.db.COMPRESSION_ENABLED = True
+        ids = [self.db.log_dialogue('user_1', str(i % 2), make_dialogue(i)) for i in range(7)]
+        output_path = os.path.join(self.test_dir, 'dialogues.jsonl')
+
+        exported = export_table('dialogues', output_path, issue_id='1', anonymize_key=b'secret', chunk_size=2)
+        records = read_jsonl(output_path)
+
+        self.assertEqual(exported, 3)
+        self.assertEqual([record['id'] for record in records], [ids[1], ids[3], ids[5]])
+        self.assertEqual(records[0]['dialogue_json'], make_dialogue(1))
+        self.assertEqual(records[0]['user_id'], anonymize_user_id('user_1', b'secret'))
+        self.assertNotEqual(anonymize_user_id('user_1', b'other'), records[0]['user_id'])
+
+        until = datetime.utcnow().strftime('%Y-%m-%d')
+        self.assertEqual(export_table('dialogues', output_path, until=until), 0)
+
+    def test_export_parallel_gzip(self):
+        """Тест параллельного сжатия нескольких блоков"""
+        storage.save_feedback(42, 'Спасибо ' * 50, datetime(2025, 1, 10))
+        for i in range(200):
+            storage.save_feedback(43, f'Отзыв {i} ' * 50, datetime(2025, 2, 1))
+        original_block_size = export_module.GZIP_BLOCK_SIZE
+        export_module.GZIP_BLOCK_SIZE = 4096
+        output_path = os.path.join(self.test_dir, 'feedback.jsonl.gz')
+        try:
+            exported = export_table('feedback', output_path, since='2025-02-01', chunk_size=16, threads=3)
+        finally:
+            export_module.GZIP_BLOCK_SIZE = original_block_size
+        records = read_jsonl(output_path)
+
+        self.assertEqual(exported, 200)
+        self.assertEqual([record['feedback'] for record in records], [f'Отзыв {i} ' * 50 for i in range(200)])
+
+    def test_export_parquet(self):
+        """Тест экспорта в Parquet"""
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.skipTest("pyarrow is not installed")
+        dialogue_id = self.db.log_dialogue('user_1', '1', make_dialogue(1))
+        self.db.log_book_recommendations('user_1', '1', {"books": [{"title": "Книга"}]}, dialogue_id)
+        output_path = os.path.join(self.test_dir, 'book_recommendations.parquet')
+
+        exported = export_table('book_recommendations', output_path, 'parquet')
+        rows = pq.read_table(output_path).to_pylist()
+
+        self.assertEqual(exported, 1)
+        self.assertEqual(rows[0]['dialogue_id'], dialogue_id)
+        self.assertEqual(json.loads(rows[0]['recommendations_json']), {"books": [{"title": "Книга"}]})
+
+
+if __name__ == '__main__':
+    unittest.main()
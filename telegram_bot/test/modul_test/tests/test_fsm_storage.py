@@ -0,0 +1,148 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+from unittest.mock import patch
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import DefaultKeyBuilder, StorageKey
+
+from telegram_bot.ai_service.fsm_storage import CachedStorage, SQLiteStorage, create_fsm_storage
+
+
+class UserStates(StatesGroup):
+    choosing_issue = State()
+    in_dialogue = State()
+
+
+def make_key(user_id=42):
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+class TestSQLiteStorage(unittest.IsolatedAsyncioTestCase):
+    """Тесты для хранилища состояний FSM в SQLite"""
+
+    def setUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        self.test_dir = tempfile.mkdtemp()
+
+        import telegram_bot.ai_service.database as database_module
+        self.db = database_module
+        self.original_db_path = database_module.DATABASE_PATH
+        database_module.DATABASE_PATH = os.path.join(self.test_dir, 'test_dialogues.db')
+        database_module.init_db()
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.db.close_pool()
+        self.db.DATABASE_PATH = self.original_db_path
+        shutil.rmtree(self.test_dir)
+
+    def count_rows(self):
+        conn = self.db.get_db_connection()
+        count = conn.execute("SELECT COUNT(*) FROM fsm_states").fetchone()[0]
+        conn.close()
+        return count
+
+    async def test_state_survives_restart(self):
+        """Тест сохранения состояния и данных после перезапуска и объединения записей"""
+        storage = SQLiteStorage(flush_interval=60)
+        await storage.set_state(make_key(), UserStates.choosing_issue)
+        await storage.set_data(make_key(), {'issue_id': '2'})
+        await storage.set_state(make_key(), UserStates.in_dialogue)
+        await storage.set_state(make_key(43), UserStates.choosing_issue)
+
+        # До записи изменения видны из памяти, в базе их еще нет
+        self.assertEqual(await storage.get_state(make_key()), UserStates.in_dialogue.state)
+        self.assertEqual(self.count_rows(), 0)
+        await storage.close()
+        self.assertEqual((storage.writes, storage.flushes), (4, 1))
+
+        restarted = create_fsm_storage(f"sqlite:///{self.db.DATABASE_PATH}")
+        self.assertEqual(await restarted.get_state(make_key()), UserStates.in_dialogue.state)
+        self.assertEqual(await restarted.get_data(make_key()), {'issue_id': '2'})
+        self.assertEqual(await restarted.get_data(make_key(43)), {})
+        self.assertIsNone(await restarted.get_state(make_key(44)))
+        await restarted.close()
+
+    async def test_reads_served_from_cache(self):
+        """Тест чтения состояния из кэша без обращения к базе"""
+        storage = CachedStorage(SQLiteStorage(flush_interval=0))
+        await storage.set_state(make_key(), UserStates.choosing_issue)
+        await storage.set_data(make_key(), {'issue_id': '1'})
+        # Запись сквозная: строка появляется в базе сразу
+        self.assertEqual(self.count_rows(), 1)
+
+        with patch.object(SQLiteStorage, '_load', side_effect=AssertionError("database read")):
+            self.assertEqual(await storage.get_state(make_key()), UserStates.choosing_issue.state)
+            data = await storage.get_data(make_key())
+            data['issue_id'] = '3'
+            self.assertEqual(await storage.get_data(make_key()), {'issue_id': '1'})
+
+        # Состояние другого пользователя читается из базы один раз, в том числе пустое
+        self.assertIsNone(await storage.get_state(make_key(43)))
+        with patch.object(SQLiteStorage, '_load', side_effect=AssertionError("database read")):
+            self.assertIsNone(await storage.get_state(make_key(43)))
+        await storage.close()
+
+    async def test_clear_removes_row(self):
+        """Тест удаления строки при сбросе состояния и ключей с destiny"""
+        storage = create_fsm_storage(f"sqlite:///{self.db.DATABASE_PATH}")
+        other_destiny = StorageKey(bot_id=1, chat_id=42, user_id=42, destiny='books')
+        await storage.set_state(make_key(), UserStates.in_dialogue)
+        await storage.set_state(other_destiny, UserStates.choosing_issue)
+        await storage.close()
+        self.assertEqual(self.count_rows(), 2)
+
+        await storage.set_state(make_key(), None)
+        await storage.set_data(make_key(), {})
+        await storage.close()
+        self.assertEqual(self.count_rows(), 1)
+        self.assertEqual(await storage.get_state(other_destiny), UserStates.choosing_issue.state)
+
+        with self.assertRaises(ValueError):
+            create_fsm_storage('ftp://localhost')
+
+
+class TestRedisFSMStorage(unittest.IsolatedAsyncioTestCase):
+    """
+    Тесты хранения состояний FSM по протоколу Redis
+
+    Используют сервер из REDIS_TEST_URL, а если он не задан - fakeredis.
+    """
+
+    async def asyncSetUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        url = os.getenv('REDIS_TEST_URL')
+        if url:
+            self.storage = create_fsm_storage(url)
+        else:
+            try:
+                from fakeredis.aioredis import FakeRedis
+                from aiogram.fsm.storage.redis import RedisStorage
+            except ImportError:
+                self.skipTest("REDIS_TEST_URL is not set and redis/fakeredis are not installed")
+            key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+            self.storage = CachedStorage(RedisStorage(FakeRedis(), key_builder=key_builder))
+
+    async def asyncTearDown(self):
+        """Очистка после каждого теста"""
+        await self.storage.storage.redis.flushdb()
+        await self.storage.close()
+
+    async def test_state_round_trip(self):
+        """Тест записи состояния в Redis и чтения после сброса кэша"""
+        await self.storage.set_state(make_key(), UserStates.in_dialogue)
+        await self.storage.set_data(make_key(), {'issue_id': '2'})
+
+        restarted = CachedStorage(self.storage.storage)
+        self.assertEqual(await restarted.get_state(make_key()), UserStates.in_dialogue.state)
+        self.assertEqual(await restarted.get_data(make_key()), {'issue_id': '2'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import asyncio
+import os
+import sys
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from telegram_bot.ai_service.mailbox import Mailbox
+
+
+class TestMailbox(unittest.IsolatedAsyncioTestCase):
+    """Тесты для модуля mailbox.py"""
+
+    async def test_turns_serialized_per_key(self):
+        """Тест последовательной обработки ходов одного пользователя и параллельной - разных"""
+        running = set()
+        overlaps = []
+        started = asyncio.Event()
+
+        async def handler(key, items):
+            overlaps.append(sorted(running))
+            running.add(key)
+            started.set()
+            await asyncio.sleep(0.01)
+            running.discard(key)
+
+        mailbox = Mailbox('test', handler)
+        results = await asyncio.gather(mailbox.submit('a', 1), mailbox.submit('a', 2), mailbox.submit('b', 3))
+
+        self.assertEqual(results, [True, False, True])
+        # Ход 'b' начался во время хода 'a', второй ход 'a' - только после первого
+        self.assertEqual(overlaps, [[], ['a'], ['b']])
+        self.assertEqual(mailbox.stats()['busy'], 0)
+
+    async def test_burst_merged_into_one_turn(self):
+        """Тест объединения сообщений, пришедших во время хода, в один следующий ход"""
+        batches = []
+        release = asyncio.Event()
+
+        async def handler(key, items):
+            batches.append(list(items))
+            if len(batches) == 1:
+                await release.wait()
+
+        mailbox = Mailbox('test', handler)
+        first = asyncio.create_task(mailbox.submit('42', "Привет"))
+        await asyncio.sleep(0)
+        self.assertTrue(mailbox.is_busy('42'))
+        for text in ("Мне плохо", "Не могу спать"):
+            self.assertFalse(await mailbox.submit('42', text))
+        self.assertEqual(mailbox.queued('42'), 2)
+
+        release.set()
+        self.assertTrue(await first)
+        self.assertEqual(batches, [["Привет"], ["Мне плохо", "Не могу спать"]])
+        stats = mailbox.stats()
+        self.assertEqual((stats['turns'], stats['merged']), (2, 1))
+        self.assertFalse(mailbox.is_busy('42'))
+
+    async def test_failed_turn_keeps_queue(self):
+        """Тест обработки накопленных сообщений после ошибки в ходе"""
+        batches = []
+
+        async def handler(key, items):
+            batches.append(list(items))
+            if len(batches) == 1:
+                await asyncio.sleep(0.01)
+                raise RuntimeError("LLM недоступна")
+
+        mailbox = Mailbox('test', handler)
+        await asyncio.gather(mailbox.submit('42', 1), mailbox.submit('42', 2))
+
+        self.assertEqual(batches, [[1], [2]])
+        self.assertEqual(mailbox.stats()['failures'], 1)
+        # После ошибки новые сообщения снова начинают ход
+        self.assertTrue(await mailbox.submit('42', 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
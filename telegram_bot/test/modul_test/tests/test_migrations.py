@@ -0,0 +1,89 @@
+import unittest
+import os
+import sqlite3
+import sys
+import tempfile
+import shutil
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from telegram_bot.ai_service.migrations import (
+    LATEST_VERSION,
+    get_schema_version,
+    migrate
+)
+
+class TestMigrations(unittest.TestCase):
+    """Тесты для модуля migrations.py"""
+
+    def setUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, 'test_dialogues.db')
+        self.conn = sqlite3.connect(self.db_path)
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.conn.close()
+        shutil.rmtree(self.test_dir)
+
+    def test_migrate_sets_user_version(self):
+        """Тест применения всех миграций к пустой базе"""
+        self.assertEqual(get_schema_version(self.conn), 0)
+
+        version = migrate(self.conn)
+
+        self.assertEqual(version, LATEST_VERSION)
+        self.assertEqual(get_schema_version(self.conn), LATEST_VERSION)
+
+    def test_migrate_is_idempotent(self):
+        """Тест повторного запуска миграций"""
+        migrate(self.conn)
+        version = migrate(self.conn)
+
+        self.assertEqual(version, LATEST_VERSION)
+
+    def test_migrate_existing_database(self):
+        """Тест миграции базы, созданной до появления версий схемы"""
+        # Старая схема без индексов и с user_version = 0
+        self.conn.execute('''
+            CREATE TABLE dialogues (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                issue_id TEXT NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                dialogue_json TEXT NOT NULL
+            )
+        ''')
+        self.conn.execute("INSERT INTO dialogues (user_id, issue_id, dialogue_json) VALUES ('u', '1', '[]')")
+        self.conn.commit()
+
+        migrate(self.conn)
+
+        # Данные сохранились
+        count = self.conn.execute("SELECT COUNT(*) FROM dialogues").fetchone()[0]
+        self.assertEqual(count, 1)
+
+    def test_user_lookup_uses_index(self):
+        """Тест использования индексов при выборке по user_id"""
+        migrate(self.conn)
+
+        plan = self.conn.execute('''
+            EXPLAIN QUERY PLAN
+            SELECT * FROM dialogues WHERE user_id = ? ORDER BY timestamp DESC
+        ''', ('test_user',)).fetchall()
+        plan_text = " ".join(str(row[-1]) for row in plan)
+        self.assertIn("idx_dialogues_user_timestamp", plan_text)
+        self.assertNotIn("TEMP B-TREE", plan_text)
+
+        plan = self.conn.execute('''
+            EXPLAIN QUERY PLAN
+            SELECT * FROM book_recommendations WHERE dialogue_id = ?
+        ''', (1,)).fetchall()
+        plan_text = " ".join(str(row[-1]) for row in plan)
+        self.assertIn("idx_book_recommendations_dialogue_id", plan_text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import unittest
+import asyncio
+import os
+import sys
+import time
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
+
+from telegram_bot.ai_service import outbox as outbox_module
+from telegram_bot.ai_service.outbox import Outbox, split_message
+
+
+class RecordingBot:
+    """Бот, записывающий отправленные сообщения; первые flood_errors отправок получают RetryAfter"""
+
+    def __init__(self, flood_errors=0, retry_after=1):
+        self.sent = []
+        self.arguments = []
+        self.flood_errors = flood_errors
+        self.retry_after = retry_after
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.flood_errors:
+            self.flood_errors -= 1
+            raise TelegramRetryAfter(method=SendMessage(chat_id=chat_id, text=text),
+                                     message="Too Many Requests", retry_after=self.retry_after)
+        self.sent.append((time.monotonic(), chat_id, text, kwargs.get('reply_markup')))
+        self.arguments.append(kwargs)
+        return len(self.sent)
+
+
+class TestOutbox(unittest.IsolatedAsyncioTestCase):
+    """Тесты для модуля outbox.py"""
+
+    def setUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        self.original_limits = (outbox_module.OUTBOX_CHAT_RATE, outbox_module.OUTBOX_CHAT_BURST)
+        outbox_module.OUTBOX_CHAT_RATE = 20
+        outbox_module.OUTBOX_CHAT_BURST = 1
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        outbox_module.OUTBOX_CHAT_RATE, outbox_module.OUTBOX_CHAT_BURST = self.original_limits
+
+    def test_split_message(self):
+        """Тест деления длинного текста по границам предложений"""
+        self.assertEqual(split_message("Короткий ответ."), ["Короткий ответ."])
+
+        text = "Первое предложение. Второе, подлиннее! Третье?\nНовая строка без точки"
+        parts = split_message(text, 40)
+        self.assertEqual(parts, ["Первое предложение. Второе, подлиннее!", "Третье?\nНовая строка без точки"])
+
+        # Слишком длинное предложение делится по словам, слишком длинное слово - где угодно
+        parts = split_message("слово " * 20 + "x" * 50, 40)
+        self.assertTrue(all(len(part) <= 40 for part in parts))
+        self.assertEqual("".join(parts).replace(" ", ""), "слово" * 20 + "x" * 50)
+
+    async def test_rate_limits_and_markup(self):
+        """Тест соблюдения лимита чата с сохранением порядка и кнопки у последней части"""
+        outbox = Outbox(global_rate=1000, global_burst=1000)
+        bot = RecordingBot()
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="Да", callback_data="yes")]])
+        original_limit = outbox_module.MAX_MESSAGE_LENGTH
+        outbox_module.MAX_MESSAGE_LENGTH = 20
+        try:
+            await asyncio.gather(
+                outbox.send(bot, 1, "Первая часть. Вторая часть.", reply_markup=keyboard),
+                outbox.send(bot, 1, "Следующее."),
+                outbox.send(bot, 2, "Другой чат."),
+            )
+        finally:
+            outbox_module.MAX_MESSAGE_LENGTH = original_limit
+
+        chat_1 = [record for record in bot.sent if record[1] == 1]
+        self.assertEqual([record[2] for record in chat_1], ["Первая часть.", "Вторая часть.", "Следующее."])
+        self.assertEqual([record[3] for record in chat_1], [None, keyboard, None])
+        # 20 сообщений в секунду без всплеска: между отправками в один чат не меньше 0.05 с
+        gaps = [later[0] - earlier[0] for earlier, later in zip(chat_1, chat_1[1:])]
+        self.assertTrue(all(gap >= 0.04 for gap in gaps), gaps)
+        # Другой чат не ждет очереди первого
+        self.assertLess(next(record for record in bot.sent if record[1] == 2)[0], chat_1[1][0])
+        self.assertEqual(outbox.stats()['sent'], 4)
+        self.assertEqual(outbox.stats()['split'], 1)
+
+    async def test_retry_after(self):
+        """Тест повторной отправки после RetryAfter и отказа после исчерпания попыток"""
+        outbox = Outbox(max_retries=2)
+        bot = RecordingBot(flood_errors=1, retry_after=0.1)
+        started = time.monotonic()
+        self.assertEqual(await outbox.send(bot, 1, "Текст"), [1])
+        self.assertGreaterEqual(bot.sent[0][0] - started, 0.1)
+        self.assertEqual(outbox.stats()['retries'], 1)
+
+
+        bot = RecordingBot(flood_errors=3, retry_after=0.01)
+        with self.assertRaises(TelegramRetryAfter):
+            await outbox.send(bot, 2, "Текст")
+        stats = outbox.stats()
+        self.assertEqual((stats['retries'], stats['failed'], stats['sent']), (3, 1, 1))
+
+        # Ограничение может действовать на весь бот: другой чат тоже ждет
+        outbox = Outbox()
+        bot = RecordingBot(flood_errors=1, retry_after=0.1)
+        started = time.monotonic()
+        flooded = asyncio.create_task(outbox.send(bot, 3, "Текст"))
+        await asyncio.sleep(0.01)
+        await outbox.send(bot, 4, "Текст")
+        await flooded
+        self.assertTrue(all(record[0] - started >= 0.1 for record in bot.sent), bot.sent)
+        self.assertEqual(sorted(record[1] for record in bot.sent), [3, 4])
+
+    async def test_answer_keeps_topic(self):
+        """Тест ответа в ту же тему форума и то же бизнес-подключение, что и message.answer()"""
+        outbox = Outbox(global_rate=1000, global_burst=1000)
+        bot = RecordingBot()
+        message = Message.model_validate({
+            'message_id': 1,
+            'date': 0,
+            'chat': {'id': -100, 'type': 'supergroup', 'is_forum': True},
+            'message_thread_id': 7,
+            'is_topic_message': True,
+            'business_connection_id': 'connection',
+            'text': 'Вопрос',
+        }, context={'bot': bot})
+
+        await outbox.answer(message, "Ответ в теме")
+        await outbox.answer(message, "Ответ в общей теме", message_thread_id=None)
+        self.assertEqual([(arguments['message_thread_id'], arguments['business_connection_id'])
+                          for arguments in bot.arguments], [(7, 'connection'), (None, 'connection')])
+
+        # Ответ на обычное сообщение, как и message.answer(), отправляется без темы
+        message = Message.model_validate({
+            'message_id': 2,
+            'date': 0,
+            'chat': {'id': 42, 'type': 'private'},
+            'text': 'Привет',
+        }, context={'bot': bot})
+        await outbox.answer(message, "Ответ")
+        self.assertEqual((bot.arguments[-1]['message_thread_id'], bot.arguments[-1]['business_connection_id']),
+                         (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import asyncio
+import os
+import sys
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from telegram_bot.ai_service.prefetch import Prefetcher
+
+
+class TestPrefetch(unittest.IsolatedAsyncioTestCase):
+    """Тесты для модуля prefetch.py"""
+
+    async def asyncSetUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        self.calls = []
+        self.release = asyncio.Event()
+
+    async def fetch(self, user_id, messages):
+        self.calls.append((user_id, len(messages)))
+        await self.release.wait()
+        if messages and messages[-1] == 'ошибка':
+            raise RuntimeError("AI недоступен")
+        return {"books": [{"title": f"Книга после {len(messages)} сообщений"}]}
+
+    async def test_prefetched_result(self):
+        """Тест выдачи подготовленного результата для той же версии диалога один раз"""
+        prefetcher = Prefetcher('test')
+        messages = ['привет', 'ответ', 'мне грустно']
+        prefetcher.start('user_1', 3, self.fetch, 'user_1', messages)
+        prefetcher.start('user_1', 3, self.fetch, 'user_1', messages)
+        self.assertEqual(prefetcher.stats()['running'], 1)
+
+        # Задача выдается еще до завершения расчета
+        task = prefetcher.take('user_1', 3)
+        self.assertIsNotNone(task)
+        self.release.set()
+        self.assertEqual(await task, {"books": [{"title": "Книга после 3 сообщений"}]})
+        self.assertIsNone(prefetcher.take('user_1', 3))
+        self.assertEqual(self.calls, [('user_1', 3)])
+        stats = prefetcher.stats()
+        self.assertEqual((stats['started'], stats['hits'], stats['misses']), (1, 1, 1))
+
+    async def test_stale_results_dropped(self):
+        """Тест отбрасывания результата, если диалог продвинулся"""
+        prefetcher = Prefetcher('test')
+        self.release.set()
+        prefetcher.start('user_1', 3, self.fetch, 'user_1', ['a', 'b', 'c'])
+        await asyncio.sleep(0)
+        self.assertIsNone(prefetcher.take('user_1', 5))
+
+        prefetcher.start('user_1', 3, self.fetch, 'user_1', ['a', 'b', 'c'])
+        prefetcher.start('user_1', 5, self.fetch, 'user_1', ['a', 'b', 'c', 'd', 'e'])
+        self.assertIsNone(prefetcher.take('user_1', 3))
+
+        prefetcher.start('user_1', 5, self.fetch, 'user_1', ['a', 'b', 'c', 'd', 'e'])
+        prefetcher.invalidate('user_1')
+        self.assertIsNone(prefetcher.take('user_1', 5))
+        self.assertEqual(prefetcher.stats()['stale'], 4)
+
+    async def test_failures_and_limits(self):
+        """Тест неудачного расчета, срока хранения и ограничения числа результатов"""
+        prefetcher = Prefetcher('test', max_entries=2)
+        self.release.set()
+        prefetcher.start('user_1', 1, self.fetch, 'user_1', ['ошибка'])
+        await asyncio.sleep(0.01)
+        self.assertIsNone(prefetcher.take('user_1', 1))
+        self.assertEqual(prefetcher.stats()['failures'], 1)
+
+        for user_id in ('user_1', 'user_2', 'user_3'):
+            prefetcher.start(user_id, 1, self.fetch, user_id, ['a'])
+        self.assertEqual(prefetcher.stats()['entries'], 2)
+        self.assertIsNone(prefetcher.take('user_1', 1))
+        self.assertIsNotNone(prefetcher.take('user_3', 1))
+
+        expiring = Prefetcher('test', ttl_seconds=0)
+        expiring.start('user_1', 1, self.fetch, 'user_1', ['a'])
+        await asyncio.sleep(0.01)
+        self.assertIsNone(expiring.take('user_1', 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,27 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../.
 from telegram_bot.test.modul_test.tests.test_database import TestDatabase
 from telegram_bot.test.modul_test.tests.test_dialogue import TestDialogue
 from telegram_bot.test.modul_test.tests.test_books import TestBooks
+from telegram_bot.test.modul_test.tests.test_migrations import TestMigrations
+from telegram_bot.test.modul_test.tests.test_compression import TestCompression
+from telegram_bot.test.modul_test.tests.test_archive import TestArchive
+from telegram_bot.test.modul_test.tests.test_search import TestSearch
+from telegram_bot.test.modul_test.tests.test_storage import TestStorage
+from telegram_bot.test.modul_test.tests.test_backends import TestSQLiteBackend, TestMongoBackend
+from telegram_bot.test.modul_test.tests.test_analytics import TestAnalytics
+from telegram_bot.test.modul_test.tests.test_export import TestExport
+from telegram_bot.test.modul_test.tests.test_bulk_load import TestBulkLoad
+from telegram_bot.test.modul_test.tests.test_cache import TestCache
+from telegram_bot.test.modul_test.tests.test_catalog import TestCatalog
+from telegram_bot.test.modul_test.tests.test_sharding import TestSharding
+from telegram_bot.test.modul_test.tests.test_sessions import TestSessions
+from telegram_bot.test.modul_test.tests.test_fsm_storage import TestSQLiteStorage, TestRedisFSMStorage
+from telegram_bot.test.modul_test.tests.test_mailbox import TestMailbox
+from telegram_bot.test.modul_test.tests.test_webhook import TestWebhook
+from telegram_bot.test.modul_test.tests.test_workers import TestWorkers
+from telegram_bot.test.modul_test.tests.test_admission import TestAdmission
+from telegram_bot.test.modul_test.tests.test_shutdown import TestShutdown
+from telegram_bot.test.modul_test.tests.test_outbox import TestOutbox
+from telegram_bot.test.modul_test.tests.test_prefetch import TestPrefetch
 from telegram_bot.test.modul_test.tests.test_reporter import HTMLTestRunner
 
 if __name__ == '__main__':
@@ -29,6 +50,29 @@ if __name__ == '__main__':
     test_suite.addTests(loader.loadTestsFromTestCase(TestDatabase))
     test_suite.addTests(loader.loadTestsFromTestCase(TestDialogue))
     test_suite.addTests(loader.loadTestsFromTestCase(TestBooks))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestMigrations))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestCompression))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestArchive))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestSearch))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestStorage))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestSQLiteBackend))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestMongoBackend))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestAnalytics))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestExport))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestBulkLoad))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestCache))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestCatalog))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestSharding))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestSessions))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestSQLiteStorage))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestRedisFSMStorage))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestMailbox))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestWebhook))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestWorkers))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestAdmission))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestShutdown))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestOutbox))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestPrefetch))
     
     # Создаем и настраиваем раннер с HTML-отчетом
     runner = HTMLTestRunner(
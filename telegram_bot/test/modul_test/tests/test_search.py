@@ -0,0 +1,106 @@
+import unittest
+import os
+import sqlite3
+import sys
+import tempfile
+import shutil
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from telegram_bot.ai_service.search import (
+    build_match_query,
+    search_dialogues,
+    rebuild_index
+)
+from telegram_bot.ai_service.migrations import migrate
+
+class TestSearch(unittest.TestCase):
+    """Тесты для модуля search.py"""
+
+    def setUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        self.test_dir = tempfile.mkdtemp()
+
+        import telegram_bot.ai_service.database as database_module
+        self.db = database_module
+        self.original_db_path = database_module.DATABASE_PATH
+        database_module.DATABASE_PATH = os.path.join(self.test_dir, 'test_dialogues.db')
+        database_module.init_db()
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.db.close_pool()
+        self.db.DATABASE_PATH = self.original_db_path
+        shutil.rmtree(self.test_dir)
+
+    def test_build_match_query(self):
+        """Тест построения запроса с учетом русских словоформ"""
+        self.assertEqual(build_match_query("Тревогу"), '"тревог"*')
+        self.assertEqual(build_match_query("ёлка, работе!"), '"елк"* "работ"*')
+        self.assertIsNone(build_match_query("  ?! "))
+
+    def test_search_dialogues(self):
+        """Тест поиска диалогов по содержимому сообщений"""
+        system = {"role": "system", "content": "Системный промпт про тревогу"}
+        anxiety_id = self.db.log_dialogue('user_1', '1', [
+            system,
+            {"role": "user", "content": "Меня мучает тревога перед сном"}
+        ])
+        work_id = self.db.log_dialogue('user_2', '2', [
+            system,
+            {"role": "user", "content": "На работе постоянные тревоги и дедлайны"}
+        ])
+        self.db.log_dialogue('user_3', '3', [system, {"role": "user", "content": "Поссорились с партнером"}])
+
+        # Разные словоформы находятся, системный промпт не индексируется
+        results = search_dialogues("тревогу")
+        self.assertEqual({r['dialogue_id'] for r in results}, {anxiety_id, work_id})
+        self.assertTrue(all('[' in r['snippet'] for r in results))
+
+        # Все слова запроса должны присутствовать
+        results = search_dialogues("тревога работа")
+        self.assertEqual([r['dialogue_id'] for r in results], [work_id])
+
+        # Фильтр по пользователю
+        results = search_dialogues("тревога", user_id='user_1')
+        self.assertEqual([r['dialogue_id'] for r in results], [anxiety_id])
+
+    def test_one_result_per_conversation(self):
+        """Тест одного результата на разговор, записанный после каждого хода"""
+        history = [{"role": "system", "content": "Ты - психолог"}, {"role": "assistant", "content": "Здравствуйте"}]
+        snapshot_ids = []
+        for turn in range(4):
+            history = history + [{"role": "user", "content": f"Бессонница, ход {turn}"},
+                                 {"role": "assistant", "content": "Понимаю"}]
+            snapshot_ids.append(self.db.log_dialogue('user_1', '1', history))
+        other_id = self.db.log_dialogue('user_2', '1', [{"role": "user", "content": "Бессонница"}])
+
+        results = search_dialogues("бессонница")
+        self.assertEqual(len(results), 2)
+        self.assertEqual({r['user_id'] for r in results}, {'user_1', 'user_2'})
+        self.assertIn(other_id, {r['dialogue_id'] for r in results})
+        self.assertIn(next(r['dialogue_id'] for r in results if r['user_id'] == 'user_1'), snapshot_ids)
+        # Все записи остаются в индексе: текст первого хода находится
+        self.assertEqual(len(search_dialogues("ход 0", include_archived=True)), 1)
+
+    def test_migration_indexes_existing_rows(self):
+        """Тест заполнения индекса для записей, созданных до его появления"""
+        conn = sqlite3.connect(os.path.join(self.test_dir, 'legacy.db'))
+        migrate(conn, target_version=4)
+        conn.execute("INSERT INTO dialogues (user_id, issue_id, dialogue_json) VALUES (?, ?, ?)",
+                     ('user_1', '1', '[{"role": "user", "content": "Бессонница и усталость"}]'))
+        conn.commit()
+
+        migrate(conn)
+        count = conn.execute("SELECT COUNT(*) FROM dialogue_fts WHERE dialogue_fts MATCH ?",
+                             (build_match_query("бессонницу"),)).fetchone()[0]
+        self.assertEqual(count, 1)
+
+        # Полная перестройка индекса дает тот же результат
+        self.assertEqual(rebuild_index(conn, os.path.join(self.test_dir, 'legacy.db')), 1)
+        conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+import asyncio
+import threading
+import os
+import sys
+import tempfile
+import shutil
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from telegram_bot.ai_service.sessions import SessionStore, estimate_size, load_dialogue_session
+
+
+def make_session(issue_id='1'):
+    return {'dialogue_id': 'dialogue', 'issue_id': issue_id, 'messages': []}
+
+
+class TestSessions(unittest.TestCase):
+    """Тесты для модуля sessions.py"""
+
+    def test_dict_access(self):
+        """Тест использования хранилища как словаря активных диалогов"""
+        sessions = SessionStore('test')
+        sessions['42'] = make_session()
+
+        self.assertIn('42', sessions)
+        self.assertNotIn('43', sessions)
+        sessions['42']['messages'].append({"role": "user", "content": "Привет"})
+        self.assertEqual(sessions['42']['messages'], [{"role": "user", "content": "Привет"}])
+        self.assertIsNone(sessions.get('43'))
+        with self.assertRaises(KeyError):
+            sessions['43']
+
+        del sessions['42']
+        self.assertEqual(len(sessions), 0)
+        self.assertEqual(sessions.stats()['bytes'], 0)
+
+    def test_lru_and_idle_ttl(self):
+        """Тест вытеснения давно неиспользуемых сессий и удаления по времени простоя"""
+        sessions = SessionStore('test', max_entries=2, idle_ttl_seconds=60)
+        with patch('telegram_bot.ai_service.sessions.time.monotonic', return_value=100.0):
+            sessions['a'] = make_session()
+            sessions['b'] = make_session()
+            sessions.get('a')
+            sessions['c'] = make_session()
+            # 'b' использовалась давнее всех
+            self.assertEqual(sorted(sessions), ['a', 'c'])
+        with patch('telegram_bot.ai_service.sessions.time.monotonic', return_value=150.0):
+            sessions.get('c')
+        with patch('telegram_bot.ai_service.sessions.time.monotonic', return_value=170.0):
+            self.assertEqual(list(sessions), ['c'])
+            stats = sessions.stats()
+        self.assertEqual((stats['evictions'], stats['expirations']), (1, 1))
+
+    def test_byte_limit_tracks_growth(self):
+        """Тест учета памяти сессии, которая растет после выдачи из хранилища"""
+        empty_size = estimate_size(make_session())
+        sessions = SessionStore('test', max_bytes=empty_size * 3)
+        sessions['old'] = make_session()
+        sessions['new'] = make_session()
+        self.assertEqual(sessions.stats()['bytes'], empty_size * 2)
+
+        # Сообщения добавляются в список на месте, как в handle_dialogue
+        messages = sessions['new']['messages']
+        for index in range(20):
+            messages.append({"role": "user", "content": f"Сообщение {index}"})
+
+        # Растущая сессия вытесняет старую, но сама остается, даже превысив лимит
+        stats = sessions.stats()
+        self.assertEqual(list(sessions), ['new'])
+        self.assertEqual(stats['bytes'], estimate_size(sessions['new']))
+        self.assertGreater(stats['bytes'], empty_size * 3)
+        self.assertEqual(stats['evictions'], 1)
+
+    def test_loader_on_miss(self):
+        """Тест восстановления отсутствующей сессии через загрузчик"""
+        loaded = []
+
+        def loader(key):
+            loaded.append(key)
+            return make_session('2') if key == 'known' else None
+
+        sessions = SessionStore('test', loader=loader)
+        self.assertNotIn('known', sessions)
+        self.assertEqual(sessions['known']['issue_id'], '2')
+        sessions['known']['messages'].append({"role": "user", "content": "Снова здесь"})
+        self.assertEqual(len(sessions.get('known')['messages']), 1)
+        self.assertIsNone(sessions.get('unknown'))
+
+        self.assertEqual(loaded, ['known', 'unknown'])
+        self.assertEqual(sessions.stats()['loads'], 1)
+
+    def test_async_loader_runs_in_thread(self):
+        """Тест восстановления сессии в отдельном потоке, не блокируя цикл событий"""
+        threads = []
+
+        def loader(key):
+            threads.append(threading.get_ident())
+            return make_session('3') if key == 'known' else None
+
+        sessions = SessionStore('test', loader=loader)
+
+        async def scenario():
+            restored = await sessions.get_async('known')
+            cached = await sessions.get_async('known')
+            return restored, cached, await sessions.get_async('unknown', 'нет')
+
+        restored, cached, unknown = asyncio.run(scenario())
+        self.assertIs(restored, cached)
+        self.assertEqual(restored['issue_id'], '3')
+        self.assertEqual(unknown, 'нет')
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.get_ident(), threads)
+        self.assertEqual((sessions.stats()['hits'], sessions.stats()['loads']), (1, 1))
+
+    def test_rehydrate_from_database(self):
+        """Тест восстановления сессии из последнего сохраненного диалога пользователя"""
+        import telegram_bot.ai_service.database as db
+        test_dir = tempfile.mkdtemp()
+        original_db_path = db.DATABASE_PATH
+        db.DATABASE_PATH = os.path.join(test_dir, 'test_dialogues.db')
+        db.init_db()
+        try:
+            prompts = [{"role": "system", "content": "Ты - психолог"}, {"role": "assistant", "content": "Здравствуйте"}]
+            db.log_dialogue('42', '2', prompts)
+            # Так бот сохраняет каждый ответ: промпты, последние сообщения и ответ
+            conversation = [{"role": "user", "content": "Устал на работе"}, {"role": "assistant", "content": "Расскажите"}]
+            dialogue_id = db.log_dialogue('42', '2', prompts + conversation)
+
+            session = load_dialogue_session(42)
+            self.assertEqual(session, {'dialogue_id': dialogue_id, 'issue_id': '2', 'messages': conversation})
+            # Восстановленная сессия не разделяет список сообщений с кэшем базы
+            session['messages'].append({"role": "user", "content": "Еще"})
+            self.assertEqual(len(db.get_dialogue_by_id(dialogue_id)['dialogue_json']), 4)
+            self.assertIsNone(load_dialogue_session('43'))
+
+            # Время с долями секунды или в формате ISO тоже читается; нечитаемое считается устаревшим
+            now = datetime.now(timezone.utc)
+            for timestamp, restored in ((now.strftime('%Y-%m-%d %H:%M:%S.%f'), True),
+                                        (now.strftime('%Y-%m-%dT%H:%M:%SZ'), True),
+                                        ('2020-01-01 00:00:00', False),
+                                        ('вчера', False)):
+                conn = db.get_db_connection()
+                conn.execute("UPDATE dialogues SET timestamp = ?", (timestamp,))
+                conn.commit()
+                conn.close()
+                self.assertEqual(load_dialogue_session('42') is not None, restored, timestamp)
+        finally:
+            db.close_pool()
+            db.DATABASE_PATH = original_db_path
+            shutil.rmtree(test_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+from contextlib import redirect_stdout
+from datetime import datetime
+from io import StringIO
+from unittest import mock
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from telegram_bot.ai_service import sharding, storage
+from telegram_bot.ai_service import analytics, catalog, search
+from telegram_bot.ai_service import export as export_module
+from telegram_bot.ai_service.analytics import get_issue_totals
+from telegram_bot.ai_service.archive import archive_old_dialogues, get_archive_path
+from telegram_bot.ai_service.bulk_load import bulk_load_dialogues
+from telegram_bot.ai_service.catalog import get_top_items
+from telegram_bot.ai_service.search import search_dialogues
+
+# ID пользователей Telegram в виде строк, как их записывает бот
+USERS = [str(1000 + index) for index in range(12)]
+
+
+def make_dialogue(text):
+    return [{"role": "system", "content": "Ты - психолог"}, {"role": "user", "content": text}]
+
+
+class TestSharding(unittest.TestCase):
+    """Тесты для модуля sharding.py"""
+
+    def setUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        self.test_dir = tempfile.mkdtemp()
+
+        import telegram_bot.ai_service.database as database_module
+        self.db = database_module
+        self.original_db_path = database_module.DATABASE_PATH
+        self.original_shard_count = sharding.SHARD_COUNT
+        database_module.DATABASE_PATH = os.path.join(self.test_dir, 'test_dialogues.db')
+        database_module.init_db()
+        sharding.SHARD_COUNT = 4
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        sharding.SHARD_COUNT = self.original_shard_count
+        self.db.close_pool()
+        self.db.DATABASE_PATH = self.original_db_path
+        shutil.rmtree(self.test_dir)
+
+    def test_writes_routed_by_user(self):
+        """Тест записи диалогов в шард пользователя и чтения по ID и по пользователю"""
+        dialogue_ids = {user_id: self.db.log_dialogue(user_id, '1', make_dialogue(user_id)) for user_id in USERS}
+
+        # Пользователи распределены больше чем по одному файлу
+        self.assertGreater(len({sharding.shard_index(user_id) for user_id in USERS}), 1)
+        self.assertEqual(len([name for name in os.listdir(sharding.get_shard_dir()) if name.endswith('.db')]), 3)
+        for user_id, dialogue_id in dialogue_ids.items():
+            self.assertEqual(dialogue_id // sharding.SHARD_ID_SPAN, sharding.shard_index(user_id))
+            self.assertEqual(self.db.get_dialogue_by_id(dialogue_id)['user_id'], user_id)
+            dialogues = self.db.get_user_dialogues(user_id)
+            self.assertEqual([record['id'] for record in dialogues], [dialogue_id])
+
+    def test_bulk_and_recommendations(self):
+        """Тест пакетной записи в несколько шардов и рекомендаций из каталога шарда"""
+        original_catalog_only = self.db.RECOMMENDATIONS_CATALOG_ONLY
+        self.db.RECOMMENDATIONS_CATALOG_ONLY = True
+        try:
+            dialogue_ids = self.db.log_dialogues_bulk([(user_id, '2', make_dialogue(user_id)) for user_id in USERS])
+            for user_id, dialogue_id in zip(USERS, dialogue_ids):
+                self.assertEqual(self.db.get_dialogue_by_id(dialogue_id)['dialogue_json'], make_dialogue(user_id))
+                self.db.log_book_recommendations(user_id, '2', {"books": [{"title": "Книга", "author": user_id}]},
+                                                 dialogue_id)
+        finally:
+            self.db.RECOMMENDATIONS_CATALOG_ONLY = original_catalog_only
+
+        for user_id in USERS:
+            recommendations = self.db.get_user_recommendations(user_id)
+            self.assertEqual(recommendations[0]['recommendations_json']['books'][0]['author'], user_id)
+
+    def test_fan_out_queries(self):
+        """Тест запросов по всем шардам: поиск, аналитика, каталог, экспорт и обратная связь"""
+        for user_id in USERS:
+            dialogue_id = self.db.log_dialogue(user_id, '3', make_dialogue("бессонница"))
+            self.db.log_book_recommendations(user_id, '3', {"books": [{"title": "Сон", "author": "Автор"}]},
+                                             dialogue_id)
+
+        self.assertEqual(len(search_dialogues("бессонница", limit=100)), len(USERS))
+        self.assertEqual(len(search_dialogues("бессонница", user_id=USERS[5])), 1)
+        totals = get_issue_totals()
+        self.assertEqual((totals[0]['dialogues'], totals[0]['recommendations']), (len(USERS), len(USERS)))
+        self.assertEqual([item['recommendations'] for item in get_top_items('book', issue_id='3')], [len(USERS)])
+
+        exported = [row['id'] for chunk in export_module.iter_export_rows('dialogues') for row in chunk]
+        self.assertEqual(len(exported), len(USERS))
+        self.assertEqual(exported, sorted(exported))
+
+        # Пользователь, чьи диалоги лежат не в основном файле
+        user_id = next(user_id for user_id in USERS if sharding.shard_index(user_id) != 0)
+        storage.save_feedback(int(user_id), 'Спасибо', datetime(2100, 1, 1))
+        feedback = storage.get_feedback_with_dialogues()
+        self.assertEqual(feedback[0]['dialogue_count'], 1)
+        self.assertEqual(feedback[0]['issue_id'], '3')
+
+    def test_bulk_load_and_archive(self):
+        """Тест пакетной загрузки в шарды пользователей и архивации всех шардов"""
+        records = [{'user_id': user_id, 'issue_id': '4', 'dialogue_json': make_dialogue("архив " + user_id),
+                    'timestamp': '2020-01-15 10:00:00'} for user_id in USERS]
+        self.assertEqual(bulk_load_dialogues(records, batch_size=5), len(USERS))
+        for user_id in USERS:
+            dialogues = self.db.get_user_dialogues(user_id)
+            self.assertEqual(len(dialogues), 1)
+            self.assertEqual(dialogues[0]['id'] // sharding.SHARD_ID_SPAN, sharding.shard_index(user_id))
+
+        self.assertEqual(archive_old_dialogues(retention_days=30), {'dialogues': len(USERS), 'book_recommendations': 0})
+        for path in sharding.get_database_paths():
+            with self.db.pooled_connection(path) as conn:
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM dialogues").fetchone()[0], 0)
+        # У каждого шарда свои архивы, месяцы разных шардов не смешиваются
+        archive_paths = {get_archive_path('2020_01', path) for path in sharding.get_database_paths()}
+        self.assertEqual(len(archive_paths), 4)
+        self.assertTrue(all(os.path.exists(path) for path in archive_paths))
+
+        for user_id in USERS:
+            dialogues = self.db.get_user_dialogues(user_id, include_archived=True)
+            self.assertEqual([d['dialogue_json'] for d in dialogues], [make_dialogue("архив " + user_id)])
+            self.assertEqual(self.db.get_dialogue_by_id(dialogues[0]['id'], include_archived=True)['user_id'], user_id)
+        self.assertEqual(len(search_dialogues("архив", limit=100, include_archived=True)), len(USERS))
+        self.assertEqual(len(search_dialogues("архив", user_id=USERS[5], include_archived=True)), 1)
+
+    def test_maintenance_commands_and_layout_check(self):
+        """Тест команд обслуживания по всем шардам и отказа включать шардирование поверх одной базы"""
+        # Записи с полным JSON, как до появления каталога: их связи восстанавливает --backfill
+        original_catalog_only = self.db.RECOMMENDATIONS_CATALOG_ONLY
+        self.db.RECOMMENDATIONS_CATALOG_ONLY = False
+        try:
+            for user_id in USERS:
+                dialogue_id = self.db.log_dialogue(user_id, '5', make_dialogue("одиночество"))
+                self.db.log_book_recommendations(user_id, '5', {"books": [{"title": "Один", "author": "Автор"}]},
+                                                 dialogue_id)
+        finally:
+            self.db.RECOMMENDATIONS_CATALOG_ONLY = original_catalog_only
+        for path in sharding.get_database_paths():
+            with self.db.pooled_connection(path) as conn:
+                for table in ('dialogue_fts', 'daily_issue_stats', 'recommendation_items'):
+                    conn.execute(f"DELETE FROM {table}")
+                conn.commit()
+
+        for module, flag in ((search, '--rebuild'), (analytics, '--rebuild'), (catalog, '--backfill')):
+            with mock.patch('sys.argv', [module.__name__, flag]), redirect_stdout(StringIO()):
+                module.main()
+        self.assertEqual(len(search_dialogues("одиночество", limit=100)), len(USERS))
+        totals = get_issue_totals()
+        self.assertEqual((totals[0]['dialogues'], totals[0]['recommendations']), (len(USERS), len(USERS)))
+        self.assertEqual(sum(row['count'] for row in sharding.query_all(
+            "SELECT COUNT(*) AS count FROM recommendation_items")), len(USERS))
+
+        # История пользователя другого шарда, записанная до включения шардирования
+        sharding.check_shard_layout()
+        user_id = next(user_id for user_id in USERS if sharding.shard_index(user_id) != 0)
+        sharding.SHARD_COUNT = 0
+        self.db.log_dialogue(user_id, '5', make_dialogue("до шардирования"))
+        sharding.SHARD_COUNT = 4
+        with self.assertRaises(RuntimeError):
+            sharding.check_shard_layout()
+
+
+if __name__ == '__main__':
+    unittest.main()
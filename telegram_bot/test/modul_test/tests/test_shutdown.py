@@ -0,0 +1,116 @@
+import unittest
+import asyncio
+import os
+import sys
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from aiogram import Bot, Dispatcher, Router, types
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Update
+
+from telegram_bot.ai_service import shutdown
+from telegram_bot.ai_service.shutdown import DrainingStorage, install_graceful_shutdown
+
+TOKEN = '123456:ABCDEF'
+
+
+class RecordingStorage(MemoryStorage):
+    """Хранилище FSM, отмечающее момент закрытия"""
+
+    def __init__(self, events):
+        super().__init__()
+        self.events = events
+
+    async def close(self):
+        self.events.append('storage closed')
+        await super().close()
+
+
+class TestShutdown(unittest.IsolatedAsyncioTestCase):
+    """Тесты для модуля shutdown.py"""
+
+    async def asyncSetUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        self.events = []
+        self.release = asyncio.Event()
+        self.router = Router()
+
+        @self.router.message()
+        async def handle(message: types.Message):
+            await self.release.wait()
+            self.events.append(f"answered {message.text}")
+
+        self.bot = Bot(token=TOKEN)
+
+        # Пул соединений с базой в этих тестах не используется
+        self.original_close_database = shutdown.close_database
+
+        async def close_database():
+            self.events.append('database closed')
+
+        shutdown.close_database = close_database
+
+    async def asyncTearDown(self):
+        """Очистка после каждого теста"""
+        shutdown.close_database = self.original_close_database
+        await self.bot.session.close()
+
+    def create_dispatcher(self, timeout):
+        self.dispatcher = Dispatcher(storage=DrainingStorage(RecordingStorage(self.events), timeout=timeout))
+        self.dispatcher.include_router(self.router)
+        return install_graceful_shutdown(self.dispatcher)
+
+    def feed(self, update_id, text):
+        update = Update.model_validate({
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': 0,
+                'chat': {'id': 42, 'type': 'private'},
+                'from': {'id': 42, 'is_bot': False, 'first_name': 'Тест'},
+                'text': text,
+            },
+        }, context={'bot': self.bot})
+        return asyncio.create_task(self.dispatcher.feed_update(self.bot, update))
+
+    async def test_drain_before_flush(self):
+        """Тест остановки: сначала завершаются текущие обновления, затем хранилище и база"""
+        tracker = self.create_dispatcher(timeout=5)
+        handling = [self.feed(1, "Первое"), self.feed(2, "Второе")]
+        await asyncio.sleep(0.01)
+        self.assertEqual(tracker.in_flight, 2)
+
+        stopping = asyncio.create_task(self.dispatcher.emit_shutdown(bot=self.bot))
+        await asyncio.sleep(0.01)
+        self.assertFalse(stopping.done())
+        self.assertEqual(self.events, [])
+
+        self.release.set()
+        await stopping
+        await asyncio.gather(*handling)
+        self.assertEqual(self.events, ["answered Первое", "answered Второе", 'storage closed', 'database closed'])
+        self.assertEqual(tracker.stats(), {'in_flight': 0, 'handled': 2, 'abandoned': 0, 'closing': True})
+
+    async def test_drain_timeout(self):
+        """Тест остановки по истечении времени ожидания зависшего обновления"""
+        tracker = self.create_dispatcher(timeout=0.05)
+        handling = self.feed(1, "Зависшее")
+        await asyncio.sleep(0.01)
+
+        await self.dispatcher.emit_shutdown(bot=self.bot)
+        self.assertEqual(self.events, ['storage closed', 'database closed'])
+        self.assertEqual(tracker.stats()['abandoned'], 1)
+
+        handling.cancel()
+        await asyncio.gather(handling, return_exceptions=True)
+        self.assertEqual(tracker.in_flight, 0)
+
+        # Без DrainingStorage хранилище закрылось бы раньше, чем завершатся обновления
+        with self.assertRaises(ValueError):
+            install_graceful_shutdown(Dispatcher(storage=RecordingStorage(self.events)))
+
+
+if __name__ == '__main__':
+    unittest.main()
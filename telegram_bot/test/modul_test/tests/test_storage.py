@@ -0,0 +1,133 @@
+import unittest
+import os
+import sqlite3
+import sys
+import tempfile
+import shutil
+import time
+from datetime import datetime
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from telegram_bot.ai_service import storage
+
+class TestStorage(unittest.TestCase):
+    """Тесты для модуля storage.py"""
+
+    def setUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        self.test_dir = tempfile.mkdtemp()
+
+        import telegram_bot.ai_service.database as database_module
+        self.db = database_module
+        self.original_db_path = database_module.DATABASE_PATH
+        self.original_legacy_path = storage.LEGACY_USERS_DATABASE_PATH
+        self.original_tz = os.environ.get('TZ')
+        database_module.DATABASE_PATH = os.path.join(self.test_dir, 'test_dialogues.db')
+        storage.LEGACY_USERS_DATABASE_PATH = os.path.join(self.test_dir, 'users.db')
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.db.close_pool()
+        self.db.DATABASE_PATH = self.original_db_path
+        storage.LEGACY_USERS_DATABASE_PATH = self.original_legacy_path
+        if self.original_tz is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = self.original_tz
+        if hasattr(time, 'tzset'):
+            time.tzset()
+        shutil.rmtree(self.test_dir)
+
+    def test_save_user_and_feedback(self):
+        """Тест сохранения пользователя и обратной связи"""
+        storage.init_storage()
+
+        storage.save_user(42, 'test_username')
+        storage.save_user(42, 'new_username')
+        feedback_id = storage.save_feedback(42, 'Отличный бот')
+
+        self.assertEqual(storage.get_user(42)['username'], 'new_username')
+        self.assertIsNone(storage.get_user(43))
+        self.assertGreater(feedback_id, 0)
+
+    def test_feedback_joined_to_dialogues(self):
+        """Тест выборки обратной связи вместе с последним диалогом пользователя"""
+        storage.init_storage()
+        storage.save_user(42, 'test_username')
+        storage.log_dialogue('42', '1', [{"role": "user", "content": "Первый"}])
+        latest_id = storage.log_dialogue('42', '2', [{"role": "user", "content": "Второй"}])
+        storage.save_feedback(42, 'Спасибо')
+        # Обратная связь без диалогов тоже возвращается
+        storage.save_feedback(7, 'Не успел поговорить', datetime(2020, 1, 1))
+
+        feedback = storage.get_feedback_with_dialogues()
+
+        self.assertEqual(len(feedback), 2)
+        self.assertEqual(feedback[0]['username'], 'test_username')
+        self.assertEqual(feedback[0]['dialogue_id'], latest_id)
+        self.assertEqual(feedback[0]['issue_id'], '2')
+        self.assertEqual(feedback[0]['dialogue_count'], 2)
+        self.assertIsNone(feedback[1]['dialogue_id'])
+
+        self.assertEqual(len(storage.get_feedback_with_dialogues(since='2021-01-01 00:00:00')), 1)
+
+    def create_legacy_database(self, feedback_columns="user_id INTEGER, feedback TEXT, feedback_date DATETIME"):
+        legacy = sqlite3.connect(storage.LEGACY_USERS_DATABASE_PATH)
+        legacy.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, dialogs TEXT)")
+        legacy.execute(f"CREATE TABLE feedback (id INTEGER PRIMARY KEY, {feedback_columns})")
+        legacy.execute("INSERT INTO users VALUES (1, 'old_user', '')")
+        return legacy
+
+    def test_legacy_users_imported_once(self):
+        """Тест однократного импорта пользователей из старой базы users.db"""
+        # Старый бот писал местное время (datetime.now()), в основной базе хранится UTC
+        if hasattr(time, 'tzset'):
+            os.environ['TZ'] = 'Europe/Moscow'
+            time.tzset()
+        legacy = self.create_legacy_database()
+        legacy.execute("INSERT INTO feedback VALUES (1, 1, 'Старый отзыв', ?)",
+                       (str(datetime(2024, 1, 1, 1, 30, 0, 123456)),))
+        legacy.commit()
+        legacy.close()
+
+        storage.init_storage()
+        # Повторная инициализация в новом процессе не дублирует данные
+        storage._initialized_paths.clear()
+        storage.init_storage()
+
+        self.assertEqual(storage.get_user(1)['username'], 'old_user')
+        feedback = storage.get_feedback_with_dialogues()
+        self.assertEqual([f['feedback'] for f in feedback], ['Старый отзыв'])
+        # Импортированный отзыв учтен в дневных счетчиках
+        from telegram_bot.ai_service.analytics import get_daily_feedback_counts
+        self.assertEqual(sum(row['feedback'] for row in get_daily_feedback_counts()), 1)
+        if hasattr(time, 'tzset'):
+            self.assertEqual(feedback[0]['feedback_date'], '2023-12-31 22:30:00')
+            self.assertEqual([row['day'] for row in get_daily_feedback_counts()], ['2023-12-31'])
+
+    def test_legacy_import_failure_rolled_back(self):
+        """Тест отката импорта при ошибке: исходная ошибка не скрывается, соединение пула остается чистым"""
+        legacy = self.create_legacy_database(feedback_columns="user_id INTEGER, feedback TEXT")
+        legacy.commit()
+        legacy.close()
+
+        with self.assertRaises(sqlite3.OperationalError) as error:
+            storage.init_storage()
+        self.assertIn('feedback_date', str(error.exception))
+        self.assertIsNone(storage.get_user(1))
+        with self.db.pooled_connection() as conn:
+            self.assertFalse(conn.in_transaction)
+            self.assertEqual([row['name'] for row in conn.execute("PRAGMA database_list")], ['main'])
+
+        # После исправления старой базы импорт выполняется при следующем запуске
+        os.remove(storage.LEGACY_USERS_DATABASE_PATH)
+        legacy = self.create_legacy_database()
+        legacy.commit()
+        legacy.close()
+        storage.init_storage()
+        self.assertEqual(storage.get_user(1)['username'], 'old_user')
+
+if __name__ == '__main__':
+    unittest.main()
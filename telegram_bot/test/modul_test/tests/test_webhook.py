@@ -0,0 +1,116 @@
+import unittest
+import asyncio
+import os
+import sys
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from aiohttp.test_utils import TestClient, TestServer
+from aiogram import Bot, Dispatcher, Router, types
+
+from telegram_bot.ai_service.webhook import SECRET_TOKEN_HEADER, WebhookServer
+
+SECRET = 'test-secret'
+
+
+def make_update(update_id, text="Привет"):
+    """Синтетическое обновление Telegram с текстовым сообщением"""
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': 42, 'type': 'private'},
+            'from': {'id': 42, 'is_bot': False, 'first_name': 'Тест'},
+            'text': text,
+        },
+    }
+
+
+class TestWebhook(unittest.IsolatedAsyncioTestCase):
+    """Тесты для модуля webhook.py"""
+
+    async def asyncSetUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        self.received = []
+        self.release = asyncio.Event()
+        self.release.set()
+        self.started = asyncio.Event()
+
+        router = Router()
+
+        @router.message()
+        async def handle(message: types.Message):
+            self.started.set()
+            await self.release.wait()
+            self.received.append(message.text)
+
+        self.dispatcher = Dispatcher()
+        self.dispatcher.include_router(router)
+        self.bot = Bot(token='123456:ABCDEF')
+
+    async def start_client(self, **kwargs):
+        self.server = WebhookServer(self.dispatcher, self.bot, secret_token=SECRET, **kwargs)
+        self.client = TestClient(TestServer(self.server.create_app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        """Очистка после каждого теста"""
+        self.release.set()
+        await self.client.close()
+        await self.bot.session.close()
+
+    async def post(self, update, secret=SECRET):
+        headers = {SECRET_TOKEN_HEADER: secret} if secret else {}
+        return await self.client.post('/webhook', json=update, headers=headers)
+
+    async def test_secret_token_checked(self):
+        """Тест отклонения обновлений без секретного токена и обработки с токеном"""
+        await self.start_client()
+        self.assertEqual((await self.post(make_update(1), secret=None)).status, 401)
+        self.assertEqual((await self.post(make_update(2), secret='wrong')).status, 401)
+        self.assertEqual((await self.post(make_update(3, "Мне тревожно"))).status, 200)
+
+        for _ in range(100):
+            if self.received:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.received, ["Мне тревожно"])
+        self.assertEqual((self.server.stats()['unauthorized'], self.server.stats()['processed']), (2, 1))
+
+    async def test_bounded_queue(self):
+        """Тест отказа при переполнении очереди и обработки принятых обновлений при остановке"""
+        self.release.clear()
+        await self.start_client(queue_size=1, workers=1)
+
+        self.assertEqual((await self.post(make_update(1))).status, 200)
+        await asyncio.wait_for(self.started.wait(), 1)
+        # Обработчик занят первым обновлением, второе ждет в очереди, третье не помещается
+        self.assertEqual((await self.post(make_update(2))).status, 200)
+        response = await self.post(make_update(3))
+        self.assertEqual(response.status, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertEqual((await self.client.get('/readyz')).status, 503)
+
+        self.release.set()
+        await self.client.close()
+        self.assertEqual(len(self.received), 2)
+        self.assertEqual(self.server.stats()['rejected'], 1)
+
+    async def test_health_and_malformed_update(self):
+        """Тест эндпоинтов здоровья и отказа на некорректное обновление"""
+        await self.start_client()
+        response = await self.client.get('/healthz')
+        self.assertEqual((response.status, await response.json()), (200, {'status': 'ok'}))
+        response = await self.client.get('/readyz')
+        self.assertEqual(response.status, 200)
+        self.assertEqual((await response.json())['workers'], 64)
+
+        self.assertEqual((await self.post({'message': 'не обновление'})).status, 400)
+        response = await self.client.post('/webhook', data='{', headers={SECRET_TOKEN_HEADER: SECRET})
+        self.assertEqual(response.status, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
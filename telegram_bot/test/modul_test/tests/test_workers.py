@@ -0,0 +1,147 @@
+import unittest
+import asyncio
+import os
+import sys
+import tempfile
+import shutil
+from functools import partial
+
+# Добавляем корневую директорию проекта в sys.path для импорта модулей
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../')))
+
+from aiogram import Bot, Dispatcher, Router, types
+from aiogram.types import Update
+
+from telegram_bot.ai_service import workers
+from telegram_bot.ai_service.workers import WorkerPool, worker_index
+
+TOKEN = '123456:ABCDEF'
+
+# ID пользователей Telegram
+USERS = [1000 + index for index in range(6)]
+
+
+def create_test_worker(results_dir):
+    """Диспетчер процесса-обработчика: записывает пользователя и текст в файл своего PID"""
+    router = Router()
+
+    # Отдельный файл на процесс: общая очередь могла бы остаться заблокированной убитым процессом
+    @router.message()
+    async def handle(message: types.Message):
+        with open(os.path.join(results_dir, str(os.getpid())), 'a', encoding='utf-8') as f:
+            f.write(f"{message.from_user.id}\t{message.text}\n")
+
+    dispatcher = Dispatcher()
+    dispatcher.include_router(router)
+    return dispatcher, Bot(token=TOKEN)
+
+
+class TestWorkers(unittest.IsolatedAsyncioTestCase):
+    """Тесты для модуля workers.py"""
+
+    async def asyncSetUp(self):
+        """Подготовка тестового окружения перед каждым тестом"""
+        self.results_dir = tempfile.mkdtemp()
+        # Проверки состояния вызываются в тестах явно
+        self.original_health_interval = workers.WORKER_HEALTH_INTERVAL_SECONDS
+        workers.WORKER_HEALTH_INTERVAL_SECONDS = 3600
+        self.pool = WorkerPool(partial(create_test_worker, self.results_dir), 2)
+        self.front = self.pool.create_dispatcher()
+        self.bot = Bot(token=TOKEN)
+        self.update_id = 0
+        await self.front.emit_startup()
+
+    async def asyncTearDown(self):
+        """Очистка после каждого теста"""
+        await self.front.emit_shutdown()
+        await self.bot.session.close()
+        workers.WORKER_HEALTH_INTERVAL_SECONDS = self.original_health_interval
+        shutil.rmtree(self.results_dir)
+
+    async def send(self, user_id, text):
+        self.update_id += 1
+        update = Update.model_validate({
+            'update_id': self.update_id,
+            'message': {
+                'message_id': self.update_id,
+                'date': 0,
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': 'Тест'},
+                'text': text,
+            },
+        }, context={'bot': self.bot})
+        await self.front.feed_update(self.bot, update)
+
+    async def receive(self, count):
+        """Дождаться count обработанных сообщений (PID, пользователь, текст), по порядку внутри процесса"""
+        for _ in range(600):
+            received = []
+            for name in os.listdir(self.results_dir):
+                with open(os.path.join(self.results_dir, name), encoding='utf-8') as f:
+                    for line in f.read().splitlines():
+                        user_id, text = line.split('\t')
+                        received.append((int(name), int(user_id), text))
+            if len(received) >= count:
+                return received
+            await asyncio.sleep(0.1)
+        self.fail(f"Processed {len(received)} of {count} updates")
+
+    async def test_updates_routed_by_user(self):
+        """Тест распределения обновлений по процессам: пользователь всегда в одном процессе"""
+        self.assertEqual(len({worker_index(user_id, 2) for user_id in USERS}), 2)
+        for turn in range(3):
+            for user_id in USERS:
+                await self.send(user_id, f"Сообщение {turn}")
+
+        processes = {}
+        for pid, user_id, text in await self.receive(3 * len(USERS)):
+            processes.setdefault(user_id, set()).add(pid)
+        self.assertTrue(all(len(pids) == 1 for pids in processes.values()))
+        self.assertEqual(len(set.union(*processes.values())), 2)
+        self.assertNotIn(os.getpid(), set.union(*processes.values()))
+        self.assertEqual(sum(self.pool.stats()['routed']), 3 * len(USERS))
+
+    async def test_full_queue_drops_update(self):
+        """Тест отбрасывания обновления, если очередь процесса заполнена дольше времени ожидания"""
+        original_timeout = workers.WORKER_PUT_TIMEOUT_SECONDS
+        workers.WORKER_PUT_TIMEOUT_SECONDS = 0.1
+        # Обработчики не запущены: очередь на одно обновление не освобождается
+        pool = WorkerPool(partial(create_test_worker, self.results_dir), 1, queue_size=1)
+        user = types.User(id=USERS[0], is_bot=False, first_name='Тест')
+        try:
+            for update_id in (1, 2):
+                update = Update.model_validate({'update_id': update_id})
+                self.assertTrue(await pool.forward(None, update, {'event_from_user': user}))
+        finally:
+            workers.WORKER_PUT_TIMEOUT_SECONDS = original_timeout
+        stats = pool.stats()
+        self.assertEqual((stats['routed'], stats['dropped']), ([1], [1]))
+
+    async def test_supervision_and_graceful_restart(self):
+        """Тест перезапуска упавшего процесса и плавного перезапуска без потери обновлений"""
+        user_id = next(user_id for user_id in USERS if worker_index(user_id, 2) == 0)
+        await self.send(user_id, "До сбоя")
+        (old_pid, _, _), = await self.receive(1)
+
+        self.pool._processes[0].kill()
+        await asyncio.to_thread(self.pool._processes[0].join)
+        self.assertEqual(self.pool.check_health(), 1)
+        await self.send(user_id, "После сбоя")
+        (new_pid, _, text), = [record for record in await self.receive(2) if record[0] != old_pid]
+        self.assertEqual(text, "После сбоя")
+
+        # Обновление, принятое до перезапуска, обрабатывает старый процесс, следующее - новый
+        await self.send(user_id, "Перед перезапуском")
+        await self.pool.restart(0)
+        await self.send(user_id, "После перезапуска")
+        by_process = {}
+        for pid, _, text in await self.receive(4):
+            by_process.setdefault(pid, []).append(text)
+        self.assertEqual(by_process[new_pid], ["После сбоя", "Перед перезапуском"])
+        self.assertEqual(len(by_process), 3)
+        self.assertEqual(self.pool.stats()['restarts'], 2)
+        self.assertEqual(self.pool.stats()['alive'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()